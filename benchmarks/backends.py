@@ -0,0 +1,252 @@
+"""Stand-in backends serving synthetic datasets through httpx.MockTransport.
+
+Each backend copies the pagination of the real API closely enough for the
+clients to page through it: Splunk export streams one JSON object per line,
+SentinelOne and Sysdig return cursors, GitLab sends x-next-page headers and
+TheHive honours the `page` operation of its query language. Records are
+generated from their index when a page is requested, so serving a million
+records does not hold them in memory.
+"""
+import asyncio
+import base64
+import json
+import time
+import httpx
+
+HOSTS = 5000
+SEVERITIES = (0, 2, 4, 5, 6, 7)
+RULES = ('Terminal shell in container', 'Write below etc', 'Unexpected outbound connection',
+         'Read sensitive file untrusted', 'Launch privileged container')
+
+
+def encode_cursor(offset):
+    return base64.b64encode(f'offset:{offset}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    return int(base64.b64decode(cursor).decode().split(':')[1]) if cursor else 0
+
+
+def host(i):
+    return f'host-{i % HOSTS:05d}.corp.example.com'
+
+
+def iso(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000000Z', time.gmtime(seconds))
+
+
+class Backend:
+    """Base of the stand-in backends, counting the records and requests served."""
+
+    client = None
+
+    def __init__(self, records, latency=0):
+        self.records = records
+        self.latency = latency
+        self.served = 0
+        self.requests = 0
+        self.now = int(time.time())
+
+    def handler(self, request):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.handle(request)
+
+    async def async_handler(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.handle(request)
+
+    def transport(self):
+        return httpx.MockTransport(self.handler)
+
+    def async_transport(self):
+        return httpx.MockTransport(self.async_handler)
+
+    def json(self, data, status_code=200, headers=None):
+        headers = {'Content-Type': 'application/json', **(headers or {})}
+        return httpx.Response(status_code, content=json.dumps(data).encode(), headers=headers)
+
+
+class Splunk(Backend):
+    """Splunk export endpoint streaming results as JSON lines."""
+
+    client = 'splunk'
+    CHUNK = 500
+
+    def record(self, i):
+        return {
+            '_time': iso(self.now - i),
+            '_raw': f'sshd[{i}]: Accepted publickey for admin from 10.0.{i % 256}.{i % 200} port 22',
+            'host': host(i),
+            'source': '/var/log/auth.log',
+            'sourcetype': 'linux_secure',
+            'user': f'user{i % 97}',
+            'src_ip': f'10.0.{i % 256}.{i % 200}',
+            'action': 'success' if i % 7 else 'failure',
+        }
+
+    def stream(self):
+        for start in range(0, self.records, self.CHUNK):
+            lines = []
+            for i in range(start, min(start + self.CHUNK, self.records)):
+                lines.append(json.dumps({'preview': False, 'offset': i, 'result': self.record(i)}))
+                self.served += 1
+            yield ('\n'.join(lines) + '\n').encode()
+
+    def handle(self, request):
+        if request.url.path == '/services/search/jobs/export':
+            return httpx.Response(200, content=self.stream())
+        return httpx.Response(404)
+
+
+class SentinelOne(Backend):
+    """SentinelOne agents endpoint paginated with cursors."""
+
+    client = 'sentinelone'
+    MAX_LIMIT = 1000
+
+    def record(self, i):
+        return {
+            'id': str(1_000_000_000_000 + i),
+            'computerName': host(i),
+            'osName': 'Linux' if i % 3 else 'Windows 10 Pro',
+            'agentVersion': '23.4.2.14',
+            'isActive': bool(i % 5),
+            'lastActiveDate': iso(self.now - i * 60),
+            'siteId': str(900 + i % 4),
+            'groupId': str(800 + i % 12),
+            'networkInterfaces': [{'inet': [f'10.1.{i % 256}.{i % 250}'], 'name': 'eth0'}],
+        }
+
+    def handle(self, request):
+        if request.url.path != '/web/api/v2.1/agents':
+            return httpx.Response(404)
+        params = request.url.params
+        limit = int(params.get('limit', 10))
+        if limit > self.MAX_LIMIT:
+            return self.json({'errors': [{'code': 4000010, 'title': 'Validation Error'}]},
+                             status_code=400)
+        offset = decode_cursor(params.get('cursor'))
+        end = min(offset + limit, self.records)
+        data = [self.record(i) for i in range(offset, end)]
+        self.served += len(data)
+        return self.json({
+            'data': data,
+            'pagination': {
+                'totalItems': self.records,
+                'nextCursor': encode_cursor(end) if end < self.records else None,
+            },
+        })
+
+
+class GitLab(Backend):
+    """GitLab projects and registries paginated with x-next-page headers."""
+
+    client = 'gitlab'
+    REPOSITORIES = 10
+
+    def page(self, request, total, record):
+        params = request.url.params
+        per_page = min(int(params.get('per_page', 20)), 100)
+        page = int(params.get('page', 1))
+        start = (page - 1) * per_page
+        end = min(start + per_page, total)
+        headers = {'x-next-page': str(page + 1) if end < total else '', 'x-total': str(total)}
+        return self.json([record(i) for i in range(start, end)], headers=headers)
+
+    def project(self, i):
+        return {
+            'id': i + 1,
+            'path_with_namespace': f'group-{i % 40}/project-{i}',
+            'namespace': {'kind': 'group'},
+        }
+
+    def handle(self, request):
+        path = request.url.path
+        projects = -(-self.records // self.REPOSITORIES)
+        if path == '/api/v4/projects':
+            return self.page(request, projects, self.project)
+        if path.endswith('/registry/repositories'):
+            project = int(path.split('/')[4]) - 1
+            start = project * self.REPOSITORIES
+            count = max(min(self.REPOSITORIES, self.records - start), 0)
+
+            def repository(i):
+                self.served += 1
+                return {
+                    'id': start + i,
+                    'path': f'group-{project % 40}/project-{project}/image-{i}',
+                    'location': f'registry.example.com/group-{project % 40}/project-{project}/image-{i}',
+                    'tags_count': (start + i) % 30,
+                }
+            return self.page(request, count, repository)
+        return httpx.Response(404)
+
+
+class Sysdig(Backend):
+    """Sysdig secure events paginated with cursors."""
+
+    client = 'sysdig'
+    MAX_LIMIT = 999
+
+    def record(self, i):
+        return {
+            'id': f'{i:024x}',
+            'timestamp': (self.now - i) * 1_000_000_000,
+            'severity': SEVERITIES[i % len(SEVERITIES)],
+            'ruleName': RULES[i % len(RULES)],
+            'source': 'syscall',
+            'content': {'fields': {'container.name': f'app-{i % 300}', 'host.hostName': host(i)}},
+        }
+
+    def handle(self, request):
+        if request.url.path != '/api/v1/secureEvents':
+            return httpx.Response(404)
+        params = request.url.params
+        limit = min(int(params.get('limit', 25)), self.MAX_LIMIT)
+        offset = decode_cursor(params.get('cursor'))
+        end = min(offset + limit, self.records)
+        data = [self.record(i) for i in range(offset, end)]
+        self.served += len(data)
+        page = {'returned': len(data), 'matched': self.records}
+        if end < self.records:
+            page['next'] = encode_cursor(end)
+        return self.json({'data': data, 'page': page})
+
+
+class TheHive(Backend):
+    """TheHive query endpoint honouring the page operation."""
+
+    client = 'thehive'
+
+    def record(self, i):
+        return {
+            '_id': f'~{40_000_000 + i}',
+            '_type': 'Alert',
+            'title': f'{RULES[i % len(RULES)]} on {host(i)}',
+            'type': 'sysdig',
+            'source': 'sextant',
+            'severity': 1 + i % 4,
+            'severityLabel': ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL')[i % 4],
+            'status': 'New',
+            'observableCount': i % 12,
+            'date': (self.now - i) * 1000,
+        }
+
+    def handle(self, request):
+        if request.url.path != '/api/v1/query':
+            return httpx.Response(404)
+        query = json.loads(request.content)['query']
+        start, end = 0, self.records
+        for operation in query:
+            if operation['_name'] == 'page':
+                start, end = operation['from'], min(operation['to'], self.records)
+        data = [self.record(i) for i in range(start, end)]
+        self.served += len(data)
+        return self.json(data)
+
+
+BACKENDS = {backend.client: backend for backend in (Splunk, SentinelOne, GitLab, Sysdig, TheHive)}
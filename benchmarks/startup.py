@@ -0,0 +1,85 @@
+"""Measure sextant cold-start time.
+
+Runs the CLI in fresh interpreters against a generated configuration so the
+numbers reflect what a shell loop pays per invocation. No network access is
+needed: only `--help` paths are exercised, which go through config loading,
+command registration and client module imports.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 50 --endpoints 200
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+CLIENTS = ('splunk', 'thehive', 'sentinelone', 'gitlab', 'sysdig')
+
+ENTRYPOINT = 'from sextant.cli import entrypoint; entrypoint()'
+
+
+def write_config(home, endpoints):
+    """Write a config with the given number of endpoints cycling through clients."""
+    config_dir = Path(home) / '.config' / 'sextant'
+    config_dir.mkdir(parents=True)
+    lines = ['endpoints:']
+    for i in range(endpoints):
+        client = CLIENTS[i % len(CLIENTS)]
+        lines += [
+            f'  - name: {client}-{i}',
+            f'    client: {client}',
+            f'    remote: https://{client}-{i}.example.com',
+            '    credentials:',
+            '      secret: not-a-secret',
+        ]
+    (config_dir / 'config.yaml').write_text('\n'.join(lines) + '\n')
+
+
+def measure(args, env, runs):
+    """Return wall-clock durations in milliseconds of `sextant <args>`."""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, '-c', ENTRYPOINT, *args],
+            env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help='Invocations per scenario')
+    parser.add_argument('--endpoints', type=int, default=15, help='Endpoints in the generated config')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        write_config(home, args.endpoints)
+        env = dict(os.environ, HOME=home)
+
+        scenarios = {
+            'python': None,
+            'sextant --help': ['--help'],
+            'sextant <endpoint> --help': ['splunk-0', '--help'],
+        }
+        print(f"{'scenario':<30} {'min':>8} {'median':>8} {'mean':>8}  (ms, {args.runs} runs)")
+        for label, argv in scenarios.items():
+            if argv is None:
+                durations = []
+                for _ in range(args.runs):
+                    start = time.perf_counter()
+                    subprocess.run([sys.executable, '-c', 'pass'], env=env, check=True)
+                    durations.append((time.perf_counter() - start) * 1000)
+            else:
+                durations = measure(argv, env, args.runs)
+            print(f"{label:<30} {min(durations):>8.1f} {statistics.median(durations):>8.1f} "
+                  f"{statistics.mean(durations):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Measure end-to-end throughput and peak memory of list commands.
+
+Commands run against the stand-in backends of backends.py, so no network or
+credentials are needed. Each scenario runs in a fresh interpreter with its
+standard output replaced by a sink that either claims to be a terminal (rich
+tables) or a pipe (JSON). Results can be saved as a JSON baseline and later
+runs compared against it.
+
+    python benchmarks/throughput.py
+    python benchmarks/throughput.py --records 10000 100000 1000000 --modes pipe
+    python benchmarks/throughput.py --save benchmarks/baseline.json
+    python benchmarks/throughput.py --compare benchmarks/baseline.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from importlib import import_module
+from importlib.metadata import version
+from pathlib import Path
+
+from backends import BACKENDS
+
+# scenario: (client, command arguments)
+SCENARIOS = {
+    'splunk query': ('splunk', ['query', '--from', '1y', 'search index=main']),
+    'gitlab images': ('gitlab', ['images']),
+    's1 agent list': ('sentinelone', ['agent', 'list', '--limit', '1000']),
+    'sysdig event list': ('sysdig', ['event', 'list', '--from', '1y', '--limit', '999']),
+    'thehive alert list': ('thehive', ['alert', 'list', '--from', '1y']),
+}
+
+MODES = ('pipe', 'tty')
+
+# max_rss is in kilobytes on Linux and bytes on macOS
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+class Sink(io.RawIOBase):
+    """Writable stream discarding output and counting its bytes."""
+
+    def __init__(self, tty):
+        self.tty = tty
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self.tty
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+
+def peak_rss():
+    """Return the peak resident memory of the process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT / 2**20
+
+
+def worker(scenario, mode, records, latency=0):
+    """Run a scenario in this process and return its measurements."""
+    from sextant.cli import cli
+    from sextant.http import build_async_client, build_client
+    from sextant.utils import Lazy
+
+    name, args = SCENARIOS[scenario]
+    backend = BACKENDS[name](records, latency)
+    config = {
+        'name': name,
+        'client': name,
+        'remote': 'https://bench.invalid',
+        'credentials': {'secret': 'not-a-secret'},
+        'http': {'cache': False},
+    }
+    module = import_module(f'sextant.clients.{name}')
+    client = module.Client(
+        build_client(config, transport=backend.transport()),
+        module.AsyncClient(build_async_client(config, transport=backend.async_transport())),
+    )
+    cli.endpoints = {name: name}
+
+    sink = Sink(tty=mode == 'tty')
+    stdout = sys.stdout
+    sys.stdout = io.TextIOWrapper(io.BufferedWriter(sink), encoding='utf-8')
+    rss = peak_rss()
+    start = time.perf_counter()
+    try:
+        cli.main([name, *args], prog_name='sextant', standalone_mode=False,
+                 obj={'config': None, 'clients': {name: Lazy(lambda: client)}})
+    finally:
+        sys.stdout.flush()
+        elapsed = time.perf_counter() - start
+        sys.stdout = stdout
+
+    return {
+        'scenario': scenario,
+        'mode': mode,
+        'records': records,
+        'served': backend.served,
+        'requests': backend.requests,
+        'seconds': round(elapsed, 4),
+        'records_per_s': round(backend.served / elapsed, 1) if elapsed else 0,
+        'output_bytes': sink.size,
+        'peak_rss_mb': round(peak_rss(), 1),
+        'rss_growth_mb': round(peak_rss() - rss, 1),
+    }
+
+
+def measure(scenario, mode, records, timeout, latency=0):
+    """Run a scenario in a fresh interpreter and return its measurements."""
+    env = dict(os.environ, COLUMNS='160', LINES='50')
+    try:
+        result = subprocess.run(
+            [sys.executable, __file__, '--worker', scenario, mode, str(records), str(latency)],
+            env=env, capture_output=True, text=True, timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {'scenario': scenario, 'mode': mode, 'records': records, 'error': f'timeout after {timeout}s'}
+    if result.returncode:
+        error = (result.stderr.strip().splitlines() or ['failed'])[-1]
+        return {'scenario': scenario, 'mode': mode, 'records': records, 'error': error}
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def compare(results, baseline, threshold):
+    """Print the change of each result against the baseline, return True on regression."""
+    reference = {(r['scenario'], r['mode'], r['records']): r for r in baseline['results']}
+    regression = False
+    print(f"\n{'scenario':<22} {'mode':<5} {'records':>8} {'records/s':>12} {'peak MB':>10}")
+    for r in results:
+        base = reference.get((r['scenario'], r['mode'], r['records']))
+        if not base or 'error' in r or 'error' in base:
+            continue
+        speed = r['records_per_s'] / base['records_per_s'] - 1 if base['records_per_s'] else 0
+        memory = r['peak_rss_mb'] / base['peak_rss_mb'] - 1
+        flag = ''
+        if speed < -threshold or memory > threshold:
+            flag = '  REGRESSION'
+            regression = True
+        print(f"{r['scenario']:<22} {r['mode']:<5} {r['records']:>8} {speed:>+11.0%} {memory:>+10.0%}{flag}")
+    return regression
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, nargs='+', default=[10_000], help='Dataset sizes')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        metavar='SCENARIO', help='Scenarios to run (default: all)')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='Output modes')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per scenario, the fastest is kept')
+    parser.add_argument('--timeout', type=int, default=600, help='Seconds before a run is abandoned')
+    parser.add_argument('--save', type=Path, help='Write the results to this JSON file')
+    parser.add_argument('--compare', type=Path, help='Compare the results with this JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative slowdown or memory growth reported as a regression')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Round-trip time in milliseconds added to every request')
+    parser.add_argument('--worker', nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        scenario, mode, records, latency = args.worker
+        print(json.dumps(worker(scenario, mode, int(records), float(latency))))
+        return
+
+    print(f"{'scenario':<22} {'mode':<5} {'records':>8} {'served':>8} {'requests':>8} "
+          f"{'seconds':>8} {'records/s':>10} {'peak MB':>8}")
+    results = []
+    for records in args.records:
+        for scenario in args.scenarios:
+            for mode in args.modes:
+                runs = [measure(scenario, mode, records, args.timeout, args.latency / 1000)
+                        for _ in range(args.runs)]
+                r = max(runs, key=lambda r: r.get('records_per_s', -1))
+                results.append(r)
+                if 'error' in r:
+                    print(f"{scenario:<22} {mode:<5} {records:>8} {r['error']}")
+                    continue
+                print(f"{scenario:<22} {mode:<5} {records:>8} {r['served']:>8} {r['requests']:>8} "
+                      f"{r['seconds']:>8.2f} {r['records_per_s']:>10.0f} {r['peak_rss_mb']:>8.1f}")
+
+    if args.save:
+        args.save.write_text(json.dumps({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sextant': version('sextant'),
+            'results': results,
+        }, indent=2) + '\n')
+    if args.compare and compare(results, json.loads(args.compare.read_text()), args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Shared event loop running the async clients from synchronous commands.
+
+Commands stay synchronous and hand their fan-outs to the async clients with
+run() or iterate(). Every call uses the same loop, so async clients kept
+alive across commands (sextant serve) stay bound to the loop that opened
+their connections.
+"""
+import asyncio
+import httpx
+
+_loop = None
+
+
+def loop():
+    """Return the process-wide event loop, creating it on first use."""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+
+def run(coro):
+    """Run a coroutine to completion on the shared loop and return its result."""
+    return loop().run_until_complete(coro)
+
+
+def iterate(agen):
+    """Yield the items of an async generator from synchronous code."""
+    try:
+        while True:
+            try:
+                yield run(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        run(agen.aclose())
+
+
+def close_client(client):
+    """Close an async client, unless it is a Lazy proxy never instantiated."""
+    client = getattr(client, '_instance', client)
+    if client is not None:
+        run(client.http.aclose())
+
+
+def close():
+    """Close the shared loop once every async client is closed."""
+    global _loop
+    if _loop is not None and not _loop.is_closed():
+        _loop.run_until_complete(_loop.shutdown_asyncgens())
+        _loop.close()
+    _loop = None
+
+
+class LimitTransport(httpx.AsyncBaseTransport):
+    """Async transport capping the requests in flight to an endpoint.
+
+    Requests beyond the limit wait for a slot, which is held until the
+    response body is closed so streamed responses count as in flight.
+    """
+
+    def __init__(self, transport, limit):
+        self.transport = transport
+        self.limit = limit
+        self.semaphore = None
+
+    async def handle_async_request(self, request):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.limit)
+        await self.semaphore.acquire()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self.semaphore.release()
+            raise
+        if response.is_closed:
+            # responses built from bytes are read on creation
+            self.semaphore.release()
+        else:
+            response.stream = LimitedStream(response.stream, self.semaphore.release)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class LimitedStream(httpx.AsyncByteStream):
+    """Response stream releasing its concurrency slot once closed."""
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            if self.release:
+                self.release()
+                self.release = None
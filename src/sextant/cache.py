@@ -0,0 +1,104 @@
+import hashlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def makedirs(directory):
+    """Create a directory and its missing parents, readable by the user only."""
+    directory = Path(directory)
+    for parent in reversed([directory, *directory.parents]):
+        if not parent.exists():
+            parent.mkdir(mode=0o700, exist_ok=True)
+
+
+def private(path, flags):
+    """Opener creating files readable by the user only, cached data may be sensitive."""
+    return os.open(path, flags, 0o600)
+
+
+class DiskCache:
+    """Size-bounded directory of cached values evicted in LRU order.
+
+    Each value is a file named after the hash of its key. Reading a value
+    refreshes its modification time, which orders the eviction of the least
+    recently used values once the directory exceeds max_size bytes.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = Path(directory).expanduser()
+        self.max_size = max_size
+
+    def path(self, key):
+        """Return the file holding the value of a key."""
+        return self.directory / hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        """Return the value stored for the key or None."""
+        path = self.path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def open(self, key):
+        """Return the file of the value stored for the key open for reading, or None."""
+        path = self.path(key)
+        try:
+            f = open(path, 'rb')
+            os.utime(path)
+            return f
+        except OSError:
+            return None
+
+    @contextmanager
+    def writer(self, key):
+        """Context manager yielding a binary file whose content becomes the value of the key.
+
+        The value is stored, then old ones evicted, only when the block
+        exits without error, so large values are written without holding
+        them in memory.
+        """
+        path = self.path(key)
+        makedirs(self.directory)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            with open(tmp, 'wb', opener=private) as f:
+                yield f
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        os.replace(tmp, path)
+        self.evict()
+
+    def put(self, key, data):
+        """Store a value then evict old ones beyond the size limit."""
+        path = self.path(key)
+        try:
+            makedirs(self.directory)
+            tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp, 'wb', opener=private) as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used values beyond max_size."""
+        entries = []
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
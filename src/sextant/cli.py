@@ -1,68 +1,453 @@
 import click
 import logging
+import sys
+import time
 from importlib import import_module
 from importlib.metadata import version
-from rich import print as rprint
-from rich.console import Console
-from rich.table import Table
-import httpx
-from sextant import SextantError, SextantConfigurationError
-from sextant.config import SextantConfig
+from sextant import SextantError
+from sextant.config import CONFIG_FILE, SextantConfig
+from sextant.output import format_option
+from sextant import daemon
 
-def entrypoint():
-    """Controller registering commands from config."""
+
+class LazyGroup(click.Group):
+    """Group registering endpoints as subcommands without importing their client.
+
+    Endpoint names come from the configuration and the client module is only
+    imported when its subcommand is actually invoked, so `sextant --help` or a
+    single-endpoint run don't pay for loading every client.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.endpoints = {}
+
+    def list_commands(self, ctx):
+        return sorted(set(self.commands) | set(self.endpoints))
+
+    def get_command(self, ctx, name):
+        if name in self.commands:
+            return self.commands[name]
+        if name not in self.endpoints:
+            return None
+        client = self.endpoints[name]
+        try:
+            return import_module(f"sextant.clients.{client}.commands").main
+        except ModuleNotFoundError:
+            click.secho(f"No client found for {client}", fg='red', err=True)
+            return None
+
+    def format_commands(self, ctx, formatter):
+        """List commands using the client type as help for endpoints."""
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                if not self.commands[name].hidden:
+                    rows.append((name, self.commands[name].get_short_help_str()))
+            else:
+                rows.append((name, f"{self.endpoints[name]} endpoint"))
+
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup)
+@click.version_option(version("sextant"), prog_name="sextant")
+@click.option('--verbose', '-v', is_flag=True, help='Enable verbose output')
+@click.option('--no-cache', is_flag=True, help='Bypass the HTTP response cache')
+@click.option('--refresh', is_flag=True, help='Refresh cached HTTP responses')
+@click.option('--profile', is_flag=True, help='Print HTTP request statistics on exit')
+@click.option('--profile-out', type=click.Path(dir_okay=False), help='Write a cProfile dump to this file')
+@click.pass_context
+def cli(ctx, verbose, no_cache, refresh, profile, profile_out):
+    """Sextant."""
+    from sextant import http
+
+    ctx.ensure_object(dict)
+    http.OPTIONS['cache'] = 'off' if no_cache else 'refresh' if refresh else 'on'
+    http.OPTIONS['profile'] = None
+    if profile or profile_out:
+        from rich.console import Console
+        from sextant.profile import Profiler
+
+        profiler = Profiler(dump=profile_out)
+        http.OPTIONS['profile'] = profiler
+
+        def report():
+            profiler.stop()
+            http.OPTIONS['profile'] = None
+            if profile:
+                profiler.report(Console(stderr=True))
+        ctx.call_on_close(report)
+        profiler.start()
+    log = logging.getLogger('sextant')
+    log.setLevel(logging.INFO if verbose else logging.WARNING)
+    if not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        log.addHandler(handler)
+
+
+class ConnectTracer:
+    """Measure time spent opening connections through httpcore trace events."""
+
+    def __init__(self):
+        self.connect = 0.0
+        self._started = None
+
+    def attach(self, request):
+        """Request event hook enabling the trace extension."""
+        request.extensions['trace'] = self.trace
+
+    def trace(self, event, info):
+        if event == 'connection.connect_tcp.started':
+            self._started = time.perf_counter()
+        elif event in ('connection.connect_tcp.complete', 'connection.start_tls.complete'):
+            if self._started is not None:
+                self.connect += time.perf_counter() - self._started
+                self._started = time.perf_counter()
+        elif event == 'connection.start_tls.started':
+            self._started = time.perf_counter()
+
+
+def reveal_endpoints(config, names):
+    """Reveal the secrets of endpoints with a single `op` call before their clients are built.
+
+    On failure, the reveal of each endpoint reports its own error.
+    """
     try:
-        config = SextantConfig()
+        config.reveal_many(names)
+    except SextantError as e:
+        logging.getLogger('sextant').info(f"Can't reveal secrets at once: {e}")
+
+
+def check_endpoint(config, endpoint, timeout):
+    """Check a single endpoint, return its check table cells."""
+    import httpx
+
+    def ms(seconds):
+        return f"{seconds * 1000:.0f}ms"
+
+    client_type = endpoint['client']
+    secrets = connect = api = '-'
+    try:
+        module = import_module(f"sextant.clients.{client_type}")
+        start = time.perf_counter()
+        ep_config = config.reveal(endpoint['name'])
+        secrets = ms(time.perf_counter() - start)
+
+        client = module.Client.from_config(ep_config)
+        client.http.timeout = httpx.Timeout(timeout)
+        tracer = ConnectTracer()
+        client.http.event_hooks['request'].append(tracer.attach)
+        try:
+            start = time.perf_counter()
+            info = client.check()
+            elapsed = time.perf_counter() - start
+            connect, api = ms(tracer.connect), ms(elapsed - tracer.connect)
+            return '[green]ok[/green]', secrets, connect, api, info
+        finally:
+            client.close()
+    except ModuleNotFoundError:
+        return '[yellow]skip[/yellow]', secrets, connect, api, 'client not found'
+    except httpx.TimeoutException as e:
+        return '[red]timeout[/red]', secrets, connect, api, f"no answer within {timeout}s ({type(e).__name__})"
+    except httpx.HTTPStatusError as e:
+        return '[red]error[/red]', secrets, connect, api, f"{e.response.status_code} {e.response.reason_phrase}"
+    except Exception as e:
+        return '[red]error[/red]', secrets, connect, api, str(e)
+
+
+def check_endpoints(config, endpoints, jobs, timeout):
+    """Return the check table cells of endpoints, checking up to jobs at once.
+
+    Each endpoint is given timeout seconds once started and reported as
+    timed out past it. Checks run in daemon threads, so a stuck endpoint is
+    abandoned and doesn't hold the command.
+    """
+    from concurrent.futures import FIRST_COMPLETED, Future, wait
+    import threading
+
+    def start(endpoint):
+        future = Future()
+        future.set_running_or_notify_cancel()
+
+        def target():
+            try:
+                future.set_result(check_endpoint(config, endpoint, timeout))
+            except BaseException as e:
+                future.set_exception(e)
+        threading.Thread(target=target, daemon=True).start()
+        return future
+
+    queue = list(endpoints)
+    running = {}
+    results = {}
+    while queue or running:
+        while queue and len(running) < max(jobs, 1):
+            endpoint = queue.pop(0)
+            running[start(endpoint)] = endpoint['name'], time.monotonic() + timeout
+        first = min(deadline for _, deadline in running.values())
+        done, _ = wait(running, timeout=max(first - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            name, _ = running.pop(future)
+            results[name] = future.result()
+        now = time.monotonic()
+        for future, (name, deadline) in list(running.items()):
+            if deadline <= now:
+                del running[future]
+                results[name] = '[red]timeout[/red]', '-', '-', '-', f"no answer within {timeout}s"
+    return [results[endpoint['name']] for endpoint in endpoints]
+
+
+@cli.command()
+@click.option('--jobs', '-j', default=8, help='Number of endpoints checked concurrently')
+@click.option('--timeout', '-t', default=10.0, help='Deadline in seconds for each endpoint')
+@click.pass_obj
+def check(obj, jobs, timeout):
+    """Test authentication against all endpoints.
+
+    Secrets of all endpoints are revealed at once, then endpoints are
+    checked concurrently. The table breaks down the time spent revealing
+    secrets, opening the connection (TCP and TLS) and waiting for the API
+    to answer.
+    """
+    from rich.console import Console
+    from rich.table import Table
 
-        @click.group()
-        @click.version_option(version("sextant"), prog_name="sextant")
-        @click.option('--verbose', '-v', is_flag=True, help='Enable verbose output')
-        @click.pass_context
-        def cli(ctx, verbose):
-            """Sextant."""
-            ctx.ensure_object(dict)
-            ctx.obj['config'] = config
-            log = logging.getLogger('sextant')
-            log.setLevel(logging.INFO if verbose else logging.WARNING)
-            if not log.handlers:
-                handler = logging.StreamHandler()
-                handler.setFormatter(logging.Formatter('%(message)s'))
-                log.addHandler(handler)
-
-        @cli.command()
-        def check():
-            """Test authentication against all endpoints."""
-            table = Table('endpoint', 'client', 'status', 'info')
-
-            for endpoint in config.endpoints:
-                name = endpoint['name']
-                client_type = endpoint['client']
-                try:
-                    module = import_module(f"sextant.clients.{client_type}")
-                    ep_config = config.reveal(name)
-                    client = module.Client.from_config(ep_config)
-                    try:
-                        info = client.check()
-                        table.add_row(name, client_type, '[green]ok[/green]', info)
-                    finally:
-                        client.http.close()
-                except ModuleNotFoundError:
-                    table.add_row(name, client_type, '[yellow]skip[/yellow]', 'client not found')
-                except httpx.HTTPStatusError as e:
-                    table.add_row(name, client_type, '[red]error[/red]', f"{e.response.status_code} {e.response.reason_phrase}")
-                except Exception as e:
-                    table.add_row(name, client_type, '[red]error[/red]', str(e))
-
-            Console().print(table)
-
-        for endpoint in config.endpoints:
+    config = obj['config']
+    table = Table('endpoint', 'client', 'status', 'secrets', 'connect', 'api', 'info')
+    start = time.perf_counter()
+    reveal_endpoints(config, [ep['name'] for ep in config.endpoints])
+    table.caption = f"secrets revealed in {(time.perf_counter() - start) * 1000:.0f}ms"
+
+    results = check_endpoints(config, config.endpoints, jobs, timeout)
+    for endpoint, cells in zip(config.endpoints, results):
+        table.add_row(endpoint['name'], endpoint['client'], *cells)
+
+    Console().print(table)
+
+
+@cli.command()
+@click.argument('indicators', nargs=-1, required=True)
+@click.option('--from', '-f', 'from_', default='7d', help='Relative time window (e.g. 1h, 7d)')
+@click.option('--limit', '-n', default=100, help='Max hits per endpoint')
+@click.option('--endpoint', '-e', 'names', multiple=True, help='Endpoint to search (repeatable, default: all)')
+@format_option(piped='ndjson')
+@click.pass_obj
+def hunt(obj, indicators, from_, limit, names, fmt):
+    """Search indicators on all endpoints at once.
+
+    Indicators are hostnames, IP addresses or file hashes (MD5, SHA1,
+    SHA256). Each endpoint translates them into its own query: a Splunk
+    search, SentinelOne threats, Sysdig events or TheHive observables.
+    Hits are shown as each endpoint answers.
+
+    \b
+    Examples:
+      sextant hunt myhost
+      sextant hunt --from 30d 44d88612fea8a8f36de82e1278abb02f 10.0.0.12
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime, timezone
+    import httpx
+    from rich.live import Live
+    from rich.table import Table
+    from sextant import aio
+    from sextant import hunt as federated
+    from sextant.output import write_records
+    from sextant.utils import Lazy, deshumanize
+
+    config = obj['config']
+    shared = obj.get('clients')
+    indicators = [(federated.classify(value), value) for value in indicators]
+    since = datetime.now(timezone.utc) - deshumanize(from_)
+    endpoints = [ep for ep in config.endpoints if not names or ep['name'] in names]
+
+    modules = {}
+    for endpoint in endpoints:
+        try:
+            module = import_module(f"sextant.clients.{endpoint['client']}")
+        except ModuleNotFoundError as e:
+            click.secho(f"{endpoint['name']}: {e}", fg='red', err=True)
+            continue
+        if hasattr(getattr(module, 'AsyncClient', None), 'hunt'):
+            modules[endpoint['name']] = module
+    reveal_endpoints(config, list(modules))
+
+    def connect(name, module):
+        """Return the client of an endpoint."""
+        def factory():
+            return module.Client.from_config(config.reveal(name))
+
+        if shared is not None:
+            client = shared.setdefault(name, Lazy(factory))
+            client.async_client  # build the client in this thread
+            return client
+        return factory()
+
+    clients = {}
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = {name: pool.submit(connect, name, module) for name, module in modules.items()}
+        for name, future in futures.items():
+            try:
+                clients[name] = future.result()
+            except Exception as e:
+                click.secho(f"{name}: {e}", fg='red', err=True)
+    if not clients:
+        raise click.ClickException('no endpoint supports hunting')
+
+    def hits():
+        for name, item in aio.iterate(federated.hunt(
+                {name: c.async_client for name, c in clients.items()}, indicators, since, limit)):
+            if isinstance(item, httpx.HTTPStatusError):
+                click.secho(f"{name}: {item.response.status_code} {item.response.reason_phrase}",
+                            fg='red', err=True)
+            elif isinstance(item, Exception):
+                click.secho(f"{name}: {item}", fg='red', err=True)
+            else:
+                yield {'endpoint': name, 'indicator': federated.matched(indicators, item), **item}
+
+    try:
+        if fmt == 'table':
+            table = Table('endpoint', 'time', 'host', 'indicator', 'summary', 'ref', title='Hunt')
+            with Live(table, refresh_per_second=4):
+                for hit in hits():
+                    table.add_row(hit['endpoint'], hit['time'], hit['host'], hit['indicator'],
+                                  hit['summary'], hit['ref'])
+        else:
+            write_records(hits(), fmt)
+    finally:
+        if shared is None:
+            for client in clients.values():
+                client.close()
+
+
+@cli.command()
+@click.argument('names', nargs=-1)
+@click.option('--resource', '-r', 'resources', multiple=True, help='Resource to sync (repeatable, default: all)')
+@click.option('--from', '-f', 'from_', default='7d', help='Time window of the first sync (e.g. 7d, 30d)')
+@click.option('--lookback', default='1h', help='Records before the previous sync fetched again, indexed late')
+@click.pass_obj
+def sync(obj, names, resources, from_, lookback):
+    """Copy new records of endpoints to the local store (default: all endpoints).
+
+    Each sync only fetches the records newer than the previous one, less
+    --lookback to catch records indexed late. List commands read the store
+    with --local.
+
+    \b
+    Examples:
+      sextant sync
+      sextant sync s1 --resource threat --from 30d
+    """
+    import httpx
+    from datetime import datetime
+    from sextant.store import Store
+    from sextant.utils import Lazy, deshumanize
+
+    config = obj['config']
+    shared = obj.get('clients')
+    unknown = set(names) - {ep['name'] for ep in config.endpoints}
+    if unknown:
+        raise click.UsageError(f"unknown endpoint: {', '.join(sorted(unknown))}")
+
+    modules = {}
+    for endpoint in config.endpoints:
+        name = endpoint['name']
+        if names and name not in names:
+            continue
+        module = import_module(f"sextant.clients.{endpoint['client']}")
+        if hasattr(module.Client, 'SYNC'):
+            modules[name] = module
+        elif names:
+            click.secho(f"{name}: {endpoint['client']} records can't be synced", fg='yellow', err=True)
+    reveal_endpoints(config, list(modules))
+
+    store = Store()
+    try:
+        for name, module in modules.items():
+            def factory(name=name, module=module):
+                return module.Client.from_config(config.reveal(name))
+
+            client = shared.setdefault(name, Lazy(factory)) if shared is not None else Lazy(factory)
             try:
-                module = import_module(f"sextant.clients.{endpoint['client']}")
-                cli.add_command(module.main, endpoint['name'])
-            except ModuleNotFoundError:
-                rprint(f"[red]No client found for {endpoint['client']}")
+                for resource in module.Client.SYNC:
+                    if resources and resource not in resources:
+                        continue
+                    since = store.resume(name, resource, deshumanize(lookback).total_seconds())
+                    if since is None:
+                        since = (datetime.now() - deshumanize(from_)).timestamp()
+                    synced = time.time()
+                    count = store.sync(name, resource, client.sync(resource, since), since, synced)
+                    click.echo(f"{name} {resource}: {count} records since "
+                               f"{datetime.fromtimestamp(since):%Y-%m-%d %H:%M:%S}")
+            except httpx.HTTPStatusError as e:
+                click.secho(f"{name}: {e.response.status_code} {e.response.reason_phrase}", fg='red', err=True)
+            except httpx.TransportError as e:
+                click.secho(f"{name}: {e}", fg='red', err=True)
+            finally:
+                if shared is None and client._instance is not None:
+                    client._instance.close()
+    finally:
+        store.close()
+
+
+@cli.group()
+def secrets():
+    """Manage cached secrets."""
+
+
+@secrets.command()
+@click.argument('names', nargs=-1)
+@click.pass_obj
+def flush(obj, names):
+    """Remove secrets of endpoints from the keyring cache (default: all)."""
+    flushed = obj['config'].flush(list(names) or None)
+    click.echo(f"flushed: {', '.join(flushed) or 'nothing'}")
+
+
+@cli.command()
+@click.option('--socket', 'path', type=click.Path(), default=str(daemon.SOCKET),
+              help='Unix socket to listen on')
+def serve(path):
+    """Run commands sent by the CLI, keeping endpoints warm.
 
-        cli()
+    While the daemon runs, sextant commands are forwarded to it over its
+    Unix socket. Configuration, revealed secrets and HTTP connections are
+    kept between commands, which are run one at a time.
+    """
+    import signal
+    from pathlib import Path
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        click.echo(f"listening on {Path(path).expanduser()}", err=True)
+        daemon.Daemon(SextantConfig).serve(cli, CONFIG_FILE, Path(path))
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    except KeyboardInterrupt:
+        pass
+
+
+def entrypoint():
+    """Controller registering commands from config."""
+    if sys.argv[1:2] != ['serve']:
+        code = daemon.forward(sys.argv[1:])
+        if code is not None:
+            sys.exit(code)
+
+    try:
+        config = SextantConfig()
+        cli.endpoints = {ep['name']: ep['client'] for ep in config.endpoints}
+        cli(obj={'config': config})
 
     except SextantError as e:
-        rprint(f"[red]{e}[/red]")
+        click.secho(str(e), fg='red')
+
+    finally:
+        # the shared loop only exists when a command used an async client
+        aio = sys.modules.get('sextant.aio')
+        if aio is not None:
+            aio.close()
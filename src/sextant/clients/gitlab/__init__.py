@@ -1,2 +1,2 @@
-from sextant.clients.gitlab.client import GitLabClient as Client
+from sextant.clients.gitlab.client import GitLabClient as Client, AsyncGitLabClient as AsyncClient
 from sextant.clients.gitlab.commands import main
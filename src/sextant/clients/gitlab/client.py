@@ -1,5 +1,11 @@
+import asyncio
 import logging
+from collections import deque
 import httpx
+from sextant import aio
+from sextant.codec import loads
+from sextant.http import build_async_client, build_client, settings
+from sextant.utils import Lazy
 
 logger = logging.getLogger('sextant')
 
@@ -7,8 +13,13 @@ logger = logging.getLogger('sextant')
 class GitLabClient:
     """GitLab REST API client."""
 
-    def __init__(self, http: httpx.Client):
+    CACHE_PATHS = {
+        '/api/v4/projects': '10m',
+    }
+
+    def __init__(self, http: httpx.Client, async_client=None):
         self.http = http
+        self.async_client = async_client
 
     def paginate(self, path, params=None):
         """Yield all items from a paginated GitLab endpoint."""
@@ -19,7 +30,7 @@ class GitLabClient:
             params['page'] = page
             r = self.http.get(path, params=params)
             r.raise_for_status()
-            items = r.json()
+            items = loads(r.content)
             if not items:
                 break
             yield from items
@@ -31,19 +42,24 @@ class GitLabClient:
     @classmethod
     def from_config(cls, config):
         """Build a GitLabClient from a revealed endpoint config dict."""
-        http = httpx.Client(
-            base_url=config['remote'],
+        http = build_client(
+            config,
+            cache_paths=cls.CACHE_PATHS,
+            defaults={'read_timeout': 120},
             headers={'PRIVATE-TOKEN': config['credentials']['secret']},
-            verify=config.get('verify', True),
-            timeout=120,
         )
-        return cls(http)
+        return cls(http, Lazy(lambda: AsyncGitLabClient.from_config(config)))
+
+    def close(self):
+        """Close the connections of the client and of its async counterpart."""
+        self.http.close()
+        aio.close_client(self.async_client)
 
     def check(self):
         """Verify authentication, return current user info string."""
         r = self.http.get('/api/v4/user')
         r.raise_for_status()
-        user = r.json()
+        user = loads(r.content)
         return f"{user['username']} ({user['name']})"
 
     def list_projects(self, search=None, membership=True):
@@ -55,13 +71,13 @@ class GitLabClient:
             params['search'] = search
         r = self.http.get('/api/v4/projects', params=params)
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def get_project(self, project_id):
         """Return a single project dict."""
         r = self.http.get(f'/api/v4/projects/{project_id}')
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def list_merge_requests(self, project_id=None, state='opened', author=None):
         """Return merge requests, optionally scoped to a project."""
@@ -74,13 +90,13 @@ class GitLabClient:
             path = '/api/v4/merge_requests'
         r = self.http.get(path, params=params)
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def get_merge_request(self, project_id, mr_iid):
         """Return a single merge request dict."""
         r = self.http.get(f'/api/v4/projects/{project_id}/merge_requests/{mr_iid}')
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def list_issues(self, project_id=None, state='opened', assignee=None):
         """Return issues, optionally scoped to a project."""
@@ -93,7 +109,7 @@ class GitLabClient:
             path = '/api/v4/issues'
         r = self.http.get(path, params=params)
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def list_pipelines(self, project_id, status=None, ref=None):
         """Return pipelines for a project."""
@@ -104,13 +120,13 @@ class GitLabClient:
             params['ref'] = ref
         r = self.http.get(f'/api/v4/projects/{project_id}/pipelines', params=params)
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def get_pipeline(self, project_id, pipeline_id):
         """Return a single pipeline dict."""
         r = self.http.get(f'/api/v4/projects/{project_id}/pipelines/{pipeline_id}')
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def list_pipeline_jobs(self, project_id, pipeline_id):
         """Return jobs for a pipeline."""
@@ -120,7 +136,7 @@ class GitLabClient:
             params=params,
         )
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def list_registry_repositories(self, project_id):
         """Return container registry repositories for a project."""
@@ -130,15 +146,95 @@ class GitLabClient:
         ))
 
     def list_all_images(self, include_personal=False):
-        """Yield (project, repositories) for every project with images."""
-        params = {'archived': 'false', 'simple': 'true', 'order_by': 'path', 'sort': 'asc'}
-        for project in self.paginate('/api/v4/projects', params):
-            if not include_personal and project.get('namespace', {}).get('kind') == 'user':
-                continue
+        """Yield (project, repositories) for every project with images.
+
+        Registries are listed concurrently on the async client.
+        """
+        yield from aio.iterate(self.async_client.list_all_images(include_personal))
+
+
+class AsyncGitLabClient:
+    """GitLab REST API client running requests concurrently."""
+
+    def __init__(self, http: httpx.AsyncClient, concurrency=8):
+        self.http = http
+        self.concurrency = concurrency
+
+    @classmethod
+    def from_config(cls, config):
+        """Build an AsyncGitLabClient from a revealed endpoint config dict."""
+        defaults = {'read_timeout': 120}
+        http = build_async_client(
+            config,
+            cache_paths=GitLabClient.CACHE_PATHS,
+            defaults=defaults,
+            headers={'PRIVATE-TOKEN': config['credentials']['secret']},
+        )
+        return cls(http, settings(config, defaults)['concurrency'])
+
+    async def paginate(self, path, params=None):
+        """Yield all items from a paginated GitLab endpoint."""
+        params = dict(params or {})
+        params.setdefault('per_page', 100)
+        page = 1
+        while True:
+            params['page'] = page
+            r = await self.http.get(path, params=params)
+            r.raise_for_status()
+            items = loads(r.content)
+            if not items:
+                break
+            for item in items:
+                yield item
+            next_page = r.headers.get('x-next-page', '')
+            if not next_page:
+                break
+            page = int(next_page)
+
+    async def check(self):
+        """Verify authentication, return current user info string."""
+        r = await self.http.get('/api/v4/user')
+        r.raise_for_status()
+        user = loads(r.content)
+        return f"{user['username']} ({user['name']})"
+
+    async def list_registry_repositories(self, project_id):
+        """Return container registry repositories for a project."""
+        return [repo async for repo in self.paginate(
+            f'/api/v4/projects/{project_id}/registry/repositories',
+            params={'tags': True, 'tags_count': True},
+        )]
+
+    async def list_all_images(self, include_personal=False):
+        """Yield (project, repositories) for every project with images, in project order.
+
+        Registries of upcoming projects are fetched while earlier ones are
+        yielded, keeping a bounded window of requests ahead.
+        """
+        async def repositories(project):
             try:
-                repos = self.list_registry_repositories(project['id'])
+                return await self.list_registry_repositories(project['id'])
             except httpx.HTTPStatusError as e:
                 logger.info(f"{project['path_with_namespace']}: {e.response.status_code}")
-                continue
-            if repos:
-                yield project, repos
+                return None
+
+        window = deque()
+        params = {'archived': 'false', 'simple': 'true', 'order_by': 'path', 'sort': 'asc'}
+        try:
+            async for project in self.paginate('/api/v4/projects', params):
+                if not include_personal and project.get('namespace', {}).get('kind') == 'user':
+                    continue
+                window.append((project, asyncio.ensure_future(repositories(project))))
+                while window and (window[0][1].done() or len(window) > self.concurrency * 4):
+                    project, task = window.popleft()
+                    repos = await task
+                    if repos:
+                        yield project, repos
+            while window:
+                project, task = window.popleft()
+                repos = await task
+                if repos:
+                    yield project, repos
+        finally:
+            for _, task in window:
+                task.cancel()
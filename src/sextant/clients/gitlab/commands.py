@@ -6,6 +6,7 @@ import json
 from rich.console import Console
 from rich.live import Live
 from rich.table import Table
+from sextant.output import format_option, write_records
 from sextant.utils import Lazy
 from sextant.clients.gitlab.client import GitLabClient
 
@@ -30,12 +31,18 @@ def main(ctx):
         config = ctx.obj['config'].reveal(ctx.info_name)
         return GitLabClient.from_config(config)
 
+    clients = ctx.obj.get('clients')
+    if clients is not None:
+        # shared clients are closed by their owner (sextant serve)
+        ctx.obj['client'] = clients.setdefault(ctx.info_name, Lazy(factory))
+        return
+
     client = Lazy(factory)
     ctx.obj['client'] = client
 
     def cleanup():
         if client._instance is not None:
-            client._instance.http.close()
+            client._instance.close()
     ctx.call_on_close(cleanup)
 
 
@@ -47,13 +54,14 @@ def project():
 @project.command('list')
 @click.option('--search', '-s', help='Search project name')
 @click.option('--all', 'all_', is_flag=True, help='Include non-member projects')
+@format_option
 @click.pass_obj
-def list_project(obj, search, all_):
+def list_project(obj, search, all_, fmt):
     """List projects."""
     try:
         projects = obj['client'].list_projects(search=search, membership=not all_)
 
-        if sys.stdout.isatty():
+        if fmt == 'table':
             table = Table('id', 'project', 'visibility', 'url')
             for p in projects:
                 table.add_row(
@@ -64,7 +72,7 @@ def list_project(obj, search, all_):
                 )
             Console().print(table)
         else:
-            click.echo(json.dumps(projects))
+            write_records(projects, fmt)
 
     except httpx.HTTPStatusError as e:
         click.echo(e.response.text, err=True)
@@ -98,8 +106,9 @@ def get_project(obj, project_id):
 @main.command()
 @click.option('--search', '-s', help='Filter images by name')
 @click.option('--personal', is_flag=True, help='Include personal (user-namespace) projects')
+@format_option(piped='ndjson')
 @click.pass_obj
-def images(obj, search, personal):
+def images(obj, search, personal, fmt):
     """List all container images across all projects."""
     try:
         stream = obj['client'].list_all_images(include_personal=personal)
@@ -107,13 +116,14 @@ def images(obj, search, personal):
         def matches(repo):
             return not search or search.lower() in repo['path'].lower()
 
-        if not sys.stdout.isatty():
-            for project, repos in stream:
-                for repo in repos:
-                    if not matches(repo):
-                        continue
-                    repo['project'] = project['path_with_namespace']
-                    click.echo(json.dumps(repo))
+        if fmt != 'table':
+            def records():
+                for project, repos in stream:
+                    for repo in repos:
+                        if matches(repo):
+                            repo['project'] = project['path_with_namespace']
+                            yield repo
+            write_records(records(), fmt)
             return
 
         table = Table('project', 'image', 'tags')
@@ -151,15 +161,16 @@ def mr():
 @click.option('--project', '-p', 'project_id', help='Project ID or URL-encoded path')
 @click.option('--state', type=click.Choice(['opened', 'closed', 'merged', 'all']), default='opened')
 @click.option('--author', help='Filter by author username')
+@format_option
 @click.pass_obj
-def list_mr(obj, project_id, state, author):
+def list_mr(obj, project_id, state, author, fmt):
     """List merge requests."""
     try:
         mrs = obj['client'].list_merge_requests(
             project_id=project_id, state=state, author=author,
         )
 
-        if sys.stdout.isatty():
+        if fmt == 'table':
             table = Table('iid', 'project', 'state', 'author', 'title')
             for m in mrs:
                 style = 'green' if m['state'] == 'merged' else 'default'
@@ -173,7 +184,7 @@ def list_mr(obj, project_id, state, author):
                 )
             Console().print(table)
         else:
-            click.echo(json.dumps(mrs))
+            write_records(mrs, fmt)
 
     except httpx.HTTPStatusError as e:
         click.echo(e.response.text, err=True)
@@ -213,15 +224,16 @@ def issue():
 @click.option('--project', '-p', 'project_id', help='Project ID or URL-encoded path')
 @click.option('--state', type=click.Choice(['opened', 'closed', 'all']), default='opened')
 @click.option('--assignee', help='Filter by assignee username')
+@format_option
 @click.pass_obj
-def list_issue(obj, project_id, state, assignee):
+def list_issue(obj, project_id, state, assignee, fmt):
     """List issues."""
     try:
         issues = obj['client'].list_issues(
             project_id=project_id, state=state, assignee=assignee,
         )
 
-        if sys.stdout.isatty():
+        if fmt == 'table':
             table = Table('iid', 'project', 'state', 'author', 'title')
             for i in issues:
                 table.add_row(
@@ -233,7 +245,7 @@ def list_issue(obj, project_id, state, assignee):
                 )
             Console().print(table)
         else:
-            click.echo(json.dumps(issues))
+            write_records(issues, fmt)
 
     except httpx.HTTPStatusError as e:
         click.echo(e.response.text, err=True)
@@ -248,15 +260,16 @@ def pipeline():
 @click.argument('project_id')
 @click.option('--status', type=click.Choice(['running', 'pending', 'success', 'failed', 'canceled', 'skipped']))
 @click.option('--ref', help='Filter by branch or tag')
+@format_option
 @click.pass_obj
-def list_pipeline(obj, project_id, status, ref):
+def list_pipeline(obj, project_id, status, ref, fmt):
     """List pipelines for a project."""
     try:
         pipelines = obj['client'].list_pipelines(
             project_id, status=status, ref=ref,
         )
 
-        if sys.stdout.isatty():
+        if fmt == 'table':
             table = Table('id', 'status', 'ref', 'sha', 'url')
             for p in pipelines:
                 style = PIPELINE_STATUS_STYLE.get(p['status'], 'default')
@@ -270,7 +283,7 @@ def list_pipeline(obj, project_id, status, ref):
                 )
             Console().print(table)
         else:
-            click.echo(json.dumps(pipelines))
+            write_records(pipelines, fmt)
 
     except httpx.HTTPStatusError as e:
         click.echo(e.response.text, err=True)
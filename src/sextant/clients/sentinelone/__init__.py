@@ -1,2 +1,2 @@
-from sextant.clients.sentinelone.client import SentinelOneClient as Client, ScriptResult
+from sextant.clients.sentinelone.client import SentinelOneClient as Client, AsyncSentinelOneClient as AsyncClient, ScriptResult
 from sextant.clients.sentinelone.commands import main
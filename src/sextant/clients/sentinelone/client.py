@@ -1,10 +1,20 @@
+import asyncio
+import os
 import time
 import tempfile
 import zipfile
 
 import httpx
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from pathlib import Path
+from sextant import aio
+from sextant.cache import makedirs, private
+from sextant.codec import dumps, loads
+from sextant.config import CACHE_DIR
+from sextant.http import OPTIONS, build_async_client, build_client, settings
+from sextant.utils import Lazy, deshumanize
 
 
 FETCH_PASSWORD = 'Sextant-Fetch1'
@@ -25,35 +35,155 @@ class ScriptResult:
     error: str = ''
 
 
+def timestamp(value):
+    """Return the timestamp in seconds of an ISO 8601 API date, 0 when missing."""
+    if not value:
+        return 0
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+class AgentIndex:
+    """Agents indexed by hostname for bulk lookups.
+
+    Hostnames are matched exactly, then case insensitively, then as a case
+    insensitive part of a hostname, the first agent listed winning.
+    """
+
+    def __init__(self, agents):
+        self.agents = list(agents)
+        self.exact = {}
+        self.folded = {}
+        for agent in self.agents:
+            name = agent.get('computerName') or ''
+            self.exact.setdefault(name, agent)
+            self.folded.setdefault(name.lower(), agent)
+
+    def find(self, name, partial=True):
+        """Return the agent matching a hostname or None, only matching whole hostnames unless partial."""
+        agent = self.exact.get(name) or self.folded.get(name.lower())
+        if agent is None and partial:
+            part = name.lower()
+            agent = next((a for folded, a in self.folded.items() if part in folded), None)
+        return agent
+
+
+class Inventory:
+    """On-disk snapshot of the id and hostname of every agent, valid for ttl seconds."""
+
+    def __init__(self, path, ttl):
+        self.path = Path(path).expanduser()
+        self.ttl = ttl
+
+    def load(self):
+        """Return the agents of the snapshot or None when missing or expired."""
+        try:
+            snapshot = loads(self.path.read_bytes())
+        except (OSError, ValueError):
+            return None
+        if time.time() - snapshot['time'] > self.ttl:
+            return None
+        return [{'id': id_, 'computerName': name} for id_, name in snapshot['agents']]
+
+    def save(self, agents):
+        """Replace the snapshot with the id and hostname of agents."""
+        snapshot = {'time': time.time(), 'agents': [[a['id'], a.get('computerName')] for a in agents]}
+        try:
+            makedirs(self.path.parent)
+            tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp, 'wb', opener=private) as f:
+                f.write(dumps(snapshot))
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
 class SentinelOneClient:
     """SentinelOne REST API client."""
 
-    def __init__(self, http: httpx.Client):
+    CACHE_PATHS = {
+        '/web/api/v2.1/remote-scripts': '1h',
+    }
+
+    def __init__(self, http: httpx.Client, async_client=None, inventory=None):
         self.http = http
+        self.async_client = async_client
+        self.inventory = inventory
 
     @classmethod
     def from_config(cls, config):
-        """Build a SentinelOneClient from a revealed endpoint config dict."""
-        http = httpx.Client(
-            base_url=config['remote'],
+        """Build a SentinelOneClient from a revealed endpoint config dict.
+
+        The inventory setting, a time to live, enables the snapshot of
+        agent hostnames used to resolve targets.
+        """
+        http = build_client(
+            config,
+            cache_paths=cls.CACHE_PATHS,
             headers={'Authorization': f"ApiToken {config['credentials']['secret']}"},
-            verify=config.get('verify', True),
         )
-        return cls(http)
+        inventory = None
+        if config.get('inventory'):
+            inventory = Inventory(
+                CACHE_DIR / 'inventory' / f"{config['name']}.json",
+                deshumanize(config['inventory']).total_seconds(),
+            )
+        return cls(http, Lazy(lambda: AsyncSentinelOneClient.from_config(config)), inventory)
+
+    def close(self):
+        """Close the connections of the client and of its async counterpart."""
+        self.http.close()
+        aio.close_client(self.async_client)
 
     def check(self):
         """Verify authentication, return system info string."""
         r = self.http.get('/web/api/v2.1/system/info')
         r.raise_for_status()
-        info = r.json()['data']
+        info = loads(r.content)['data']
         return f"{info['version']} (build {info['build']})"
 
-    def list_agents(self, limit=50, cursor=None, query=None, active=None,
-                    group_ids=None, site_ids=None):
-        """Return paginated agent list and pagination dict."""
-        params = {'limit': limit}
-        if cursor:
-            params['cursor'] = cursor
+    PAGE_SIZE = 1000
+
+    def get_page(self, path, params):
+        """Return the records and pagination dict of a page of a list endpoint."""
+        r = self.http.get(path, params=params)
+        r.raise_for_status()
+        body = loads(r.content)
+        return body['data'], body['pagination']
+
+    def paginate(self, path, params, limit=None, on_page=None):
+        """Yield the records of a list endpoint, following nextCursor.
+
+        Pages have the API maximum size and the next one is fetched in a
+        thread while the caller processes the current one. Stops after
+        limit records when set. Calls on_page(pagination) on each page if
+        provided.
+        """
+        size = min(limit, self.PAGE_SIZE) if limit else self.PAGE_SIZE
+        count = 0
+        with ThreadPoolExecutor(1) as pool:
+            future = pool.submit(self.get_page, path, {**params, 'limit': size})
+            while future:
+                records, pagination = future.result()
+                if on_page:
+                    on_page(pagination)
+                cursor = pagination.get('nextCursor')
+                future = None
+                if cursor and records and (not limit or count + len(records) < limit):
+                    if limit:
+                        size = min(size, limit - count - len(records))
+                    future = pool.submit(self.get_page, path, {**params, 'limit': size, 'cursor': cursor})
+                for record in records:
+                    yield record
+                    count += 1
+                    if limit and count >= limit:
+                        if future:
+                            future.cancel()
+                        return
+
+    @staticmethod
+    def agent_params(query=None, active=None, group_ids=None, site_ids=None):
+        """Return the filters of agent list requests."""
+        params = {}
         if query:
             params['computerName__contains'] = query
         if active is not None:
@@ -62,62 +192,118 @@ class SentinelOneClient:
             params['groupIds'] = ','.join(group_ids) if isinstance(group_ids, list) else group_ids
         if site_ids:
             params['siteIds'] = ','.join(site_ids) if isinstance(site_ids, list) else site_ids
+        return params
 
-        r = self.http.get('/web/api/v2.1/agents', params=params)
-        r.raise_for_status()
-        body = r.json()
-        return body['data'], body['pagination']
+    def list_agents(self, limit=50, cursor=None, **filters):
+        """Return paginated agent list and pagination dict, filters as in agent_params."""
+        params = {'limit': limit, **self.agent_params(**filters)}
+        if cursor:
+            params['cursor'] = cursor
+        return self.get_page('/web/api/v2.1/agents', params)
+
+    def iter_agents(self, limit=None, on_page=None, **filters):
+        """Yield agents of all pages, see paginate, filters as in agent_params."""
+        return self.paginate('/web/api/v2.1/agents', self.agent_params(**filters), limit, on_page)
 
     def get_agent(self, name):
         """Return a single agent dict matching the given hostname."""
         r = self.http.get('/web/api/v2.1/agents', params={'computerName__contains': name, 'limit': 1})
         r.raise_for_status()
-        data = r.json()['data']
+        data = loads(r.content)['data']
         if not data:
             raise LookupError(f"agent {name} not found")
         return data[0]
 
-    def list_threats(self, limit=50, cursor=None, incident_statuses=None,
-                     created_after=None, created_before=None):
-        """Return paginated threat list and pagination dict."""
-        params = {'limit': limit}
-        if cursor:
-            params['cursor'] = cursor
+    SWEEP_NAMES = 2000
+
+    def get_agents(self, names):
+        """Return the agents matching hostnames, None for those not found.
+
+        Up to SWEEP_NAMES hostnames are searched in concurrent batches,
+        more are matched against a sweep of all agents, which also refreshes
+        the inventory. See AgentIndex for the matching.
+        """
+        if len(names) <= self.SWEEP_NAMES:
+            return aio.run(self.async_client.get_agents(names))
+        index = AgentIndex(self.iter_agents())
+        if self.inventory is not None:
+            self.inventory.save(index.agents)
+        return [index.find(name) for name in names]
+
+    def find_agents(self, names):
+        """Return the id and hostname of the agents matching hostnames, None for those not found.
+
+        When enabled, the inventory snapshot answers for the hostnames it
+        holds exactly, ignoring case, the API being searched for the others:
+        a partial match in a stale snapshot could pick another host. The
+        snapshot is rebuilt with a sweep of all agents once expired.
+        """
+        mode = OPTIONS['cache']
+        if self.inventory is None or mode == 'off':
+            return self.get_agents(names)
+        agents = self.inventory.load() if mode == 'on' else None
+        if agents is None:
+            agents = list(self.iter_agents())
+            self.inventory.save(agents)
+        index = AgentIndex(agents)
+        found = [index.find(name, partial=False) for name in names]
+        missing = [name for name, agent in zip(names, found) if agent is None]
+        if missing:
+            searched = dict(zip(missing, self.get_agents(missing)))
+            found = [agent or searched[name] for name, agent in zip(names, found)]
+        return found
+
+    @staticmethod
+    def threat_params(incident_statuses=None, created_after=None, created_before=None):
+        """Return the filters of threat list requests."""
+        params = {}
         if incident_statuses:
             params['incidentStatuses'] = incident_statuses
         if created_after:
             params['createdAt__gte'] = created_after
         if created_before:
             params['createdAt__lte'] = created_before
+        return params
 
-        r = self.http.get('/web/api/v2.1/threats', params=params)
-        r.raise_for_status()
-        body = r.json()
-        return body['data'], body['pagination']
+    def list_threats(self, limit=50, cursor=None, **filters):
+        """Return paginated threat list and pagination dict, filters as in threat_params."""
+        params = {'limit': limit, **self.threat_params(**filters)}
+        if cursor:
+            params['cursor'] = cursor
+        return self.get_page('/web/api/v2.1/threats', params)
+
+    def iter_threats(self, limit=None, on_page=None, **filters):
+        """Yield threats of all pages, see paginate, filters as in threat_params."""
+        return self.paginate('/web/api/v2.1/threats', self.threat_params(**filters), limit, on_page)
 
     def get_threat(self, threat_id):
         """Return a single threat dict."""
         r = self.http.get('/web/api/v2.1/threats', params={'ids': threat_id})
         r.raise_for_status()
-        data = r.json()['data']
+        data = loads(r.content)['data']
         if not data:
             raise LookupError(f"threat {threat_id} not found")
         return data[0]
 
-    def list_scripts(self, limit=50, query=None, script_type=None, os_types=None):
-        """Return available remote scripts."""
-        params = {'limit': limit}
+    @staticmethod
+    def script_params(query=None, script_type=None, os_types=None):
+        """Return the filters of remote script list requests."""
+        params = {}
         if query:
             params['query'] = query
         if script_type:
             params['scriptType'] = script_type
         if os_types:
             params['osTypes'] = os_types
+        return params
 
-        r = self.http.get('/web/api/v2.1/remote-scripts', params=params)
-        r.raise_for_status()
-        body = r.json()
-        return body['data'], body['pagination']
+    def list_scripts(self, limit=50, **filters):
+        """Return available remote scripts, filters as in script_params."""
+        return self.get_page('/web/api/v2.1/remote-scripts', {'limit': limit, **self.script_params(**filters)})
+
+    def iter_scripts(self, limit=None, on_page=None, **filters):
+        """Yield remote scripts of all pages, see paginate, filters as in script_params."""
+        return self.paginate('/web/api/v2.1/remote-scripts', self.script_params(**filters), limit, on_page)
 
     def get_script(self, name):
         """Return a single script dict matching the given name."""
@@ -144,7 +330,7 @@ class SentinelOneClient:
 
         r = self.http.post('/web/api/v2.1/remote-scripts/execute', json=payload)
         r.raise_for_status()
-        return r.json()['data']
+        return loads(r.content)['data']
 
     TERMINAL_STATUSES = {'completed', 'failed', 'canceled', 'expired', 'partially_completed'}
 
@@ -153,7 +339,7 @@ class SentinelOneClient:
         params = {'parentTaskId': parent_task_id, 'limit': limit}
         r = self.http.get('/web/api/v2.1/remote-scripts/status', params=params)
         r.raise_for_status()
-        body = r.json()
+        body = loads(r.content)
         return body['data'], body['pagination']
 
     def wait_for_script(self, parent_task_id, interval=5, on_poll=None):
@@ -176,17 +362,9 @@ class SentinelOneClient:
             json={'data': {'taskIds': task_ids}},
         )
         r.raise_for_status()
-        data = r.json()['data']
+        data = loads(r.content)['data']
         return data.get('download_links', []), data.get('errors', [])
 
-    def download_file(self, url, dest):
-        """Download a file from a pre-signed URL to a local path."""
-        with httpx.stream('GET', url) as r:
-            r.raise_for_status()
-            with open(dest, 'wb') as f:
-                for chunk in r.iter_bytes():
-                    f.write(chunk)
-
     def fetch_script_results(self, parent_task_id, output_dir):
         """Download script results for a parent task and extract output.
 
@@ -207,6 +385,7 @@ class SentinelOneClient:
         error_by_task = {err['taskId']: err.get('errorString', '') for err in fetch_errors}
 
         results = []
+        downloads = []
         for task_id, task in tasks_by_id.items():
             result = ScriptResult(
                 task_id=task_id,
@@ -219,31 +398,32 @@ class SentinelOneClient:
             if task_id in error_by_task:
                 result.error = error_by_task[task_id]
             elif task_id in links_by_task:
-                link = links_by_task[task_id]
                 agent_name = task.get('agentComputerName', task_id)
-                dest = task_dir / f"{agent_name}_{task_id}.zip"
-                self.download_file(link['downloadUrl'], dest)
-                result.path = dest
-
-                with zipfile.ZipFile(dest) as zf:
-                    for name in zf.namelist():
-                        if name.startswith('stdout'):
-                            result.stdout = zf.read(name).decode(errors='replace').rstrip()
-                        elif name.startswith('stderr'):
-                            result.stderr = zf.read(name).decode(errors='replace').rstrip()
-                        else:
-                            result.files.append((name, zf.getinfo(name).file_size))
+                result.path = task_dir / f"{agent_name}_{task_id}.zip"
+                downloads.append((links_by_task[task_id]['downloadUrl'], result.path))
 
             results.append(result)
 
+        aio.run(self.async_client.download_files(downloads))
+
+        for result in results:
+            if result.path is None:
+                continue
+            with zipfile.ZipFile(result.path) as zf:
+                for name in zf.namelist():
+                    if name.startswith('stdout'):
+                        result.stdout = zf.read(name).decode(errors='replace').rstrip()
+                    elif name.startswith('stderr'):
+                        result.stderr = zf.read(name).decode(errors='replace').rstrip()
+                    else:
+                        result.files.append((name, zf.getinfo(name).file_size))
+
         return results
 
-    def list_activities(self, limit=50, cursor=None, activity_types=None,
-                        agent_ids=None, created_after=None, created_before=None):
-        """Return paginated activity list and pagination dict."""
-        params = {'limit': limit}
-        if cursor:
-            params['cursor'] = cursor
+    @staticmethod
+    def activity_params(activity_types=None, agent_ids=None, created_after=None, created_before=None):
+        """Return the filters of activity list requests."""
+        params = {}
         if activity_types:
             params['activityTypes'] = activity_types
         if agent_ids:
@@ -252,11 +432,39 @@ class SentinelOneClient:
             params['createdAt__gte'] = created_after
         if created_before:
             params['createdAt__lte'] = created_before
+        return params
 
-        r = self.http.get('/web/api/v2.1/activities', params=params)
-        r.raise_for_status()
-        body = r.json()
-        return body['data'], body['pagination']
+    def list_activities(self, limit=50, cursor=None, **filters):
+        """Return paginated activity list and pagination dict, filters as in activity_params."""
+        params = {'limit': limit, **self.activity_params(**filters)}
+        if cursor:
+            params['cursor'] = cursor
+        return self.get_page('/web/api/v2.1/activities', params)
+
+    def iter_activities(self, limit=None, on_page=None, **filters):
+        """Yield activities of all pages, see paginate, filters as in activity_params."""
+        return self.paginate('/web/api/v2.1/activities', self.activity_params(**filters), limit, on_page)
+
+    SYNC = ('threat', 'activity')
+
+    def sync(self, resource, since):
+        """Yield (id, time, host, severity, record) for records created since a timestamp in seconds."""
+        if resource == 'threat':
+            fetch = self.iter_threats
+        elif resource == 'activity':
+            fetch = self.iter_activities
+        else:
+            raise ValueError(f"unknown resource {resource}")
+
+        created_after = datetime.fromtimestamp(since, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        for r in fetch(created_after=created_after):
+            if resource == 'threat':
+                info = r.get('threatInfo', {})
+                host = r.get('agentRealtimeInfo', {}).get('agentComputerName')
+                yield r['id'], timestamp(info.get('createdAt')), host, info.get('confidenceLevel'), r
+            else:
+                host = r.get('data', {}).get('computerName')
+                yield r['id'], timestamp(r.get('createdAt')), host, None, r
 
     def fetch_files(self, agent_id, files, password=FETCH_PASSWORD):
         """Request the agent to upload specified files to the management console.
@@ -268,7 +476,7 @@ class SentinelOneClient:
             json={'data': {'files': files, 'password': password}},
         )
         r.raise_for_status()
-        return r.json()['data']
+        return loads(r.content)['data']
 
     UPLOAD_ACTIVITY_TYPES = '80'
 
@@ -317,3 +525,118 @@ class SentinelOneClient:
                 for name in src.namelist():
                     out.writestr(name, src.read(name, pwd=pwd))
             target.unlink()
+
+
+class AsyncSentinelOneClient:
+    """SentinelOne REST API client running requests concurrently."""
+
+    def __init__(self, http: httpx.AsyncClient, concurrency=8):
+        self.http = http
+        self.concurrency = concurrency
+
+    @classmethod
+    def from_config(cls, config):
+        """Build an AsyncSentinelOneClient from a revealed endpoint config dict."""
+        http = build_async_client(
+            config,
+            cache_paths=SentinelOneClient.CACHE_PATHS,
+            headers={'Authorization': f"ApiToken {config['credentials']['secret']}"},
+        )
+        return cls(http, settings(config)['concurrency'])
+
+    async def check(self):
+        """Verify authentication, return system info string."""
+        r = await self.http.get('/web/api/v2.1/system/info')
+        r.raise_for_status()
+        info = loads(r.content)['data']
+        return f"{info['version']} (build {info['build']})"
+
+    async def list_agents(self, limit=50, cursor=None, **filters):
+        """Return paginated agent list and pagination dict, filtered by API parameters."""
+        params = {'limit': limit, **filters}
+        if cursor:
+            params['cursor'] = cursor
+        r = await self.http.get('/web/api/v2.1/agents', params=params)
+        r.raise_for_status()
+        body = loads(r.content)
+        return body['data'], body['pagination']
+
+    async def get_agent(self, name):
+        """Return a single agent dict matching the given hostname or None."""
+        data, _ = await self.list_agents(limit=1, computerName__contains=name)
+        return data[0] if data else None
+
+    async def search_agents(self, names, batch=100):
+        """Return the agents whose hostname contains any of names, searching batch names per request."""
+        async def search(chunk):
+            agents = []
+            cursor = None
+            while True:
+                data, pagination = await self.list_agents(
+                    limit=SentinelOneClient.PAGE_SIZE, cursor=cursor, computerName__contains=','.join(chunk),
+                )
+                agents.extend(data)
+                cursor = pagination.get('nextCursor')
+                if not cursor or not data:
+                    return agents
+
+        chunks = [names[i:i + batch] for i in range(0, len(names), batch)]
+        return [agent for agents in await asyncio.gather(*map(search, chunks)) for agent in agents]
+
+    async def get_agents(self, names):
+        """Return the agents matching hostnames, None for those not found, see AgentIndex."""
+        index = AgentIndex(await self.search_agents(list(names)))
+        return [index.find(name) for name in names]
+
+    async def list_threats(self, limit=50, cursor=None, **filters):
+        """Return paginated threat list and pagination dict, filtered by API parameters."""
+        params = {'limit': limit, **filters}
+        if cursor:
+            params['cursor'] = cursor
+        r = await self.http.get('/web/api/v2.1/threats', params=params)
+        r.raise_for_status()
+        body = loads(r.content)
+        return body['data'], body['pagination']
+
+    async def hunt(self, indicators, since, limit=100):
+        """Yield threats matching file hashes or hostnames since a datetime."""
+        created = since.strftime('%Y-%m-%dT%H:%M:%SZ')
+        hashes = [value for kind, value in indicators if kind in ('md5', 'sha1', 'sha256')]
+        hosts = [value for kind, value in indicators if kind == 'host']
+        queries = []
+        if hashes:
+            queries.append({'contentHashes': ','.join(hashes)})
+        if hosts:
+            queries.append({'computerName__contains': ','.join(hosts)})
+        pages = await asyncio.gather(*(
+            self.list_threats(limit=limit, createdAt__gte=created, **query) for query in queries
+        ))
+        for threats, _ in pages:
+            for t in threats:
+                info = t.get('threatInfo', {})
+                yield {
+                    'time': info.get('createdAt', ''),
+                    'host': t.get('agentRealtimeInfo', {}).get('agentComputerName', ''),
+                    'summary': f"{info.get('threatName', '')} ({info.get('confidenceLevel', '')})",
+                    'ref': t.get('id', ''),
+                }
+
+    async def download_file(self, http, url, dest):
+        """Download a file from a pre-signed URL to a local path."""
+        async with http.stream('GET', url) as r:
+            r.raise_for_status()
+            with open(dest, 'wb') as f:
+                async for chunk in r.aiter_bytes():
+                    f.write(chunk)
+
+    async def download_files(self, downloads):
+        """Download (url, dest) pairs from pre-signed URLs concurrently.
+
+        Pre-signed URLs carry their own credentials, so they are fetched
+        without the API token, by a separate client.
+        """
+        if not downloads:
+            return
+        limits = httpx.Limits(max_connections=self.concurrency)
+        async with httpx.AsyncClient(limits=limits) as http:
+            await asyncio.gather(*(self.download_file(http, url, dest) for url, dest in downloads))
@@ -12,6 +12,8 @@ from rich.console import Console
 from rich.table import Table
 
 from sextant.clients.sentinelone.client import SentinelOneClient
+from sextant.output import format_option, write_records
+from sextant.store import local_records
 from sextant.utils import Lazy, humanize, deshumanize
 
 log = logging.getLogger(__name__)
@@ -61,53 +63,79 @@ def resolve_target_names(agent_names, hosts_file):
     return agent_names
 
 
-def wait_for_online(client, names, interval=30, timeout=3600, on_poll=None):
-    """Poll until all named agents report as active. Returns list of agent dicts."""
-    deadline = time.monotonic() + timeout
-    pending = set(names)
-    agents = {}
+def online_agents(client, names, interval=30, timeout=3600, on_poll=None):
+    """Yield lists of (name, agent) of the named agents as they come online.
 
-    while pending:
-        for name in list(pending):
-            try:
-                agent = client.get_agent(name)
-                if agent.get('isActive'):
-                    agents[name] = agent
-                    pending.discard(name)
-            except LookupError:
-                pass
+    Each poll looks the pending hostnames up together (see get_agents).
+    Calls on_poll(pending) between polls if provided. Raises TimeoutError
+    naming the agents still offline and the hostnames never found once
+    timeout seconds have passed.
+    """
+    deadline = time.monotonic() + timeout
+    pending = list(dict.fromkeys(names))
+
+    while True:
+        online, offline, unknown = [], [], []
+        for name, agent in zip(pending, client.get_agents(pending)):
+            if agent is None:
+                unknown.append(name)
+            elif agent.get('isActive'):
+                online.append((name, agent))
+            else:
+                offline.append(name)
+        if online:
+            yield online
 
+        pending = offline + unknown
         if not pending:
-            break
+            return
         if time.monotonic() >= deadline:
-            raise TimeoutError(f"agents not online within {timeout}s: {', '.join(sorted(pending))}")
+            message = f"agents not online within {timeout}s: {', '.join(sorted(offline)) or 'none'}"
+            if unknown:
+                message += f"; never found: {', '.join(sorted(unknown))}"
+            raise TimeoutError(message)
         if on_poll:
             on_poll(pending)
-        time.sleep(interval)
+        time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+
 
+def wait_for_online(client, names, interval=30, timeout=3600, on_poll=None):
+    """Poll until all named agents report as active. Returns list of agent dicts."""
+    agents = {}
+    for online in online_agents(client, names, interval, timeout, on_poll):
+        agents.update(online)
     return [agents[name] for name in names]
 
 
+def lookup_agents(client, names):
+    """Return the agents matching hostnames, with at least their id and hostname.
+
+    Raises LookupError naming the first hostname not found.
+    """
+    agents = client.find_agents(names)
+    for name, agent in zip(names, agents):
+        if agent is None:
+            raise LookupError(f"agent {name} not found")
+    return agents
+
+
 def resolve_agents(client, agent_names=None, group_ids=None, site_ids=None, target_all=False):
     """Resolve target agents from CLI targeting options. Returns a list of agent dicts."""
     if agent_names:
-        return [client.get_agent(name) for name in agent_names]
+        return lookup_agents(client, agent_names)
     if group_ids:
-        agents, _ = client.list_agents(group_ids=[g.strip() for g in group_ids.split(',')], active=True)
-        return agents
+        return list(client.iter_agents(group_ids=[g.strip() for g in group_ids.split(',')], active=True))
     if site_ids:
-        agents, _ = client.list_agents(site_ids=[s.strip() for s in site_ids.split(',')], active=True)
-        return agents
+        return list(client.iter_agents(site_ids=[s.strip() for s in site_ids.split(',')], active=True))
     if target_all:
-        agents, _ = client.list_agents(active=True)
-        return agents
+        return list(client.iter_agents(active=True))
     raise click.UsageError('Specify a target: --agent, --group, --site, or --all')
 
 
 def build_agent_filter(client, agent_names=None, group_ids=None, site_ids=None, target_all=False):
     """Build an API-level agent filter dict from CLI targeting options."""
     if agent_names:
-        return {'ids': [client.get_agent(name)['id'] for name in agent_names]}
+        return {'ids': [a['id'] for a in lookup_agents(client, agent_names)]}
     if group_ids:
         return {'groupIds': [g.strip() for g in group_ids.split(',')]}
     if site_ids:
@@ -125,12 +153,19 @@ def main(ctx):
         config = ctx.obj['config'].reveal(ctx.info_name)
         return SentinelOneClient.from_config(config)
 
+    ctx.obj['endpoint'] = ctx.info_name
+    clients = ctx.obj.get('clients')
+    if clients is not None:
+        # shared clients are closed by their owner (sextant serve)
+        ctx.obj['client'] = clients.setdefault(ctx.info_name, Lazy(factory))
+        return
+
     client = Lazy(factory)
     ctx.obj['client'] = client
 
     def cleanup():
         if client._instance is not None:
-            client._instance.http.close()
+            client._instance.close()
     ctx.call_on_close(cleanup)
 
 
@@ -142,10 +177,11 @@ def agent():
 @agent.command('list')
 @click.option('--query', '-q', help='Filter by hostname (contains)')
 @click.option('--active/--inactive', default=None, help='Filter by active status')
-@click.option('--limit', '-n', default=50, help='Max results to return')
+@click.option('--limit', '-n', default=50, help='Max results to return, 0 for all')
+@format_option
 @click.pass_obj
 @handle_errors
-def list_agents(obj, query, active, limit):
+def list_agents(obj, query, active, limit, fmt):
     """List agents.
 
     \b
@@ -154,11 +190,10 @@ def list_agents(obj, query, active, limit):
       sextant s1 agent list -q myhost
       sextant s1 agent list --active -n 10
     """
-    agents, pagination = obj['client'].list_agents(
-        limit=limit, query=query, active=active,
-    )
+    pagination = {}
+    agents = obj['client'].iter_agents(limit=limit, on_page=pagination.update, query=query, active=active)
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('id', 'hostname', 'os', 'version', 'status', 'last active', title='Agents')
         for a in agents:
             status = '[green]active[/green]' if a.get('isActive') else '[red]inactive[/red]'
@@ -178,9 +213,9 @@ def list_agents(obj, query, active, limit):
             )
         console = Console()
         console.print(table)
-        console.print(f"total: {pagination.get('totalItems', len(agents))}")
+        console.print(f"total: {pagination.get('totalItems', table.row_count)}")
     else:
-        click.echo(json.dumps(agents))
+        write_records(agents, fmt)
 
 
 @agent.command('get')
@@ -215,9 +250,10 @@ def get_agent(obj, name):
 
 @agent.command('check')
 @target_options
+@format_option
 @click.pass_obj
 @handle_errors
-def check_agents(obj, agent_names, group_ids, site_ids, target_all, hosts_file):
+def check_agents(obj, agent_names, group_ids, site_ids, target_all, hosts_file, fmt):
     """Check whether targeted agents are online.
 
     \b
@@ -229,12 +265,10 @@ def check_agents(obj, agent_names, group_ids, site_ids, target_all, hosts_file):
     """
     names = resolve_target_names(agent_names, hosts_file)
     if names:
-        agents = []
-        for name in names:
-            try:
-                agents.append(obj['client'].get_agent(name))
-            except LookupError:
-                agents.append({'computerName': name, 'isActive': False, 'notFound': True})
+        agents = [
+            agent or {'computerName': name, 'isActive': False, 'notFound': True}
+            for name, agent in zip(names, obj['client'].get_agents(names))
+        ]
     elif group_ids or site_ids or target_all:
         agents = resolve_agents(obj['client'], group_ids=group_ids, site_ids=site_ids, target_all=target_all)
     else:
@@ -243,7 +277,7 @@ def check_agents(obj, agent_names, group_ids, site_ids, target_all, hosts_file):
     if not agents:
         raise LookupError('no agents matched the target filter')
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('hostname', 'status', 'network', 'last active', title='Agent Status')
         for a in agents:
             hostname = a.get('computerName', '')
@@ -268,7 +302,7 @@ def check_agents(obj, agent_names, group_ids, site_ids, target_all, hosts_file):
         found = sum(1 for a in agents if not a.get('notFound'))
         console.print(f"online: {online}/{found}")
     else:
-        click.echo(json.dumps([
+        write_records((
             {
                 'hostname': a.get('computerName', ''),
                 'active': a.get('isActive', False),
@@ -277,7 +311,7 @@ def check_agents(obj, agent_names, group_ids, site_ids, target_all, hosts_file):
                 'found': not a.get('notFound', False),
             }
             for a in agents
-        ]))
+        ), fmt)
 
 
 @agent.command('fetch')
@@ -371,10 +405,12 @@ def threat():
     ['unresolved', 'in_progress', 'resolved'], case_sensitive=False),
     help='Filter by incident status')
 @click.option('--from', '-f', 'from_', default=None, help='Relative time window (e.g. 1h, 7d)')
-@click.option('--limit', '-n', default=50, help='Max results to return')
+@click.option('--limit', '-n', default=50, help='Max results to return, 0 for all')
+@click.option('--local', is_flag=True, help='Read synced records from the local store (see sextant sync)')
+@format_option
 @click.pass_obj
 @handle_errors
-def list_threats(obj, incident_status, from_, limit):
+def list_threats(obj, incident_status, from_, limit, local, fmt):
     """List threats.
 
     \b
@@ -383,17 +419,26 @@ def list_threats(obj, incident_status, from_, limit):
       sextant s1 threat list --status unresolved
       sextant s1 threat list --status unresolved --from 7d
     """
-    created_after = None
-    if from_:
-        created_after = (datetime.utcnow() - deshumanize(from_)).strftime('%Y-%m-%dT%H:%M:%SZ')
-
-    threats, pagination = obj['client'].list_threats(
-        limit=limit,
-        incident_statuses=incident_status,
-        created_after=created_after,
-    )
+    if local:
+        threats = local_records(
+            obj['endpoint'], 'threat', limit=limit,
+            since=(datetime.now() - deshumanize(from_)).timestamp() if from_ else None,
+            fields={'$.threatInfo.incidentStatus': incident_status} if incident_status else None,
+        )
+        pagination = {'totalItems': len(threats)}
+    else:
+        created_after = None
+        if from_:
+            created_after = (datetime.utcnow() - deshumanize(from_)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        pagination = {}
+        threats = obj['client'].iter_threats(
+            limit=limit, on_page=pagination.update,
+            incident_statuses=incident_status,
+            created_after=created_after,
+        )
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('id', 'name', 'classification', 'agent', 'status', 'confidence', title='Threats')
         for t in threats:
             info = t.get('threatInfo', {})
@@ -408,9 +453,9 @@ def list_threats(obj, incident_status, from_, limit):
             )
         console = Console()
         console.print(table)
-        console.print(f"total: {pagination.get('totalItems', len(threats))}")
+        console.print(f"total: {pagination.get('totalItems', table.row_count)}")
     else:
-        click.echo(json.dumps(threats))
+        write_records(threats, fmt)
 
 
 @threat.command('get')
@@ -452,10 +497,11 @@ def script():
 @script.command('list')
 @click.option('--query', '-q', help='Search scripts by name')
 @click.option('--os', 'os_types', help='Filter by OS type (linux, windows, macos)')
-@click.option('--limit', '-n', default=50, help='Max results to return')
+@click.option('--limit', '-n', default=50, help='Max results to return, 0 for all')
+@format_option
 @click.pass_obj
 @handle_errors
-def list_scripts(obj, query, os_types, limit):
+def list_scripts(obj, query, os_types, limit, fmt):
     """List available remote scripts.
 
     \b
@@ -464,11 +510,10 @@ def list_scripts(obj, query, os_types, limit):
       sextant s1 script list -q "collect"
       sextant s1 script list --os linux
     """
-    scripts, pagination = obj['client'].list_scripts(
-        limit=limit, query=query, os_types=os_types,
-    )
+    pagination = {}
+    scripts = obj['client'].iter_scripts(limit=limit, on_page=pagination.update, query=query, os_types=os_types)
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('name', 'os', 'description', title='Scripts')
         for s in scripts:
             table.add_row(
@@ -478,9 +523,9 @@ def list_scripts(obj, query, os_types, limit):
             )
         console = Console()
         console.print(table)
-        console.print(f"total: {pagination.get('totalItems', len(scripts))}")
+        console.print(f"total: {pagination.get('totalItems', table.row_count)}")
     else:
-        click.echo(json.dumps(scripts))
+        write_records(scripts, fmt)
 
 
 @script.command('get')
@@ -561,6 +606,7 @@ def display_script_results(results):
 @click.option('--bg', is_flag=True, help='Submit and return immediately without waiting for results')
 @click.option('--poll', is_flag=True, help='Poll until agents come online before executing (requires --agent or --file)')
 @click.option('--online-timeout', default=3600, help='Max seconds to wait for agents to come online')
+@click.option('--each', is_flag=True, help='With --poll, execute on agents as they come online instead of all at once')
 @click.option('--params', '-p', 'input_params', default=None, help='Input parameters for the script')
 @click.option('--description', '-d', 'description', default='sextant remote script execution', help='Task description')
 @click.option('--timeout', '-t', default=3600, help='Script runtime timeout in seconds')
@@ -568,12 +614,13 @@ def display_script_results(results):
 @click.pass_obj
 @handle_errors
 def run_script(obj, script_name, agent_names, group_ids, site_ids, target_all, hosts_file,
-               bg, poll, online_timeout, input_params, description, timeout, output_dir):
+               bg, poll, each, online_timeout, input_params, description, timeout, output_dir):
     """Execute a remote script on one or more agents.
 
     By default, waits for completion and displays results. Use --bg to submit
     and return immediately. Use --poll to wait for offline agents to come
-    online before executing (requires --agent or --file targeting).
+    online before executing (requires --agent or --file targeting), and
+    --each to start the execution on agents as soon as they come online.
 
     \b
     Examples:
@@ -583,49 +630,65 @@ def run_script(obj, script_name, agent_names, group_ids, site_ids, target_all, h
       sextant s1 script run "My Script" -a myhost -p "arg1 arg2"
       sextant s1 script run "My Script" -f hosts.txt
       sextant s1 script run "My Script" -f hosts.txt --poll
+      sextant s1 script run "My Script" -f hosts.txt --poll --each
     """
     agent_names = resolve_target_names(agent_names, hosts_file)
+    if each and not poll:
+        raise click.UsageError('--each requires --poll')
+    script = obj['client'].get_script(script_name)
+
+    def execute(agent_filter):
+        """Start the script on agents, return the task ID or None when pending approval."""
+        result = obj['client'].execute_script(
+            script_id=script['id'],
+            agent_filter=agent_filter,
+            description=description,
+            input_params=input_params,
+            timeout=timeout,
+        )
+        if result.get('pending'):
+            click.echo(f"pending approval (id: {result.get('pendingExecutionId', '')})")
+            return None
+        task_id = result.get('parentTaskId', '')
+        click.echo(f"task started (id: {task_id}), affected: {result.get('affected', 0)}")
+        return task_id
 
     if poll:
         if not agent_names:
             raise click.UsageError('--poll requires --agent or --file targeting')
 
         def on_poll(pending):
-            click.echo(f"waiting for {len(pending)} agent(s) to come online: {', '.join(sorted(pending))}", err=True)
+            shown = ', '.join(sorted(pending)[:10]) + (', ...' if len(pending) > 10 else '')
+            click.echo(f"waiting for {len(pending)} agent(s) to come online: {shown}", err=True)
 
-        agents = wait_for_online(obj['client'], agent_names, timeout=online_timeout, on_poll=on_poll)
-        agent_filter = {'ids': [a['id'] for a in agents]}
+        if each:
+            task_ids = []
+            try:
+                for online in online_agents(obj['client'], agent_names, timeout=online_timeout, on_poll=on_poll):
+                    task_ids.append(execute({'ids': [agent['id'] for _, agent in online]}))
+            except TimeoutError as e:
+                # the agents online so far are running the script
+                click.echo(str(e), err=True)
+        else:
+            agents = wait_for_online(obj['client'], agent_names, timeout=online_timeout, on_poll=on_poll)
+            task_ids = [execute({'ids': [a['id'] for a in agents]})]
     else:
-        agent_filter = build_agent_filter(
+        task_ids = [execute(build_agent_filter(
             obj['client'], agent_names, group_ids, site_ids, target_all,
-        )
-
-    script = obj['client'].get_script(script_name)
+        ))]
 
-    result = obj['client'].execute_script(
-        script_id=script['id'],
-        agent_filter=agent_filter,
-        description=description,
-        input_params=input_params,
-        timeout=timeout,
-    )
-
-    if result.get('pending'):
-        click.echo(f"pending approval (id: {result.get('pendingExecutionId', '')})")
+    if bg:
         return
 
-    task_id = result.get('parentTaskId', '')
-    click.echo(f"task started (id: {task_id}), affected: {result.get('affected', 0)}")
-
-    if not bg and task_id:
-        def on_poll(tasks):
-            counts = {}
-            for t in tasks:
-                s = t.get('status', 'unknown')
-                counts[s] = counts.get(s, 0) + 1
-            summary = ', '.join(f"{s}: {n}" for s, n in sorted(counts.items()))
-            click.echo(f"polling... {summary}", err=True)
+    def on_poll(tasks):
+        counts = {}
+        for t in tasks:
+            s = t.get('status', 'unknown')
+            counts[s] = counts.get(s, 0) + 1
+        summary = ', '.join(f"{s}: {n}" for s, n in sorted(counts.items()))
+        click.echo(f"polling... {summary}", err=True)
 
+    for task_id in filter(None, task_ids):
         obj['client'].wait_for_script(task_id, on_poll=on_poll)
 
         results = obj['client'].fetch_script_results(task_id, output_dir)
@@ -634,9 +697,10 @@ def run_script(obj, script_name, agent_names, group_ids, site_ids, target_all, h
 
 @script.command('status')
 @click.argument('task_id')
+@format_option
 @click.pass_obj
 @handle_errors
-def script_status(obj, task_id):
+def script_status(obj, task_id, fmt):
     """Check execution status of a remote script task.
 
     \b
@@ -645,7 +709,7 @@ def script_status(obj, task_id):
     """
     tasks, pagination = obj['client'].get_script_status(task_id)
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('agent', 'status', 'details', title='Script Status')
         for t in tasks:
             table.add_row(
@@ -655,7 +719,7 @@ def script_status(obj, task_id):
             )
         Console().print(table)
     else:
-        click.echo(json.dumps(tasks))
+        write_records(tasks, fmt)
 
 
 @script.command('results')
@@ -682,10 +746,12 @@ def activity():
 
 @activity.command('list')
 @click.option('--from', '-f', 'from_', default='1h', help='Relative time window')
-@click.option('--limit', '-n', default=50, help='Max results to return')
+@click.option('--limit', '-n', default=50, help='Max results to return, 0 for all')
+@click.option('--local', is_flag=True, help='Read synced records from the local store (see sextant sync)')
+@format_option
 @click.pass_obj
 @handle_errors
-def list_activities(obj, from_, limit):
+def list_activities(obj, from_, limit, local, fmt):
     """List recent activities.
 
     \b
@@ -694,12 +760,18 @@ def list_activities(obj, from_, limit):
       sextant s1 activity list --from 24h
       sextant s1 activity list --from 7d -n 100
     """
-    since = (datetime.utcnow() - deshumanize(from_)).strftime('%Y-%m-%dT%H:%M:%SZ')
-    activities, pagination = obj['client'].list_activities(
-        limit=limit, created_after=since,
-    )
+    if local:
+        activities = local_records(
+            obj['endpoint'], 'activity', limit=limit,
+            since=(datetime.now() - deshumanize(from_)).timestamp(),
+        )
+        pagination = {'totalItems': len(activities)}
+    else:
+        since = (datetime.utcnow() - deshumanize(from_)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        pagination = {}
+        activities = obj['client'].iter_activities(limit=limit, on_page=pagination.update, created_after=since)
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('id', 'ago', 'type', 'description', title='Activities')
         for a in activities:
             created = a.get('createdAt', '')
@@ -719,6 +791,6 @@ def list_activities(obj, from_, limit):
             )
         console = Console()
         console.print(table)
-        console.print(f"total: {pagination.get('totalItems', len(activities))}")
+        console.print(f"total: {pagination.get('totalItems', table.row_count)}")
     else:
-        click.echo(json.dumps(activities))
+        write_records(activities, fmt)
@@ -1,2 +1,2 @@
-from sextant.clients.splunk.client import SplunkClient as Client
+from sextant.clients.splunk.client import SplunkClient as Client, AsyncSplunkClient as AsyncClient
 from sextant.clients.splunk.commands import main
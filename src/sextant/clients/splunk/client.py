@@ -1,87 +1,239 @@
-import json
+import asyncio
+import gzip
+import itertools
+import logging
+import random
+import re
 import httpx
+from collections import deque
 from contextlib import contextmanager
-from time import sleep
+from pathlib import Path
+from time import monotonic, sleep, time
+from sextant.codec import aiter_lines, dumps, iter_lines, loads
+from sextant import aio
+from sextant.cache import DiskCache, makedirs, private
+from sextant.config import CACHE_DIR
+from sextant.http import build_async_client, build_client, settings
+from sextant.utils import Lazy, deshumanize
+
+logger = logging.getLogger('sextant')
+
+QUOTED = re.compile(r'("(?:[^"\\]|\\.)*")')
+INDEX = re.compile(r'\bindex\s*=\s*("[^"]*"|[^\s)|]+)')
+
+
+def time_slices(earliest, latest, count):
+    """Split an epoch range in count contiguous (earliest, latest) windows, newest first."""
+    step = (latest - earliest) / count
+    bounds = [int(earliest + step * i) for i in range(count)] + [int(latest)]
+    return [(bounds[i], bounds[i + 1]) for i in reversed(range(count))]
+
+
+def normalize_query(query):
+    """Return a query with the whitespace outside quoted strings collapsed."""
+    parts = QUOTED.split(query)
+    return ''.join(part if i % 2 else re.sub(r'\s+', ' ', part) for i, part in enumerate(parts)).strip()
+
+
+def unique_header(lines):
+    """Yield CSV lines, skipping the repetitions of the first one."""
+    header = next(lines, None)
+    if header is None:
+        return
+    yield header
+    for line in lines:
+        if line != header:
+            yield line
+
+
+def hec_batches(lines, batch=1000, size=2**20, **meta):
+    """Yield (count, body) HTTP Event Collector requests from JSON lines.
+
+    Objects with an event key are sent as is, other documents are wrapped
+    as the event of an envelope with the meta fields set (index,
+    sourcetype...). A request holds up to batch events and about size bytes.
+    Invalid lines are logged and skipped.
+    """
+    meta = {key: value for key, value in meta.items() if value}
+    events = []
+    buffered = 0
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            document = loads(line)
+        except ValueError:
+            logger.warning(f"line {number}: invalid JSON, skipped")
+            continue
+        if not (isinstance(document, dict) and 'event' in document):
+            line = dumps({**meta, 'event': document})
+        events.append(line)
+        buffered += len(line) + 1
+        if len(events) >= batch or buffered >= size:
+            yield len(events), b'\n'.join(events)
+            events = []
+            buffered = 0
+    if events:
+        yield len(events), b'\n'.join(events)
 
 
 class SplunkClient:
     """Splunk REST API client."""
 
-    def __init__(self, http: httpx.Client):
+    CACHE_PATHS = {
+        '/services/data/indexes': '1h',
+        '/services/saved/searches': '10m',
+    }
+
+    DEFAULTS = {
+        'query_cache_size': 1000,
+        'query_cache_settle': '10m',
+    }
+
+    def __init__(self, http: httpx.Client, async_client=None, results=None, settle=600):
         self.http = http
+        self.async_client = async_client
+        self.results = results
+        self.settle = settle
 
     @classmethod
     def from_config(cls, config):
         """Build a SplunkClient from a revealed endpoint config dict."""
-        http = httpx.Client(
-            base_url=config['remote'],
+        http = build_client(
+            config,
+            defaults=cls.DEFAULTS,
+            cache_paths=cls.CACHE_PATHS,
             headers={'Authorization': f"Bearer {config['credentials']['secret']}"},
-            verify=config.get('verify', True),
         )
-        return cls(http)
+        http_settings = settings(config, cls.DEFAULTS)
+        results = DiskCache(CACHE_DIR / 'queries' / config['name'], http_settings['query_cache_size'] * 2**20)
+        settle = http_settings['query_cache_settle']
+        if not isinstance(settle, (int, float)):
+            settle = deshumanize(settle).total_seconds()
+        return cls(http, Lazy(lambda: AsyncSplunkClient.from_config(config)), results, settle)
+
+    def close(self):
+        """Close the connections of the client and of its async counterpart."""
+        self.http.close()
+        aio.close_client(self.async_client)
 
     def check(self):
         """Verify authentication, return server info string."""
         r = self.http.get('/services/server/info', params={'output_mode': 'json'})
         r.raise_for_status()
-        info = r.json()['entry'][0]['content']
+        info = loads(r.content)['entry'][0]['content']
         return f"{info['serverName']} ({info['version']})"
 
-    def list_jobs(self, user=None, name=None):
+    def list_entries(self, path, search=None, fields=None, offset=0, count=0, page=1000, **params):
+        """Return (entries, total) of a REST collection, fetched in pages of page entries.
+
+        search is a list of filters evaluated by Splunk, fields limits the
+        content of the entries (f= projection) and count the number of
+        entries returned from offset, all of them when 0. Other keyword
+        arguments are parameters of the endpoint.
+        """
+        params['output_mode'] = 'json'
+        if search:
+            params['search'] = ' '.join(search)
+        if fields:
+            params['f'] = fields
+        entries = []
+        while True:
+            size = page if not count else min(page, count - len(entries))
+            r = self.http.get(path, params={**params, 'offset': offset, 'count': size})
+            r.raise_for_status()
+            data = loads(r.content)
+            total = data['paging']['total']
+            entries.extend(data['entry'])
+            offset += len(data['entry'])
+            if len(data['entry']) < size or offset >= total or len(entries) == count:
+                return entries, total
+
+    def list_jobs(self, user=None, name=None, fields=None, offset=0, count=0):
         """Return (entries, total) for search jobs."""
-        payload = {'output_mode': 'json', 'count': 0, 'search': []}
+        search = []
         if user:
-            payload['search'].append(f'eai:acl.owner={user}')
+            search.append(f'eai:acl.owner={user}')
         if name:
-            payload['search'].append(f'label="*{name}*"')
+            search.append(f'label="*{name}*"')
+        return self.list_entries('/services/search/jobs', search, fields, offset, count)
+
+    TERMINAL_STATES = {'DONE', 'FAILED'}
 
-        r = self.http.get('/services/search/jobs', params=payload)
+    def get_job(self, sid):
+        """Return the status content of a search job."""
+        r = self.http.get(f'/services/search/jobs/{sid}', params={'output_mode': 'json'})
         r.raise_for_status()
-        data = r.json()
-        return data['entry'], data['paging']['total']
-
-    def get_job_results(self, sid, wait=0):
-        """Fetch job results, optionally polling until complete. Returns list or None."""
-        elapsed = 0
-        while elapsed <= wait:
-            r = self.http.get(
-                f'/services/search/v2/jobs/{sid}/results',
-                params={'output_mode': 'json'},
-            )
-            r.raise_for_status()
-            if not wait or r.text:
-                break
-            sleep(elapsed := elapsed + 3)
+        return loads(r.content)['entry'][0]['content']
 
-        if not r.text:
-            return None
-        try:
-            return r.json()['results']
-        except json.JSONDecodeError:
-            raise ValueError(r.text)
+    def wait_for_job(self, sid, timeout, interval=0.5, max_interval=10, on_poll=None):
+        """Poll the job status until it is done or failed and return it.
+
+        The delay between polls doubles from interval up to max_interval.
+        Calls on_poll(status) on each poll if provided. Raises TimeoutError
+        when the job is still running after timeout seconds.
+        """
+        deadline = monotonic() + timeout
+        attempt = 0
+        while True:
+            status = self.get_job(sid)
+            if on_poll:
+                on_poll(status)
+            if status['dispatchState'] in self.TERMINAL_STATES:
+                return status
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise TimeoutError(
+                    f"job {sid} still {status['dispatchState']} "
+                    f"({float(status.get('doneProgress', 0)):.0%}) after {timeout}s"
+                )
+            sleep(min(interval * 2 ** attempt, max_interval, remaining))
+            attempt += 1
+
+    def get_job_results(self, sid, wait=0, fields=None, count=10000, prefetch=4):
+        """Return an iterator on all results of a job, waiting up to wait seconds for it to finish.
+
+        Results are fetched in pages of count rows with up to prefetch pages
+        in flight, so memory stays bounded whatever the size of the job.
+        Raises TimeoutError if the job is still running after wait seconds
+        and ValueError if it failed.
+        """
+        status = self.wait_for_job(sid, wait) if wait else self.get_job(sid)
+        return self.job_results(sid, status, fields, count, prefetch)
 
-    def list_indexes(self):
+    def job_results(self, sid, status, fields=None, count=10000, prefetch=4):
+        """Return an iterator on all results of a job given its status, see get_job_results."""
+        state = status['dispatchState']
+        if state == 'FAILED':
+            messages = [m.get('text', '') for m in status.get('messages', []) if isinstance(m, dict)]
+            raise ValueError(f"job {sid} failed: {' '.join(messages)}".strip())
+        if state != 'DONE':
+            logger.warning(f"job {sid} is {state} ({float(status.get('doneProgress', 0)):.0%}), "
+                           "results are partial")
+        pages = aio.iterate(self.async_client.iter_result_pages(
+            sid, int(status.get('resultCount', 0)), fields, count, prefetch,
+        ))
+        return itertools.chain.from_iterable(pages)
+
+    def list_indexes(self, fields=None, offset=0, count=0):
         """Return (entries, total) for accessible indexes."""
-        r = self.http.get(
-            '/services/data/indexes',
-            params={'output_mode': 'json', 'count': 0, 'datatype': 'all'},
-        )
-        r.raise_for_status()
-        data = r.json()
-        return data['entry'], data['paging']['total']
+        return self.list_entries('/services/data/indexes', None, fields, offset, count, datatype='all')
+
+    def list_searches(self, user=None, name=None, fields=None, offset=0, count=0, match=None):
+        """Return (entries, total) for saved searches.
 
-    def list_searches(self, user=None, name=None):
-        """Return (entries, total) for saved searches."""
-        payload = {'output_mode': 'json', 'count': 0, 'search': []}
+        name is contained in the search names, match a wildcard pattern
+        of the whole name.
+        """
+        search = []
         if user:
-            payload['search'].append(f'eai:acl.owner={user}')
+            search.append(f'eai:acl.owner={user}')
         if name:
-            payload['search'].append(f'name="*{name}*"')
-
-        r = self.http.get('/services/saved/searches', params=payload)
-        r.raise_for_status()
-        data = r.json()
-        return data['entry'], data['paging']['total']
+            search.append(f'name="*{name}*"')
+        if match:
+            search.append(f'name="{match}"')
+        return self.list_entries('/services/saved/searches', search, fields, offset, count)
 
     def get_search(self, name):
         """Return the saved search entry dict."""
@@ -90,7 +242,7 @@ class SplunkClient:
             params={'output_mode': 'json'},
         )
         r.raise_for_status()
-        return r.json()['entry'][0]
+        return loads(r.content)['entry'][0]
 
     def dispatch_search(self, name, data):
         """Dispatch a saved search, return the SID."""
@@ -100,11 +252,27 @@ class SplunkClient:
             params={'output_mode': 'json'},
         )
         r.raise_for_status()
-        return r.json()['sid']
+        return loads(r.content)['sid']
+
+    def send_events(self, lines, batch=1000, size=2**20, **meta):
+        """Send JSON lines to the HTTP Event Collector, return (sent, failed) event counts.
+
+        See hec_batches for the batching and AsyncSplunkClient.send_batches
+        for the requests.
+        """
+        return aio.run(self.async_client.send_batches(hec_batches(lines, batch, size, **meta)))
+
+    def dispatch_searches(self, names, data):
+        """Dispatch saved searches concurrently, return {name: sid or exception}."""
+        return aio.run(self.async_client.dispatch_searches(names, data))
+
+    def wait_for_jobs(self, sids, timeout):
+        """Return an iterator on (sid, status) of jobs as each one finishes, see AsyncSplunkClient."""
+        return aio.iterate(self.async_client.wait_for_jobs(sids, timeout))
 
     @contextmanager
     def stream_query(self, query, earliest, latest):
-        """Context manager yielding raw JSON lines from a Splunk export search."""
+        """Context manager yielding raw JSON lines as bytes from a Splunk export search."""
         payload = {
             'search': query,
             'earliest_time': earliest,
@@ -115,4 +283,339 @@ class SplunkClient:
         }
         with self.http.stream('POST', '/services/search/jobs/export', data=payload) as r:
             r.raise_for_status()
-            yield r.iter_lines()
+            yield iter_lines(r.iter_bytes())
+
+    @contextmanager
+    def stream_csv(self, query, earliest, latest):
+        """Context manager yielding the CSV lines as bytes of a Splunk export search.
+
+        Header lines repeated by Splunk between chunks are dropped.
+        """
+        payload = {
+            'search': query,
+            'earliest_time': earliest,
+            'latest_time': latest,
+            'output_mode': 'csv',
+        }
+        with self.http.stream('POST', '/services/search/jobs/export', data=payload) as r:
+            r.raise_for_status()
+            yield unique_header(iter_lines(r.iter_bytes()))
+
+    def settled(self, latest):
+        """Return whether the events before an epoch are all indexed, so their results can be cached."""
+        return int(latest) < time() - self.settle
+
+    @staticmethod
+    def results_key(query, earliest, latest):
+        """Return the key of cached query results."""
+        return f'{earliest} {latest} {normalize_query(query)}'
+
+    def cached_results(self, key):
+        """Return an iterator on the cached export lines of a query or None."""
+        f = self.results.open(key) if self.results is not None else None
+        if f is None:
+            return None
+
+        def lines():
+            with gzip.open(f) as z:
+                for line in z:
+                    yield line.rstrip(b'\n')
+        return lines()
+
+    def cache_results(self, key, lines):
+        """Yield export lines, storing them compressed once all of them are read."""
+        if self.results is None:
+            yield from lines
+            return
+        with self.results.writer(key) as f, gzip.open(f, 'wb', compresslevel=1) as z:
+            for line in lines:
+                z.write(line + b'\n')
+                yield line
+
+    SLICE_EVENTS = 100000
+    MAX_SLICES = 64
+
+    def estimate_count(self, query, earliest, latest):
+        """Return the number of events in the indexes of a query, counted with tstats."""
+        indexes = INDEX.findall(query) or ['*']
+        where = ' OR '.join(f'index={index}' for index in indexes)
+        with self.stream_query(f'| tstats count where {where}', earliest, latest) as lines:
+            for line in lines:
+                result = loads(line).get('result') if line else None
+                if result:
+                    return int(result.get('count', 0))
+        return 0
+
+    def auto_slices(self, query, earliest, latest):
+        """Return a number of slices giving about SLICE_EVENTS events each."""
+        count = self.estimate_count(query, earliest, latest)
+        return max(1, min(-(-count // self.SLICE_EVENTS), self.MAX_SLICES))
+
+    def export(self, query, earliest, latest, slices, directory):
+        """Yield raw JSON lines of an export search split in time slices, newest first.
+
+        earliest and latest are epoch seconds. Slices are exported
+        concurrently, up to the endpoint concurrency, each to a file of
+        directory, and replayed in order. Files of finished slices are kept
+        so an interrupted export only fetches the remaining slices.
+        """
+        windows = time_slices(earliest, latest, slices)
+        for path in aio.iterate(self.async_client.export_slices(query, windows, Path(directory))):
+            with open(path, 'rb') as f:
+                for line in f:
+                    yield line.rstrip(b'\n')
+
+
+class AsyncSplunkClient:
+    """Splunk REST API client running requests concurrently."""
+
+    # HEC answers 503 "Server is busy" without Retry-After under backpressure
+    HEC_RETRY_STATUSES = {502, 503, 504}
+
+    def __init__(self, http: httpx.AsyncClient, concurrency=8, hec=None, hec_token=None,
+                 retries=3, backoff=1, max_backoff=60):
+        self.http = http
+        self.concurrency = concurrency
+        self.hec = hec
+        self.hec_token = hec_token
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @classmethod
+    def from_config(cls, config):
+        """Build an AsyncSplunkClient from a revealed endpoint config dict."""
+        http = build_async_client(
+            config,
+            cache_paths=SplunkClient.CACHE_PATHS,
+            headers={'Authorization': f"Bearer {config['credentials']['secret']}"},
+        )
+        http_settings = settings(config)
+        return cls(
+            http, http_settings['concurrency'],
+            config.get('hec', config['remote']), config['credentials'].get('hec_token'),
+            http_settings['retries'], http_settings['backoff'], http_settings['max_backoff'],
+        )
+
+    async def post_events(self, count, body):
+        """Post a gzipped batch of HEC events, return (count, error or None).
+
+        Busy or unavailable collectors (HEC_RETRY_STATUSES) and transport
+        errors are retried with exponential backoff and jitter. A batch may
+        then be indexed twice if the collector acted on a failed attempt.
+        """
+        # compress out of the loop, so batches are compressed while others are sent
+        content = await asyncio.to_thread(gzip.compress, body, 1)
+        for attempt in range(self.retries + 1):
+            try:
+                r = await self.http.post(
+                    f"{self.hec.rstrip('/')}/services/collector/event", content=content,
+                    headers={'Authorization': f'Splunk {self.hec_token}', 'Content-Encoding': 'gzip'},
+                )
+                if r.status_code not in self.HEC_RETRY_STATUSES or attempt == self.retries:
+                    r.raise_for_status()
+                    return count, None
+                error = f'{r.status_code} {r.text}'
+            except httpx.HTTPStatusError as e:
+                return count, e.response.text
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
+                if attempt == self.retries:
+                    return count, error
+            delay = min(self.backoff * 2 ** attempt, self.max_backoff) * random.uniform(0.5, 1)
+            logger.info(f'{count} events not sent: {error}, retrying in {delay:.1f}s')
+            await asyncio.sleep(delay)
+
+    async def send_batches(self, batches):
+        """Post (count, body) batches to the HTTP Event Collector, return (sent, failed) event counts.
+
+        Batches are read in a thread while up to twice the endpoint
+        concurrency requests are in flight, throttled requests being retried
+        by the transport and busy collectors by post_events. Failed batches
+        are logged.
+        """
+        if not self.hec_token:
+            raise ValueError('no hec_token in the credentials of the endpoint')
+        sent = failed = 0
+        window = set()
+
+        def tally(tasks):
+            nonlocal sent, failed
+            for task in tasks:
+                count, error = task.result()
+                if error:
+                    failed += count
+                    logger.warning(f'{count} events not sent: {error}')
+                else:
+                    sent += count
+
+        done = object()
+        try:
+            while True:
+                item = await asyncio.to_thread(next, batches, done)
+                if item is done:
+                    break
+                if len(window) >= self.concurrency * 2:
+                    finished, window = await asyncio.wait(window, return_when=asyncio.FIRST_COMPLETED)
+                    tally(finished)
+                window.add(asyncio.ensure_future(self.post_events(*item)))
+            if window:
+                finished, window = await asyncio.wait(window)
+                tally(finished)
+        finally:
+            for task in window:
+                task.cancel()
+        return sent, failed
+
+    async def check(self):
+        """Verify authentication, return server info string."""
+        r = await self.http.get('/services/server/info', params={'output_mode': 'json'})
+        r.raise_for_status()
+        info = loads(r.content)['entry'][0]['content']
+        return f"{info['serverName']} ({info['version']})"
+
+    async def get_results(self, sid, offset, count, fields=None):
+        """Return a page of job results."""
+        params = {'output_mode': 'json', 'offset': offset, 'count': count}
+        if fields:
+            params['f'] = fields
+        r = await self.http.get(f'/services/search/v2/jobs/{sid}/results', params=params)
+        r.raise_for_status()
+        if not r.content:
+            return []
+        try:
+            return loads(r.content)['results']
+        except ValueError:
+            raise ValueError(r.text)
+
+    async def iter_result_pages(self, sid, total, fields=None, count=10000, prefetch=4):
+        """Yield the pages of total job results in order, prefetch pages in flight."""
+        offsets = iter(range(0, total, count))
+        window = deque(
+            asyncio.ensure_future(self.get_results(sid, offset, count, fields))
+            for offset in itertools.islice(offsets, prefetch)
+        )
+        try:
+            while window:
+                page = await window.popleft()
+                offset = next(offsets, None)
+                if offset is not None:
+                    window.append(asyncio.ensure_future(self.get_results(sid, offset, count, fields)))
+                yield page
+        finally:
+            for task in window:
+                task.cancel()
+
+    async def dispatch_search(self, name, data):
+        """Dispatch a saved search, return the SID."""
+        r = await self.http.post(
+            f'/services/saved/searches/{name}/dispatch',
+            data=data,
+            params={'output_mode': 'json'},
+        )
+        r.raise_for_status()
+        return loads(r.content)['sid']
+
+    async def dispatch_searches(self, names, data):
+        """Dispatch saved searches concurrently, return {name: sid or exception}."""
+        sids = await asyncio.gather(*(self.dispatch_search(name, data) for name in names), return_exceptions=True)
+        return dict(zip(names, sids))
+
+    async def get_job(self, sid):
+        """Return the status content of a search job."""
+        r = await self.http.get(f'/services/search/jobs/{sid}', params={'output_mode': 'json'})
+        r.raise_for_status()
+        return loads(r.content)['entry'][0]['content']
+
+    async def wait_for_jobs(self, sids, timeout, interval=0.5, max_interval=10):
+        """Yield (sid, status) of jobs as each one is done or failed.
+
+        A single loop polls the status of every pending job concurrently,
+        the delay between polls doubling from interval up to max_interval.
+        A job whose status can't be fetched, such as an expired SID, is
+        yielded with the exception instead of its status and not polled
+        again. Jobs still running after timeout seconds are yielded last
+        with their current status.
+        """
+        pending = list(sids)
+        deadline = monotonic() + timeout
+        attempt = 0
+        while pending:
+            statuses = await asyncio.gather(*(self.get_job(sid) for sid in pending), return_exceptions=True)
+            running = []
+            for sid, status in zip(pending, statuses):
+                if isinstance(status, Exception) or status['dispatchState'] in SplunkClient.TERMINAL_STATES:
+                    yield sid, status
+                else:
+                    running.append((sid, status))
+            pending = [sid for sid, _ in running]
+            remaining = deadline - monotonic()
+            if pending and remaining <= 0:
+                for sid, status in running:
+                    yield sid, status
+                return
+            if pending:
+                await asyncio.sleep(min(interval * 2 ** attempt, max_interval, remaining))
+                attempt += 1
+
+    async def stream_query(self, query, earliest, latest):
+        """Yield raw JSON lines as bytes from a Splunk export search."""
+        payload = {
+            'search': query,
+            'earliest_time': earliest,
+            'latest_time': latest,
+            'output_mode': 'json',
+            'preview': False,
+            'summarize': True,
+        }
+        async with self.http.stream('POST', '/services/search/jobs/export', data=payload) as r:
+            r.raise_for_status()
+            async for line in aiter_lines(r.aiter_bytes()):
+                yield line
+
+    async def export_slice(self, query, earliest, latest, path):
+        """Write the raw JSON lines of an export search to path once complete."""
+        if path.exists():
+            return path
+        part = path.with_suffix('.part')
+        with open(part, 'wb', opener=private) as f:
+            async for line in self.stream_query(query, earliest, latest):
+                if line:
+                    f.write(line + b'\n')
+        part.rename(path)
+        return path
+
+    async def export_slices(self, query, windows, directory):
+        """Export each (earliest, latest) window to a file of directory, yield the paths in order.
+
+        Windows already exported are skipped. All windows are requested at
+        once, the transport limiting how many streams are open.
+        """
+        makedirs(directory)
+        tasks = [
+            asyncio.ensure_future(self.export_slice(query, earliest, latest, directory / f'{i}.ndjson'))
+            for i, (earliest, latest) in enumerate(windows)
+        ]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def hunt(self, indicators, since, limit=100):
+        """Yield events mentioning any indicator since a datetime, searching all indexes."""
+        terms = ' OR '.join('"{}"'.format(value.replace('"', '\\"')) for _, value in indicators)
+        query = f'search index=* ({terms}) | head {limit}'
+        async for line in self.stream_query(query, earliest=str(int(since.timestamp())), latest='now'):
+            if not line:
+                continue
+            result = loads(line).get('result')
+            if result:
+                yield {
+                    'time': result.get('_time', ''),
+                    'host': result.get('host', ''),
+                    'summary': result.get('_raw', '')[:200],
+                    'ref': f"{result.get('index', '')}:{result.get('sourcetype', '')}",
+                }
@@ -1,11 +1,21 @@
 import click
+import hashlib
 import httpx
 import json
+import shutil
 import sys
+import time
+from contextlib import closing
 from datetime import datetime
 from rich.console import Console
 from rich.table import Table
 from rich.live import Live
+from sextant.cache import makedirs, private
+from sextant.codec import dumps, loads
+from sextant.config import CACHE_DIR
+from sextant import http
+from sextant.export import FILE_FORMATS, guess_format, open_file
+from sextant.output import LiveTail, NdjsonWriter, format_option, write_records
 from sextant.utils import Lazy, deshumanize
 from sextant.clients.splunk.client import SplunkClient
 
@@ -17,6 +27,43 @@ def get_stdin(ctx, param, value):
     return value
 
 
+def guess_fields(result):
+    """Return _time and the first five visible fields of a result."""
+    fields = [f for f in result.keys() if not f.startswith('_')][:5]
+    if result.get('_time'):
+        fields.insert(0, '_time')
+    return fields
+
+
+def live_results(lines, size):
+    """Display the last results of export lines in a live table with counters."""
+    view = None
+    live = None
+    try:
+        for line in lines:
+            result = loads(line).get('result') if line else None
+            if result is None:
+                continue
+            if view is None:
+                view = LiveTail(guess_fields(result), size)
+                live = Live(view, refresh_per_second=4)
+                live.start()
+            view.add([str(result.get(f, '')) for f in view.fields], len(line))
+    finally:
+        if live:
+            live.stop()
+    if view is None:
+        click.echo('No result', err=True)
+
+
+def tee(lines, f):
+    """Yield lines, writing each of them to a binary file."""
+    for line in lines:
+        if line:
+            f.write(line + b'\n')
+        yield line
+
+
 def display_results(results, fields=None):
     """Display Splunk results in terminal guessing the fields if not set."""
     if not results:
@@ -26,9 +73,7 @@ def display_results(results, fields=None):
     try:
         fields = fields.split(',')
     except AttributeError:
-        fields = [f for f in results[0].keys() if not f.startswith('_')][:5]
-        if results[0].get('_time'):
-            fields.insert(0, '_time')
+        fields = guess_fields(results[0])
 
     table = Table(*fields)
     for row in results:
@@ -37,6 +82,118 @@ def display_results(results, fields=None):
     Console().print(table)
 
 
+fields_option = click.option(
+    '--fields', callback=lambda ctx, param, value: value.split(',') if value else None,
+    help='Comma-separated content fields to fetch (default: all, or the columns of the table)',
+)
+limit_option = click.option('--limit', default=0, help='Maximum number of entries (default: all)')
+
+
+def parse_slices(ctx, param, value):
+    """Callback accepting a number of slices or auto."""
+    if value is None or value == 'auto':
+        return value
+    try:
+        slices = int(value)
+    except ValueError:
+        slices = 0
+    if slices < 1:
+        raise click.BadParameter('must be a positive number or auto')
+    return slices
+
+
+def splunk_time(value, relative='-'):
+    """Return the Splunk time of a --from/--to option and whether it is absolute.
+
+    Relative times (10m) are counted back from now and absolute ones are
+    ISO8601 dates or epochs. Other values are passed as is to Splunk.
+    """
+    if value == 'now':
+        return value, False
+    if value.isdigit():
+        return value, True
+    try:
+        return str(int(datetime.fromisoformat(value).timestamp())), True
+    except ValueError:
+        pass
+    try:
+        deshumanize(value)
+        return f'{relative}{value}', False
+    except ValueError:
+        return value, False
+
+
+def epoch(time, now):
+    """Return the epoch of a Splunk time returned by splunk_time."""
+    if time == 'now':
+        return int(now.timestamp())
+    if time.isdigit():
+        return int(time)
+    try:
+        return int((now - deshumanize(time.lstrip('-'))).timestamp())
+    except ValueError:
+        raise click.BadParameter(f'{time}, sliced exports need relative or absolute times')
+
+
+# seconds the window of relative times may have moved for an export to resume
+RESUME_DRIFT = 3600
+# seconds the checkpoints of an interrupted export are kept
+EXPORT_TTL = 7 * 86400
+
+
+def expire_exports(directory, ttl=EXPORT_TTL):
+    """Remove the checkpoints of exports planned more than ttl seconds ago."""
+    for manifest in directory.glob('*/plan.json'):
+        try:
+            if manifest.stat().st_mtime < time.time() - ttl:
+                shutil.rmtree(manifest.parent, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def plan_export(client, endpoint, query, earliest, latest, slices):
+    """Return the checkpoint directory and plan of a sliced export, resuming a previous one.
+
+    The plan is stored with the checkpoints, so an export run again with the
+    same arguments keeps the time range computed by the first run, unless
+    relative times moved it by more than RESUME_DRIFT seconds since: the
+    export then starts over.
+    """
+    exports = CACHE_DIR.expanduser() / 'exports'
+    expire_exports(exports)
+    key = hashlib.sha256(dumps([query, earliest, latest, slices])).hexdigest()[:16]
+    directory = exports / f'{endpoint}-{key}'
+    manifest = directory / 'plan.json'
+    now = datetime.now()
+    bounds = epoch(earliest, now), epoch(latest, now)
+    if manifest.exists():
+        plan = loads(manifest.read_bytes())
+        drift = max(abs(bounds[0] - plan['earliest']), abs(bounds[1] - plan['latest']))
+        if drift <= RESUME_DRIFT:
+            done = len(list(directory.glob('*.ndjson')))
+            click.echo(f"Resuming export from {datetime.fromtimestamp(plan['earliest'])} "
+                       f"to {datetime.fromtimestamp(plan['latest'])} ({done}/{plan['slices']} slices done)",
+                       err=True)
+            return directory, plan
+        click.echo(f"Restarting export, the time range moved since "
+                   f"{datetime.fromtimestamp(manifest.stat().st_mtime)}", err=True)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    plan = {'earliest': bounds[0], 'latest': bounds[1], 'slices': slices}
+    if slices == 'auto':
+        plan['slices'] = client.auto_slices(query, plan['earliest'], plan['latest'])
+    makedirs(directory)
+    with open(manifest, 'wb', opener=private) as f:
+        f.write(dumps(plan))
+    return directory, plan
+
+
+def export_lines(client, query, directory, plan):
+    """Yield the lines of a sliced export, removing its checkpoints once complete."""
+    yield from client.export(query, plan['earliest'], plan['latest'], plan['slices'], directory)
+    shutil.rmtree(directory, ignore_errors=True)
+
+
 @click.group()
 @click.pass_context
 def main(ctx):
@@ -45,12 +202,19 @@ def main(ctx):
         config = ctx.obj['config'].reveal(ctx.info_name)
         return SplunkClient.from_config(config)
 
+    ctx.obj['endpoint'] = ctx.info_name
+    clients = ctx.obj.get('clients')
+    if clients is not None:
+        # shared clients are closed by their owner (sextant serve)
+        ctx.obj['client'] = clients.setdefault(ctx.info_name, Lazy(factory))
+        return
+
     client = Lazy(factory)
     ctx.obj['client'] = client
 
     def cleanup():
         if client._instance is not None:
-            client._instance.http.close()
+            client._instance.close()
     ctx.call_on_close(cleanup)
 
 
@@ -62,12 +226,17 @@ def job():
 @job.command('list')
 @click.option('--name', help='Search string in job name')
 @click.option('--user', help='Filter on owner of the job')
+@fields_option
+@limit_option
+@format_option
 @click.pass_obj
-def list_job(obj, name, user):
+def list_job(obj, name, user, fields, limit, fmt):
     """List available jobs."""
-    entries, total = obj['client'].list_jobs(user=user, name=name)
+    if fmt == 'table':
+        fields = ['dispatchState', 'eventCount']
+    entries, total = obj['client'].list_jobs(user=user, name=name, fields=fields, count=limit)
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('sid', 'status', 'events', 'owner')
         for entry in entries:
             table.add_row(
@@ -80,40 +249,48 @@ def list_job(obj, name, user):
         console.print(table)
         console.print(f'total: {total}')
     else:
-        click.echo(json.dumps(entries))
+        write_records(entries, fmt)
 
 
 @job.command('get')
 @click.argument('sid', callback=get_stdin)
-@click.option('--fields', default=None)
-@click.option('-w', '--wait', default=0, help='Wait for job to finish')
+@click.option('--fields', default=None, help='Comma-separated fields to fetch and display')
+@click.option('-w', '--wait', default=0, help='Seconds to wait for the job to finish')
+@format_option
 @click.pass_obj
-def get_job(obj, sid, fields, wait):
-    """Get the search job results."""
+def get_job(obj, sid, fields, wait, fmt):
+    """Get the search job results.
+
+    All results are fetched, page by page, and streamed to the output.
+    """
     try:
-        results = obj['client'].get_job_results(sid, wait=wait)
-        if results is None:
-            click.echo(f'Empty response fetching result for {sid}', err=True)
-            return
+        results = obj['client'].get_job_results(
+            sid, wait=wait, fields=fields.split(',') if fields else None,
+        )
 
-        if sys.stdout.isatty():
-            display_results(results, fields)
+        if fmt == 'table':
+            display_results(list(results), fields)
         else:
-            click.echo(json.dumps(results))
+            write_records(results, fmt)
 
-    except ValueError as e:
+    except (ValueError, TimeoutError) as e:
         click.echo(str(e), err=True)
     except httpx.HTTPStatusError as e:
         click.echo(e.response.text, err=True)
 
 
 @main.command()
+@fields_option
+@limit_option
+@format_option
 @click.pass_obj
-def indexes(obj):
+def indexes(obj, fields, limit, fmt):
     """Display accessible indexes."""
-    entries, total = obj['client'].list_indexes()
+    if fmt == 'table':
+        fields = ['datatype', 'totalEventCount', 'disabled']
+    entries, total = obj['client'].list_indexes(fields=fields, count=limit)
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('indexes', 'datatype', 'counts')
         for item in entries:
             style = 'red' if item['content']['disabled'] else 'default'
@@ -124,7 +301,7 @@ def indexes(obj):
         console.print(table)
         console.print(f'total: {total}')
     else:
-        click.echo(json.dumps(entries))
+        write_records(entries, fmt)
 
 
 @main.group()
@@ -135,12 +312,17 @@ def search():
 @search.command('list')
 @click.option('--name', help='Search name contains')
 @click.option('--user', help='Owner of the search')
+@fields_option
+@limit_option
+@format_option
 @click.pass_obj
-def list_search(obj, user, name):
+def list_search(obj, user, name, fields, limit, fmt):
     """Display savedsearches."""
-    entries, total = obj['client'].list_searches(user=user, name=name)
+    if fmt == 'table':
+        fields = ['actions']
+    entries, total = obj['client'].list_searches(user=user, name=name, fields=fields, count=limit)
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('search', 'user', 'action', title='savedsearches')
         for item in entries:
             table.add_row(item['name'], item['acl']['owner'], item['content']['actions'])
@@ -148,7 +330,7 @@ def list_search(obj, user, name):
         console.print(table)
         console.print(f'total: {total}')
     else:
-        click.echo(json.dumps(entries))
+        write_records(entries, fmt)
 
 
 @search.command('get')
@@ -183,10 +365,18 @@ def get_search(obj, name):
 @click.option('--to', '-t')
 @click.option('--from', '-f', 'from_')
 @click.option('--trigger', is_flag=True, help='Trigger actions')
-@click.argument('name')
+@click.option('--match', help='Also run the saved searches matching a wildcard pattern')
+@click.option('-w', '--wait', default=0, help='Seconds to wait for the jobs, writing their results')
+@click.argument('names', nargs=-1)
+@format_option(piped='ndjson')
 @click.pass_obj
-def run_search(obj, name, trigger, to, from_):
-    """Force the search to run and trigger alert actions."""
+def run_search(obj, names, match, trigger, to, from_, wait, fmt):
+    """Force searches to run and trigger alert actions.
+
+    Searches are dispatched concurrently and their SIDs printed. With
+    --wait, the jobs are polled together and the results of each job are
+    written as soon as it finishes, with the name of its search.
+    """
     try:
         data = {}
         if trigger:
@@ -208,19 +398,90 @@ def run_search(obj, name, trigger, to, from_):
             click.echo('Time format must be relative or ISO8601')
             return
 
-        sid = obj['client'].dispatch_search(name, data)
-        click.echo(sid)
+        names = list(names)
+        if match:
+            entries, _ = obj['client'].list_searches(match=match, fields=['disabled'])
+            names += [e['name'] for e in entries if not e['content']['disabled'] and e['name'] not in names]
+        if not names:
+            click.echo('No saved search to run', err=True)
+            return
+
+        jobs = {}
+        for name, sid in obj['client'].dispatch_searches(names, data).items():
+            if isinstance(sid, httpx.HTTPStatusError):
+                click.echo(f'{name}: {sid.response.text}', err=True)
+            elif isinstance(sid, Exception):
+                click.echo(f'{name}: {sid}', err=True)
+            else:
+                jobs[sid] = name
+                if not wait:
+                    click.echo(sid)
+
+        if wait and jobs:
+            if fmt == 'table':
+                # only the result counts are shown, jobs are polled without fetching results
+                table = Table('search', 'sid', 'status', 'results')
+                with Live(table, refresh_per_second=4):
+                    for sid, status in obj['client'].wait_for_jobs(list(jobs), wait):
+                        if isinstance(status, Exception):
+                            click.echo(f'{jobs[sid]}: job {sid} {job_error(status)}', err=True)
+                            table.add_row(jobs[sid], sid, 'UNKNOWN', '')
+                        else:
+                            table.add_row(jobs[sid], sid, status['dispatchState'], str(status.get('resultCount', '')))
+            else:
+                write_records((
+                    {'search_name': name, **result}
+                    for name, sid, status, results in finished_jobs(obj['client'], jobs, wait)
+                    if results is not None
+                    for result in results
+                ), fmt)
 
     except httpx.HTTPStatusError as e:
         click.echo(e.response.text, err=True)
 
 
+def job_error(e):
+    """Return the message of an exception raised polling a job."""
+    if isinstance(e, httpx.HTTPStatusError):
+        return f'status {e.response.status_code}: {e.response.text}'
+    return str(e) or type(e).__name__
+
+
+def finished_jobs(client, jobs, wait):
+    """Yield (name, sid, status, results) of jobs mapping SIDs to search names as each one finishes.
+
+    results is None for failed jobs, jobs whose status can't be fetched
+    and jobs still running after wait seconds, which are reported on stderr.
+    """
+    for sid, status in client.wait_for_jobs(list(jobs), wait):
+        results = None
+        if isinstance(status, Exception):
+            click.echo(f'{jobs[sid]}: job {sid} {job_error(status)}', err=True)
+        elif status['dispatchState'] not in client.TERMINAL_STATES:
+            click.echo(f"{jobs[sid]}: job {sid} still {status['dispatchState']} after {wait}s", err=True)
+        else:
+            try:
+                results = client.job_results(sid, status)
+            except ValueError as e:
+                click.echo(f'{jobs[sid]}: {e}', err=True)
+        yield jobs[sid], sid, status, results
+
+
 @main.command()
 @click.option('--from', '-f', 'from_', default='10m')
 @click.option('--to', '-t', default='now')
+@click.option('--slices', callback=parse_slices,
+              help='Split the time range in N slices exported concurrently, or auto')
+@click.option('--rows', default=20, help='Number of last results shown in the table')
+@click.option('--tee', 'output', type=click.File('wb'), help='Also write all raw results to a file')
+@click.option('--out', type=click.Path(dir_okay=False),
+              help=f"Write results to a {', '.join(FILE_FORMATS)} file, guessed from its extension")
+@click.option('--fields', default=None, help='Comma-separated fields to export')
+@click.option('--cache', is_flag=True, help='Cache the results of a relative time range too')
 @click.argument('query')
+@format_option(piped='raw', extra=FILE_FORMATS)
 @click.pass_obj
-def query(obj, query, to, from_):
+def query(obj, query, to, from_, slices, rows, output, out, fields, cache, fmt):
     """
     Run a search query.
 
@@ -228,26 +489,113 @@ def query(obj, query, to, from_):
 
      "search index=_internal | head 1 | fieldsummary"
      "|metadata index=_internal type=sourcetypes"
+
+    With --slices, the time range is split and the slices are exported
+    concurrently then merged newest first. Finished slices are kept, so an
+    interrupted export run again resumes. Only for event searches, results
+    of transforming commands (stats...) would be computed per slice.
+
+    The table shows the last --rows results with the throughput, --tee
+    saves the complete stream meanwhile.
+
+    --out writes a file for offline analysis, CSV columns and Parquet schema
+    following the fields of the results. CSV files of given --fields are
+    written by Splunk directly.
+
+    Results of absolute time ranges (ISO8601 dates or epochs) ending before
+    the query_cache_settle margin are cached and replayed when the same query
+    runs again, --cache caches other ranges as well.
     """
-    with obj['client'].stream_query(query, earliest=f'-{from_}', latest=to) as lines:
-        if sys.stdout.isatty():
-            try:
-                first_result = json.loads(next(lines)).get('result')
-                fields = [f for f in first_result.keys() if not f.startswith('_')][:5]
-                if first_result.get('_time'):
-                    fields.insert(0, '_time')
-            except AttributeError:
-                click.echo('No result', err=True)
-                return
-
-            table = Table(*fields)
-            with Live(table, refresh_per_second=1):
-                table.add_row(*[first_result[f] for f in fields])
-                for row in lines:
-                    if not row:
-                        break
-                    result = json.loads(row).get('result')
-                    table.add_row(*[result[f] for f in fields])
+    file_fmt = None
+    if out:
+        file_fmt = fmt if fmt in FILE_FORMATS else guess_format(out)
+        if file_fmt is None:
+            raise click.BadParameter(f"use a {', '.join(FILE_FORMATS)} extension or --format", param_hint='--out')
+    elif fmt in FILE_FORMATS:
+        raise click.BadParameter(f'{fmt} needs an --out file', param_hint='--format')
+    if fields:
+        query = f'{query} | table {fields}'
+    earliest, absolute_from = splunk_time(from_)
+    latest, absolute_to = splunk_time(to)
+
+    if file_fmt == 'csv' and fields and not slices:
+        # fixed columns, the CSV of Splunk is cheaper than its JSON
+        with obj['client'].stream_csv(query, earliest=earliest, latest=latest) as lines, open(out, 'wb') as f:
+            f.writelines(line + b'\n' for line in lines)
+        return
+
+    writer = None
+    if file_fmt:
+        try:
+            writer = open_file(out, file_fmt)
+        except ImportError as e:
+            click.echo(str(e), err=True)
+            return
+
+    key = None
+    cached = None
+    settled = absolute_from and absolute_to and obj['client'].settled(latest)
+    if http.OPTIONS['cache'] != 'off' and (cache or settled):
+        key = obj['client'].results_key(query, earliest, latest)
+        if http.OPTIONS['cache'] == 'on':
+            cached = obj['client'].cached_results(key)
+
+    if cached is not None:
+        stream = closing(cached)
+        key = None
+    elif slices:
+        directory, plan = plan_export(obj['client'], obj['endpoint'], query, earliest, latest, slices)
+        stream = closing(export_lines(obj['client'], query, directory, plan))
+    else:
+        stream = obj['client'].stream_query(query, earliest=earliest, latest=latest)
+
+    with stream as lines:
+        if key:
+            lines = obj['client'].cache_results(key, lines)
+        if output:
+            lines = tee(lines, output)
+        if writer:
+            with writer:
+                for line in lines:
+                    result = loads(line).get('result') if line else None
+                    if result is not None:
+                        writer.write(result)
+        elif fmt == 'table':
+            live_results(lines, rows)
+        elif fmt == 'raw':
+            # export lines are already JSON, write them untouched
+            with NdjsonWriter() as writer:
+                for line in lines:
+                    writer.write_line(line)
         else:
-            for line in lines:
-                click.echo(line)
+            results = (loads(line).get('result') for line in lines if line)
+            write_records((r for r in results if r is not None), fmt)
+
+
+@main.command()
+@click.argument('source', type=click.File('rb'), default='-')
+@click.option('--index', help='Index of the events (default: the one of the HEC token)')
+@click.option('--sourcetype', help='Sourcetype of the events')
+@click.option('--source', 'source_', help='Source of the events')
+@click.option('--host', help='Host of the events')
+@click.option('--batch', default=1000, help='Maximum events per request')
+@click.option('--size', default=1.0, help='Maximum MB of events per request, before compression')
+@click.pass_obj
+def send(obj, source, index, sourcetype, source_, host, batch, size):
+    """Send JSON lines from a file or stdin to the HTTP Event Collector.
+
+    Each line is an event, or a HEC envelope when it has an event key.
+    Events are posted in gzipped batches, several requests at a time.
+    """
+    start = time.monotonic()
+    try:
+        sent, failed = obj['client'].send_events(
+            source, batch=batch, size=int(size * 2**20),
+            index=index, sourcetype=sourcetype, source=source_, host=host,
+        )
+    except ValueError as e:
+        click.echo(str(e), err=True)
+        return
+    elapsed = time.monotonic() - start
+    click.echo(f'{sent} events sent in {elapsed:.1f}s ({sent / max(elapsed, 1e-3):.0f}/s)'
+               + (f', {failed} failed' if failed else ''), err=True)
@@ -1,2 +1,2 @@
-from sextant.clients.sysdig.client import SysdigClient as Client
+from sextant.clients.sysdig.client import SysdigClient as Client, AsyncSysdigClient as AsyncClient
 from sextant.clients.sysdig.commands import main
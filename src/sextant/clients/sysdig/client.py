@@ -1,27 +1,50 @@
+import asyncio
+from datetime import datetime, timezone
 import httpx
+from sextant.codec import loads
+from sextant import aio
+from sextant.http import build_async_client, build_client
+from sextant.utils import Lazy
+
+
+def event_host(event):
+    """Return the hostname an event occurred on."""
+    return (event.get('labels', {}).get('host.hostName')
+            or event.get('content', {}).get('fields', {}).get('host.hostName', ''))
 
 
 class SysdigClient:
     """Sysdig Secure REST API client."""
 
-    def __init__(self, http: httpx.Client):
+    CACHE_PATHS = {
+        '/api/v2/policies': '1h',
+        '/api/alerts': '1h',
+    }
+
+    def __init__(self, http: httpx.Client, async_client=None):
         self.http = http
+        self.async_client = async_client
 
     @classmethod
     def from_config(cls, config):
         """Build a SysdigClient from a revealed endpoint config dict."""
-        http = httpx.Client(
-            base_url=config['remote'],
+        http = build_client(
+            config,
+            cache_paths=cls.CACHE_PATHS,
             headers={'Authorization': f"Bearer {config['credentials']['secret']}"},
-            verify=config.get('verify', True),
         )
-        return cls(http)
+        return cls(http, Lazy(lambda: AsyncSysdigClient.from_config(config)))
+
+    def close(self):
+        """Close the connections of the client and of its async counterpart."""
+        self.http.close()
+        aio.close_client(self.async_client)
 
     def check(self):
         """Verify authentication, return current user info string."""
         r = self.http.get('/api/user/me')
         r.raise_for_status()
-        user = r.json()['user']
+        user = loads(r.content)['user']
         return f"{user['username']} ({user.get('systemRole', 'unknown')})"
 
     def list_events(self, limit=50, from_ns=None, to_ns=None, filter=None, cursor=None):
@@ -38,42 +61,138 @@ class SysdigClient:
 
         r = self.http.get('/api/v1/secureEvents', params=params)
         r.raise_for_status()
-        body = r.json()
+        body = loads(r.content)
         return body['data'], body.get('page', {})
 
     def get_event(self, event_id):
         """Return a single security event dict."""
         r = self.http.get(f'/api/v1/secureEvents/{event_id}')
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def list_policies(self):
         """Return all runtime policies."""
         r = self.http.get('/api/v2/policies')
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def get_policy(self, policy_id):
         """Return a single policy dict."""
         r = self.http.get(f'/api/v2/policies/{policy_id}')
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def list_alerts(self):
         """Return all configured alerts."""
         r = self.http.get('/api/alerts')
         r.raise_for_status()
-        return r.json().get('alerts', [])
+        return loads(r.content).get('alerts', [])
 
     def get_alert(self, alert_id):
         """Return a single alert dict."""
         r = self.http.get(f'/api/alerts/{alert_id}')
         r.raise_for_status()
-        return r.json().get('alert', r.json())
+        data = loads(r.content)
+        return data.get('alert', data)
 
     def list_connected_agents(self):
         """Return connected agents and total count."""
         r = self.http.get('/api/agents/connected')
         r.raise_for_status()
-        body = r.json()
+        body = loads(r.content)
         return body.get('agents', []), body.get('total', 0)
+
+    SYNC = ('event',)
+
+    def sync(self, resource, since):
+        """Yield (id, time, host, severity, record) for records created since a timestamp in seconds."""
+        if resource != 'event':
+            raise ValueError(f"unknown resource {resource}")
+        from_ns = int(since * 1_000_000_000)
+        to_ns = int(datetime.now(timezone.utc).timestamp()) * 1_000_000_000
+        cursor = None
+        while True:
+            events, page = self.list_events(limit=999, from_ns=from_ns, to_ns=to_ns, cursor=cursor)
+            for e in events:
+                yield e['id'], e.get('timestamp', 0) / 1_000_000_000, event_host(e), e.get('severity'), e
+            cursor = page.get('next')
+            if not cursor or not events:
+                break
+
+
+class AsyncSysdigClient:
+    """Sysdig Secure REST API client running requests concurrently."""
+
+    # event fields searched for each kind of indicator
+    HUNT_FIELDS = {
+        'host': ('host.hostName',),
+        'ip': ('fd.sip', 'fd.rip'),
+    }
+
+    def __init__(self, http: httpx.AsyncClient):
+        self.http = http
+
+    @classmethod
+    def from_config(cls, config):
+        """Build an AsyncSysdigClient from a revealed endpoint config dict."""
+        http = build_async_client(
+            config,
+            cache_paths=SysdigClient.CACHE_PATHS,
+            headers={'Authorization': f"Bearer {config['credentials']['secret']}"},
+        )
+        return cls(http)
+
+    async def check(self):
+        """Verify authentication, return current user info string."""
+        r = await self.http.get('/api/user/me')
+        r.raise_for_status()
+        user = loads(r.content)['user']
+        return f"{user['username']} ({user.get('systemRole', 'unknown')})"
+
+    async def list_events(self, limit=50, from_ns=None, to_ns=None, filter=None, cursor=None):
+        """Return paginated security events and page metadata."""
+        params = {'limit': limit}
+        if from_ns is not None:
+            params['from'] = int(from_ns)
+        if to_ns is not None:
+            params['to'] = int(to_ns)
+        if filter:
+            params['filter'] = filter
+        if cursor:
+            params['cursor'] = cursor
+
+        r = await self.http.get('/api/v1/secureEvents', params=params)
+        r.raise_for_status()
+        body = loads(r.content)
+        return body['data'], body.get('page', {})
+
+    async def get_event(self, event_id):
+        """Return a single security event dict."""
+        r = await self.http.get(f'/api/v1/secureEvents/{event_id}')
+        r.raise_for_status()
+        return loads(r.content)
+
+    async def hunt(self, indicators, since, limit=100):
+        """Yield security events whose host or connection matches indicators since a datetime."""
+        filters = []
+        for kind, fields in self.HUNT_FIELDS.items():
+            values = ', '.join(f'"{value}"' for k, value in indicators if k == kind)
+            if values:
+                filters.extend(f'{field} in ({values})' for field in fields)
+        from_ns = int(since.timestamp()) * 1_000_000_000
+        to_ns = int(datetime.now(timezone.utc).timestamp()) * 1_000_000_000
+        pages = await asyncio.gather(*(
+            self.list_events(limit=limit, from_ns=from_ns, to_ns=to_ns, filter=f) for f in filters
+        ))
+        seen = set()
+        for events, _ in pages:
+            for e in events:
+                if e.get('id') in seen:
+                    continue
+                seen.add(e.get('id'))
+                yield {
+                    'time': datetime.fromtimestamp(e.get('timestamp', 0) / 1e9, timezone.utc).isoformat(),
+                    'host': event_host(e),
+                    'summary': e.get('ruleName', e.get('name', '')),
+                    'ref': str(e.get('id', '')),
+                }
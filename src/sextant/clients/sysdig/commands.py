@@ -9,6 +9,8 @@ from rich.console import Console
 from rich.table import Table
 
 from sextant.clients.sysdig.client import SysdigClient
+from sextant.output import format_option, write_records
+from sextant.store import local_records
 from sextant.utils import Lazy, humanize, deshumanize
 
 SEVERITY_LABELS = {0: 'none', 1: 'info', 2: 'low', 3: 'low', 4: 'medium', 5: 'medium', 6: 'high', 7: 'high'}
@@ -54,12 +56,19 @@ def main(ctx):
         config = ctx.obj['config'].reveal(ctx.info_name)
         return SysdigClient.from_config(config)
 
+    ctx.obj['endpoint'] = ctx.info_name
+    clients = ctx.obj.get('clients')
+    if clients is not None:
+        # shared clients are closed by their owner (sextant serve)
+        ctx.obj['client'] = clients.setdefault(ctx.info_name, Lazy(factory))
+        return
+
     client = Lazy(factory)
     ctx.obj['client'] = client
 
     def cleanup():
         if client._instance is not None:
-            client._instance.http.close()
+            client._instance.close()
     ctx.call_on_close(cleanup)
 
 
@@ -72,9 +81,11 @@ def event():
 @click.option('--from', '-f', 'from_', default='1h', help='Relative time window (e.g. 1h, 7d)')
 @click.option('--severity', '-s', default=None, help='Min severity filter (e.g. 4)')
 @click.option('--limit', '-n', default=50, help='Max results to return')
+@click.option('--local', is_flag=True, help='Read synced records from the local store (see sextant sync)')
+@format_option
 @click.pass_obj
 @handle_errors
-def list_events(obj, from_, severity, limit):
+def list_events(obj, from_, severity, limit, local, fmt):
     """List recent security events.
 
     \b
@@ -88,12 +99,18 @@ def list_events(obj, from_, severity, limit):
     from_ns = int(from_dt.timestamp()) * 1_000_000_000
     to_ns = int(now.timestamp()) * 1_000_000_000
 
-    sev_filter = f'severity >= "{severity}"' if severity else None
-    events, page = obj['client'].list_events(
-        limit=limit, from_ns=from_ns, to_ns=to_ns, filter=sev_filter,
-    )
+    if local:
+        events = local_records(
+            obj['endpoint'], 'event', since=from_ns / 1_000_000_000, limit=limit,
+            severity=int(severity) if severity else None,
+        )
+    else:
+        sev_filter = f'severity >= "{severity}"' if severity else None
+        events, page = obj['client'].list_events(
+            limit=limit, from_ns=from_ns, to_ns=to_ns, filter=sev_filter,
+        )
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('id', 'ago', 'severity', 'rule', 'source', title='Events')
         for e in events:
             ts = e.get('timestamp', 0)
@@ -111,7 +128,7 @@ def list_events(obj, from_, severity, limit):
         console = Console()
         console.print(table)
     else:
-        click.echo(json.dumps(events))
+        write_records(events, fmt)
 
 
 @event.command('get')
@@ -150,9 +167,10 @@ def policy():
 
 
 @policy.command('list')
+@format_option
 @click.pass_obj
 @handle_errors
-def list_policies(obj):
+def list_policies(obj, fmt):
     """List runtime policies.
 
     \b
@@ -161,7 +179,7 @@ def list_policies(obj):
     """
     policies = obj['client'].list_policies()
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('id', 'name', 'severity', 'type', 'enabled', title='Policies')
         for p in policies:
             enabled = '[green]yes[/green]' if p.get('enabled') else '[red]no[/red]'
@@ -174,7 +192,7 @@ def list_policies(obj):
             )
         Console().print(table)
     else:
-        click.echo(json.dumps(policies))
+        write_records(policies, fmt)
 
 
 @policy.command('get')
@@ -218,9 +236,10 @@ def alert():
 
 
 @alert.command('list')
+@format_option
 @click.pass_obj
 @handle_errors
-def list_alerts(obj):
+def list_alerts(obj, fmt):
     """List configured alerts.
 
     \b
@@ -229,7 +248,7 @@ def list_alerts(obj):
     """
     alerts = obj['client'].list_alerts()
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('id', 'name', 'severity', 'enabled', 'type', title='Alerts')
         for a in alerts:
             enabled = '[green]yes[/green]' if a.get('enabled') else '[red]no[/red]'
@@ -242,7 +261,7 @@ def list_alerts(obj):
             )
         Console().print(table)
     else:
-        click.echo(json.dumps(alerts))
+        write_records(alerts, fmt)
 
 
 @alert.command('get')
@@ -276,9 +295,10 @@ def agent():
 
 
 @agent.command('list')
+@format_option
 @click.pass_obj
 @handle_errors
-def list_agents(obj):
+def list_agents(obj, fmt):
     """List connected agents.
 
     \b
@@ -287,7 +307,7 @@ def list_agents(obj):
     """
     agents, total = obj['client'].list_connected_agents()
 
-    if sys.stdout.isatty():
+    if fmt == 'table':
         table = Table('id', 'hostname', 'os', 'version', 'status', title='Connected Agents')
         for a in agents:
             status = '[green]connected[/green]' if a.get('status', '').lower() in ('connected', 'online') else a.get('status', '')
@@ -302,4 +322,4 @@ def list_agents(obj):
         console.print(table)
         console.print(f"total: {total}")
     else:
-        click.echo(json.dumps(agents))
+        write_records(agents, fmt)
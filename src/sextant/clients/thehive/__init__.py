@@ -1,2 +1,2 @@
-from sextant.clients.thehive.client import TheHiveClient as Client
+from sextant.clients.thehive.client import TheHiveClient as Client, AsyncTheHiveClient as AsyncClient
 from sextant.clients.thehive.commands import main
@@ -1,39 +1,45 @@
 import uuid
+from datetime import datetime, timezone
 import httpx
+from sextant.codec import loads
+from sextant import aio
+from sextant.http import build_async_client, build_client
+from sextant.utils import Lazy
 
 
 class TheHiveClient:
     """TheHive REST API client."""
 
-    def __init__(self, http: httpx.Client):
+    def __init__(self, http: httpx.Client, async_client=None):
         self.http = http
+        self.async_client = async_client
+
+    @staticmethod
+    def credentials(config):
+        """Return the httpx client arguments authenticating with the endpoint credentials."""
+        if config['credentials'].get('secret'):
+            return {'headers': {'Authorization': f"Bearer {config['credentials']['secret']}"}}
+        return {'auth': httpx.BasicAuth(
+            username=config['credentials']['username'],
+            password=config['credentials']['password'],
+        )}
 
     @classmethod
     def from_config(cls, config):
         """Build a TheHiveClient from a revealed endpoint config dict."""
-        verify = config.get('verify', True)
-        if config['credentials'].get('secret'):
-            http = httpx.Client(
-                base_url=config['remote'],
-                headers={'Authorization': f"Bearer {config['credentials']['secret']}"},
-                verify=verify,
-            )
-        else:
-            http = httpx.Client(
-                base_url=config['remote'],
-                auth=httpx.BasicAuth(
-                    username=config['credentials']['username'],
-                    password=config['credentials']['password'],
-                ),
-                verify=verify,
-            )
-        return cls(http)
+        http = build_client(config, **cls.credentials(config))
+        return cls(http, Lazy(lambda: AsyncTheHiveClient.from_config(config)))
+
+    def close(self):
+        """Close the connections of the client and of its async counterpart."""
+        self.http.close()
+        aio.close_client(self.async_client)
 
     def check(self):
         """Verify authentication, return current user info string."""
         r = self.http.get('/api/v1/user/current')
         r.raise_for_status()
-        user = r.json()
+        user = loads(r.content)
         return f"{user['login']} ({user.get('profile', 'unknown')})"
 
     def create_alert(self, alert_data):
@@ -41,36 +47,131 @@ class TheHiveClient:
         alert_data['sourceRef'] = str(uuid.uuid4())
         r = self.http.post('/api/v1/alert', json=alert_data)
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
-    def list_alerts(self, since_ms):
-        """List alerts since timestamp (milliseconds)."""
-        r = self.http.post('/api/v1/query', json={
+    @staticmethod
+    def alerts_query(since_ms, field='date'):
+        """Return the query listing alerts since timestamp (milliseconds) of a date field."""
+        return {
             "query": [
                 {"_name": "listAlert"},
-                {"_name": "filter", "_gte": {"_field": "date", "_value": since_ms}},
-                {"_name": "sort", "_fields": [{"date": "desc"}]},
+                {"_name": "filter", "_gte": {"_field": field, "_value": since_ms}},
+                {"_name": "sort", "_fields": [{field: "desc"}]},
+            ],
+            "excludeFields": ["description", "summary"],
+        }
+
+    @staticmethod
+    def cases_query(since_ms, field='newDate'):
+        """Return the query listing cases since timestamp (milliseconds) of a date field."""
+        return {
+            "query": [
+                {"_name": "listCase"},
+                {"_name": "filter", "_gte": {"_field": field, "_value": since_ms}},
+                {"_name": "sort", "_fields": [{field: "desc"}]},
             ],
             "excludeFields": ["description", "summary"],
-        })
+        }
+
+    @staticmethod
+    def observables_query(values, since_ms):
+        """Return the query listing observables holding any of values since timestamp (milliseconds)."""
+        return {
+            "query": [
+                {"_name": "listObservable"},
+                {"_name": "filter", "_and": [
+                    {"_in": {"_field": "data", "_values": values}},
+                    {"_gte": {"_field": "_createdAt", "_value": since_ms}},
+                ]},
+                {"_name": "sort", "_fields": [{"_createdAt": "desc"}]},
+            ],
+        }
+
+    def list_alerts(self, since_ms, field='date'):
+        """List alerts since timestamp (milliseconds) of a date field."""
+        r = self.http.post('/api/v1/query', json=self.alerts_query(since_ms, field))
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
 
     def get_alert(self, alert_id):
         """Return the alert dict."""
         r = self.http.get(f'/api/v1/alert/{alert_id}')
         r.raise_for_status()
-        return r.json()
+        return loads(r.content)
+
+    def list_cases(self, since_ms, field='newDate'):
+        """List cases since timestamp (milliseconds) of a date field."""
+        r = self.http.post('/api/v1/query', json=self.cases_query(since_ms, field))
+        r.raise_for_status()
+        return loads(r.content)
+
+    SYNC = ('alert', 'case')
+
+    def sync(self, resource, since):
+        """Yield (id, time, host, severity, record) for records created since a timestamp in seconds.
+
+        Records are selected on the time TheHive stored them (_createdAt),
+        not on the date supplied by their source, which can be older.
+        """
+        since_ms = int(since * 1000)
+        if resource == 'alert':
+            for a in self.list_alerts(since_ms, '_createdAt'):
+                yield a['_id'], a['_createdAt'] / 1000, None, a.get('severity'), a
+        elif resource == 'case':
+            for c in self.list_cases(since_ms, '_createdAt'):
+                yield c['_id'], c['_createdAt'] / 1000, None, c.get('severity'), c
+        else:
+            raise ValueError(f"unknown resource {resource}")
+
+
+class AsyncTheHiveClient:
+    """TheHive REST API client running requests concurrently."""
+
+    def __init__(self, http: httpx.AsyncClient):
+        self.http = http
+
+    @classmethod
+    def from_config(cls, config):
+        """Build an AsyncTheHiveClient from a revealed endpoint config dict."""
+        return cls(build_async_client(config, **TheHiveClient.credentials(config)))
+
+    async def check(self):
+        """Verify authentication, return current user info string."""
+        r = await self.http.get('/api/v1/user/current')
+        r.raise_for_status()
+        user = loads(r.content)
+        return f"{user['login']} ({user.get('profile', 'unknown')})"
+
+    async def list_alerts(self, since_ms):
+        """List alerts since timestamp (milliseconds)."""
+        r = await self.http.post('/api/v1/query', json=TheHiveClient.alerts_query(since_ms))
+        r.raise_for_status()
+        return loads(r.content)
+
+    async def get_alert(self, alert_id):
+        """Return the alert dict."""
+        r = await self.http.get(f'/api/v1/alert/{alert_id}')
+        r.raise_for_status()
+        return loads(r.content)
 
-    def list_cases(self, since_ms):
+    async def list_cases(self, since_ms):
         """List cases since timestamp (milliseconds)."""
-        r = self.http.post('/api/v1/query', json={
-            "query": [
-                {"_name": "listCase"},
-                {"_name": "filter", "_gte": {"_field": "newDate", "_value": since_ms}},
-                {"_name": "sort", "_fields": [{"newDate": "desc"}]},
-            ],
-            "excludeFields": ["description", "summary"],
-        })
+        r = await self.http.post('/api/v1/query', json=TheHiveClient.cases_query(since_ms))
+        r.raise_for_status()
+        return loads(r.content)
+
+    async def hunt(self, indicators, since, limit=100):
+        """Yield observables holding any indicator since a datetime."""
+        query = TheHiveClient.observables_query(
+            [value for _, value in indicators], int(since.timestamp() * 1000),
+        )
+        query['query'].append({"_name": "page", "from": 0, "to": limit})
+        r = await self.http.post('/api/v1/query', json=query)
         r.raise_for_status()
-        return r.json()
+        for o in loads(r.content):
+            yield {
+                'time': datetime.fromtimestamp(o.get('_createdAt', 0) / 1000, timezone.utc).isoformat(),
+                'host': '',
+                'summary': f"{o.get('dataType', '')} {o.get('data', '')} {' '.join(o.get('tags', []))}".strip(),
+                'ref': o.get('_id', ''),
+            }
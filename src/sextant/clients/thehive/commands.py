@@ -1,10 +1,11 @@
-import sys
 import click
 import httpx
 import json
 from datetime import datetime
 from rich.console import Console
 from rich.table import Table
+from sextant.output import format_option, write_records
+from sextant.store import local_records
 from sextant.utils import Lazy, humanize, deshumanize
 from sextant.clients.thehive.client import TheHiveClient
 
@@ -17,12 +18,19 @@ def main(ctx):
         config = ctx.obj['config'].reveal(ctx.info_name)
         return TheHiveClient.from_config(config)
 
+    ctx.obj['endpoint'] = ctx.info_name
+    clients = ctx.obj.get('clients')
+    if clients is not None:
+        # shared clients are closed by their owner (sextant serve)
+        ctx.obj['client'] = clients.setdefault(ctx.info_name, Lazy(factory))
+        return
+
     client = Lazy(factory)
     ctx.obj['client'] = client
 
     def cleanup():
         if client._instance is not None:
-            client._instance.http.close()
+            client._instance.close()
     ctx.call_on_close(cleanup)
 
 
@@ -47,14 +55,19 @@ def new(obj, file):
 
 @alert.command('list')
 @click.option('--from', '-f', 'from_', default='10m')
+@click.option('--local', is_flag=True, help='Read synced records from the local store (see sextant sync)')
+@format_option
 @click.pass_obj
-def list_alert(obj, from_):
+def list_alert(obj, from_, local, fmt):
     """Get the last alerts from TheHive."""
     try:
         since = int((datetime.now() - deshumanize(from_)).timestamp() * 1000)
-        alerts = obj['client'].list_alerts(since_ms=since)
+        if local:
+            alerts = local_records(obj['endpoint'], 'alert', since=since / 1000)
+        else:
+            alerts = obj['client'].list_alerts(since_ms=since)
 
-        if sys.stdout.isatty():
+        if fmt == 'table':
             table = Table('id', 'ago', 'severity', 'status', 'obs', 'title', title='Alerts')
             for alert in alerts:
                 table.add_row(
@@ -67,10 +80,12 @@ def list_alert(obj, from_):
                 )
             Console().print(table)
         else:
-            click.echo(json.dumps(alerts))
+            write_records(alerts, fmt)
 
     except httpx.HTTPStatusError as e:
         click.echo(e.response.text, err=True)
+    except LookupError as e:
+        click.echo(str(e), err=True)
 
 
 @alert.command()
@@ -89,14 +104,19 @@ def case():
 
 @case.command('list')
 @click.option('--from', '-f', 'from_', default='10m')
+@click.option('--local', is_flag=True, help='Read synced records from the local store (see sextant sync)')
+@format_option
 @click.pass_obj
-def list_case(obj, from_):
+def list_case(obj, from_, local, fmt):
     """Get the last cases from TheHive."""
     try:
         since = int((datetime.now() - deshumanize(from_)).timestamp() * 1000)
-        cases = obj['client'].list_cases(since_ms=since)
+        if local:
+            cases = local_records(obj['endpoint'], 'case', since=since / 1000)
+        else:
+            cases = obj['client'].list_cases(since_ms=since)
 
-        if sys.stdout.isatty():
+        if fmt == 'table':
             table = Table('id', 'ago', 'severity', 'status', 'stage', 'title', title='Cases')
             for case in cases:
                 table.add_row(
@@ -109,7 +129,9 @@ def list_case(obj, from_):
                 )
             Console().print(table)
         else:
-            click.echo(json.dumps(cases))
+            write_records(cases, fmt)
 
     except httpx.HTTPStatusError as e:
         click.echo(e.response.text, err=True)
+    except LookupError as e:
+        click.echo(str(e), err=True)
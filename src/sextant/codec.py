@@ -0,0 +1,75 @@
+"""JSON codec backed by the fastest library installed.
+
+orjson is used when available, then msgspec, then the standard library.
+loads accepts bytes so response bodies are decoded without building an
+intermediate str and raises ValueError on invalid documents; dumps returns
+bytes ready to be written out.
+"""
+import json
+
+try:
+    import orjson
+
+    BACKEND = 'orjson'
+
+    def loads(data):
+        """Decode a JSON document from bytes or str."""
+        return orjson.loads(data)
+
+    def dumps(obj):
+        """Encode an object to JSON bytes."""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+except ImportError:
+    try:
+        import msgspec
+
+        BACKEND = 'msgspec'
+        _decoder = msgspec.json.Decoder()
+        _encoder = msgspec.json.Encoder()
+
+        def loads(data):
+            """Decode a JSON document from bytes or str."""
+            try:
+                return _decoder.decode(data)
+            except msgspec.DecodeError as e:
+                raise ValueError(str(e)) from e
+
+        def dumps(obj):
+            """Encode an object to JSON bytes."""
+            return _encoder.encode(obj)
+
+    except ImportError:
+        BACKEND = 'json'
+
+        def loads(data):
+            """Decode a JSON document from bytes or str."""
+            return json.loads(data)
+
+        def dumps(obj):
+            """Encode an object to JSON bytes."""
+            return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def iter_lines(chunks):
+    """Yield the lines of a stream of byte chunks, without their line ending."""
+    pending = b''
+    for chunk in chunks:
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b'\r')
+    if pending:
+        yield pending
+
+
+async def aiter_lines(chunks):
+    """Yield the lines of an async stream of byte chunks, without their line ending."""
+    pending = b''
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b'\r')
+    if pending:
+        yield pending
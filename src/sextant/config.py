@@ -1,30 +1,167 @@
-import yaml
+import copy
+import hashlib
+import json
+import logging
+import os
+import pickle
 import subprocess
+import sys
+import time
+import yaml
 from pathlib import Path
 from sextant import SextantConfigurationError
+from sextant.cache import makedirs, private
+from sextant.utils import deshumanize
+
+logger = logging.getLogger('sextant')
+
+CONFIG_FILE = Path('~/.config/sextant/config.yaml')
+CACHE_DIR = Path('~/.cache/sextant')
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# print the requested environment variables as a JSON list
+DUMP_ENV = 'import json, os, sys; print(json.dumps([os.environ[n] for n in sys.argv[1:]]))'
+
+
+def onepassword(references):
+    """Get secrets from 1password in a single `op` call.
+
+    Takes a dict of keys to `op://vault/item/field` references and returns a
+    dict of keys to values. References are passed in the environment of
+    `op run` which resolves them all at once.
+    """
+    if not references:
+        return {}
+
+    env = dict(os.environ)
+    names = []
+    for i, reference in enumerate(references.values()):
+        names.append(f'SEXTANT_OP_{i}')
+        env[names[-1]] = reference
 
-def onepassword(vault, item, field):
-    """Get secrets from 1password."""
     try:
         result = subprocess.run(
-            ["op", "read", "-n", f"op://{vault}/{item}/{field}"],
-            check=True, capture_output=True,
+            ["op", "run", "--no-masking", "--", sys.executable, "-c", DUMP_ENV, *names],
+            check=True, capture_output=True, env=env,
         )
-        return result.stdout.decode()
+        return dict(zip(references, json.loads(result.stdout)))
 
     except subprocess.CalledProcessError as e:
         raise SextantConfigurationError(e.stderr.decode())
 
+
+class SecretCache:
+    """Revealed credentials kept in the OS keyring for a limited time.
+
+    Entries are stored per endpoint along with the references they were
+    revealed from, so changing the vault, item or fields invalidates them.
+    Keyring errors, such as no backend on a headless host, disable the cache.
+    """
+
+    SERVICE = 'sextant'
+
+    def __init__(self):
+        try:
+            import keyring
+            self.keyring = keyring
+        except ImportError:
+            self.keyring = None
+
+    def get(self, name, references):
+        """Return the cached fields of an endpoint and their expiry time or None."""
+        if self.keyring is None:
+            return None
+        try:
+            entry = json.loads(self.keyring.get_password(self.SERVICE, name) or 'null')
+        except ValueError:
+            return None
+        except self.keyring.errors.KeyringError as e:
+            logger.info(f"Can't read the secret cache: {e}")
+            return None
+        if not entry or entry['references'] != references or entry['expires'] < time.time():
+            return None
+        return entry['fields'], entry['expires']
+
+    def set(self, name, references, fields, ttl):
+        """Store the fields of an endpoint for ttl seconds."""
+        if self.keyring is None:
+            logger.warning('Install keyring to cache secrets')
+            return
+        entry = {'references': references, 'fields': fields, 'expires': time.time() + ttl}
+        try:
+            self.keyring.set_password(self.SERVICE, name, json.dumps(entry))
+        except self.keyring.errors.KeyringError as e:
+            logger.info(f"Can't write the secret cache: {e}")
+
+    def flush(self, name):
+        """Remove an endpoint from the cache, return True if it was cached."""
+        if self.keyring is None:
+            return False
+        try:
+            self.keyring.delete_password(self.SERVICE, name)
+            return True
+        except self.keyring.errors.KeyringError:
+            return False
+
+
 class SextantConfig:
 
-    def __init__(self, file=Path('~/.config/sextant/config.yaml')):
+    def __init__(self, file=CONFIG_FILE, cache=CACHE_DIR / 'config.pickle'):
         try:
-            with open(file.expanduser(), 'r') as f:
-                self.file = yaml.safe_load(f)
+            self.file = self.load(file.expanduser(), cache and cache.expanduser())
 
         except FileNotFoundError as e:
             raise SextantConfigurationError(f"Configuration file not found: {e}")
 
+        self.index = {ep['name']: ep for ep in self.endpoints}
+        self.secrets = SecretCache()
+        # endpoint names to revealed fields and the time they expire (None to keep them)
+        self._revealed = {}
+        self._forgotten = set()
+
+    @staticmethod
+    def load(file, cache=None):
+        """Parse the YAML file or return its cached parsing.
+
+        The parsed config is pickled along with the file modification time,
+        size and hash. A touched file with the same hash is not parsed again.
+        """
+        stat = file.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = None
+        if cache is not None:
+            try:
+                with open(cache, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached['path'] == str(file) and cached['stamp'] == stamp:
+                    return cached['data']
+            except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+                cached = None
+
+        raw = file.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        if cached and cached['path'] == str(file) and cached['hash'] == digest:
+            data = cached['data']
+        else:
+            data = yaml.load(raw, Loader=SafeLoader)
+
+        if cache is not None:
+            try:
+                makedirs(cache.parent)
+                tmp = cache.with_suffix(f'.{os.getpid()}.tmp')
+                with open(tmp, 'wb', opener=private) as f:
+                    pickle.dump({'path': str(file), 'stamp': stamp, 'hash': digest, 'data': data},
+                                f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, cache)
+            except OSError as e:
+                logger.info(f"Can't write config cache: {e}")
+
+        return data
+
     @property
     def endpoints(self):
         """Return the list of endpoints."""
@@ -32,19 +169,90 @@ class SextantConfig:
 
     def reveal(self, name):
         """Load the endpoint config and reveal the secrets."""
-        try:
-            endpoint = next(ep for ep in self.endpoints if ep['name'] == name)
+        return self.reveal_many([name])[0]
+
+    def reveal_many(self, names=None):
+        """Load several endpoint configs revealing their secrets at once.
+
+        All 1password fields not already revealed or found in the secret
+        cache are resolved with a single `op` call. Reveal every endpoint
+        when names is None. Returned configs are copies.
+        """
+        endpoints = []
+        for name in names if names is not None else list(self.index):
+            try:
+                endpoints.append(self.index[name])
+            except KeyError:
+                raise SextantConfigurationError(f"Configuration for endpoint {name} not found")
+
+        # collect the references of every field to reveal
+        references = {}
+        for endpoint in endpoints:
+            name = endpoint['name']
+            credentials = endpoint['credentials']
+            if credentials.get('provider') != '1password' or name in self._revealed:
+                continue
+            refs = self._references(credentials)
+            # the keyring is only read for endpoints opting in with a TTL
+            cached = self.secrets.get(name, refs) if credentials.get('cache') else None
+            if cached is not None:
+                self._revealed[name] = cached
+                continue
+            for key, reference in refs.items():
+                references[(name, key)] = reference
+
+        revealed = onepassword(references)
+
+        results = []
+        for endpoint in endpoints:
+            name = endpoint['name']
+            credentials = endpoint['credentials']
+            endpoint = copy.deepcopy(endpoint)
+            if credentials.get('provider') == '1password':
+                if name not in self._revealed:
+                    fields = {key: revealed[(name, key)] for key in credentials['fields']}
+                    expires = None
+                    if credentials.get('cache'):
+                        ttl = deshumanize(credentials['cache']).total_seconds()
+                        self.secrets.set(name, self._references(credentials), fields, ttl)
+                        expires = time.time() + ttl
+                    self._revealed[name] = fields, expires
+                endpoint['credentials'] = dict(self._revealed[name][0])
+            results.append(endpoint)
+
+        return results
+
+    def flush(self, names=None):
+        """Remove endpoints from the secret cache and revealed secrets, return the flushed names."""
+        if names is None:
+            names = list(self.index)
+        flushed = []
+        for name in names:
+            cached = self.secrets.flush(name)
+            if self._revealed.pop(name, None) is not None:
+                self._forgotten.add(name)
+            elif not cached:
+                continue
+            flushed.append(name)
+        return flushed
 
-            if endpoint['credentials']['provider'] == '1password':
-                vault = endpoint['credentials']['vault']
-                item = endpoint['credentials']['item']
-                # reveal values from field names
-                revealed_fields = {}
-                for key, field in endpoint['credentials']['fields'].items():
-                    revealed_fields[key] = onepassword(vault, item, field)
-                endpoint['credentials'] = revealed_fields
+    def expire(self):
+        """Forget revealed secrets past their TTL.
 
-            return endpoint
+        Return the names of the endpoints forgotten since the last call,
+        flushed ones included, whose clients hold outdated credentials.
+        """
+        now = time.time()
+        for name, (_, expires) in list(self._revealed.items()):
+            if expires is not None and expires < now:
+                del self._revealed[name]
+                self._forgotten.add(name)
+        forgotten, self._forgotten = self._forgotten, set()
+        return forgotten
 
-        except StopIteration:
-            raise SextantConfigurationError(f"Configuration for endpoint {name} not found")
+    @staticmethod
+    def _references(credentials):
+        """Return the 1password references of each credential field."""
+        vault = credentials['vault']
+        item = credentials['item']
+        return {key: f"op://{vault}/{item}/{field}" for key, field in credentials['fields'].items()}
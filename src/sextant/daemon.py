@@ -0,0 +1,275 @@
+"""Warm daemon running commands sent by the CLI over a Unix socket.
+
+Messages are frames made of a channel byte, a 4 bytes length and a payload.
+The CLI sends a REQUEST frame with its arguments and terminal state, the
+daemon answers with STDOUT and STDERR frames then an EXIT frame holding the
+exit code. Standard input is only forwarded when the command reads it: each
+empty STDIN frame of the daemon asks for the next chunk of at most
+STDIN_CHUNK bytes, and the CLI answers with an empty STDIN frame at the end
+of its input.
+"""
+import io
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import threading
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+from sextant.cache import makedirs
+
+SOCKET = Path('~/.cache/sextant/sextant.sock')
+
+REQUEST, STDOUT, STDERR, STDIN, EXIT = range(5)
+
+HEADER = struct.Struct('>BI')
+
+STDIN_CHUNK = 2**18
+
+# environment of the CLI applied to commands run by the daemon
+FORWARDED_ENV = ('TERM', 'COLORTERM', 'NO_COLOR', 'FORCE_COLOR', 'COLUMNS', 'LINES')
+
+
+# frames may be sent from several threads, such as idle output flushes
+SEND_LOCK = threading.Lock()
+
+
+def send(sock, channel, data=b''):
+    """Send a frame."""
+    with SEND_LOCK:
+        sock.sendall(HEADER.pack(channel, len(data)) + data)
+
+
+def receive(sock):
+    """Return the channel and payload of the next frame."""
+    def read(size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('daemon connection closed')
+            data += chunk
+        return bytes(data)
+
+    channel, size = HEADER.unpack(read(HEADER.size))
+    return channel, read(size)
+
+
+class Output(io.RawIOBase):
+    """Writable stream sending frames on a channel."""
+
+    def __init__(self, sock, channel, tty):
+        self.sock = sock
+        self.channel = channel
+        self.tty = tty
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self.tty
+
+    def write(self, data):
+        send(self.sock, self.channel, bytes(data))
+        return len(data)
+
+
+class Input(io.RawIOBase):
+    """Readable stream fetching the CLI standard input one chunk at a time."""
+
+    def __init__(self, sock, tty):
+        self.sock = sock
+        self.tty = tty
+        self.chunk = memoryview(b'')
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def isatty(self):
+        return self.tty
+
+    def readinto(self, buffer):
+        if not self.chunk and not self.eof:
+            send(self.sock, STDIN)
+            _, data = receive(self.sock)
+            self.chunk = memoryview(data)
+            self.eof = not data
+        size = min(len(buffer), len(self.chunk))
+        buffer[:size] = self.chunk[:size]
+        self.chunk = self.chunk[size:]
+        return size
+
+
+def forward(argv, path=SOCKET):
+    """Run the command through the daemon, return the exit code.
+
+    Return None when no daemon is listening, so the command runs locally.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path.expanduser()))
+    except OSError:
+        sock.close()
+        return None
+
+    with sock:
+        return session(sock, argv, sys.stdin.buffer, sys.stdout.buffer, sys.stderr.buffer)
+
+
+def session(sock, argv, stdin, stdout, stderr):
+    """Send a command on a connected socket and copy its output."""
+    request = {
+        'argv': argv,
+        'cwd': os.getcwd(),
+        'env': {k: os.environ[k] for k in FORWARDED_ENV if k in os.environ},
+        'tty': [stdin.isatty(), stdout.isatty(), stderr.isatty()],
+    }
+    if request['tty'][1] and 'COLUMNS' not in request['env']:
+        try:
+            size = os.get_terminal_size(stdout.fileno())
+            request['env'].update(COLUMNS=str(size.columns), LINES=str(size.lines))
+        except OSError:
+            pass
+    send(sock, REQUEST, json.dumps(request).encode())
+
+    while True:
+        channel, data = receive(sock)
+        if channel == STDOUT:
+            stdout.write(data)
+            stdout.flush()
+        elif channel == STDERR:
+            stderr.write(data)
+            stderr.flush()
+        elif channel == STDIN:
+            send(sock, STDIN, b'' if stdin.isatty() else stdin.read1(STDIN_CHUNK))
+        elif channel == EXIT:
+            return int(data)
+
+
+@contextmanager
+def redirect(sock, request):
+    """Redirect standard streams, directory and environment for a request."""
+    saved = sys.stdin, sys.stdout, sys.stderr, os.getcwd(), dict(os.environ)
+    tty_in, tty_out, tty_err = request['tty']
+    sys.stdin = io.TextIOWrapper(io.BufferedReader(Input(sock, tty_in)), encoding='utf-8')
+    sys.stdout = io.TextIOWrapper(io.BufferedWriter(Output(sock, STDOUT, tty_out)),
+                                  encoding='utf-8', write_through=True)
+    sys.stderr = io.TextIOWrapper(io.BufferedWriter(Output(sock, STDERR, tty_err)),
+                                  encoding='utf-8', write_through=True)
+    for key in FORWARDED_ENV:
+        os.environ.pop(key, None)
+    os.environ.update(request['env'])
+    try:
+        os.chdir(request['cwd'])
+        yield
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except OSError:
+                pass
+        sys.stdin, sys.stdout, sys.stderr, cwd, env = saved
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+
+
+class Daemon:
+    """Run commands sent over a Unix socket, keeping clients open between them."""
+
+    def __init__(self, config_factory):
+        self.config_factory = config_factory
+        self.config = None
+        self.stamp = None
+        self.clients = {}
+
+    def refresh(self, file):
+        """Reload the configuration and drop clients when the file changed.
+
+        Clients of endpoints whose secrets expired or were flushed are
+        dropped too, so they are built again with revealed credentials.
+        """
+        stamp = file.expanduser().stat().st_mtime_ns
+        if stamp != self.stamp:
+            self.close()
+            self.config = self.config_factory()
+            self.stamp = stamp
+        else:
+            self.drop(self.config.expire())
+
+    def drop(self, names):
+        """Close the HTTP connections of the clients of endpoints."""
+        for name in names:
+            client = self.clients.pop(name, None)
+            if client is not None and client._instance is not None:
+                client._instance.close()
+
+    def close(self):
+        """Close the HTTP connections of every client."""
+        self.drop(list(self.clients))
+
+    def handle(self, sock, cli, file):
+        """Run a single request read from the socket."""
+        import click
+        from sextant import SextantError
+
+        _, data = receive(sock)
+        request = json.loads(data)
+        code = 0
+        with redirect(sock, request):
+            # handlers hold the stream they were created with
+            logging.getLogger('sextant').handlers.clear()
+            try:
+                self.refresh(file)
+                cli.endpoints = {ep['name']: ep['client'] for ep in self.config.endpoints}
+                cli.main(
+                    args=request['argv'], prog_name='sextant',
+                    obj={'config': self.config, 'clients': self.clients},
+                )
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else int(e.code is not None)
+            except SextantError as e:
+                click.secho(str(e), fg='red')
+                code = 1
+            except (BrokenPipeError, ConnectionError):
+                raise
+            except Exception:
+                traceback.print_exc()
+                code = 1
+        send(sock, EXIT, str(code).encode())
+
+    def serve(self, cli, file, path=SOCKET):
+        """Listen on the socket until interrupted."""
+        from sextant import aio
+
+        path = path.expanduser()
+        makedirs(path.parent)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(path))
+            raise RuntimeError(f"a daemon is already listening on {path}")
+        except OSError:
+            path.unlink(missing_ok=True)
+        finally:
+            probe.close()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(path))
+        os.chmod(path, 0o600)
+        server.listen()
+        try:
+            while True:
+                sock, _ = server.accept()
+                with sock:
+                    try:
+                        self.handle(sock, cli, file)
+                    except (BrokenPipeError, ConnectionError):
+                        pass
+        finally:
+            server.close()
+            path.unlink(missing_ok=True)
+            self.close()
+            aio.close()
@@ -0,0 +1,203 @@
+"""Compressed and columnar files of records for offline analysis.
+
+Tabular files (CSV, Parquet) take their columns from the first record. A
+later record bringing new fields closes the part written so far and starts
+a new one with the extended columns; parts are merged on close, so the
+common case of a stable schema is written once. Values are strings, as
+returned by Splunk, multivalue fields being joined with newlines.
+"""
+import csv
+from pathlib import Path
+from sextant import codec
+
+FILE_FORMATS = ('csv', 'ndjson.zst', 'parquet')
+
+
+def guess_format(path):
+    """Return the file format matching the extension of path or None."""
+    name = str(path)
+    for fmt in FILE_FORMATS:
+        if name.endswith(f'.{fmt}'):
+            return fmt
+    return None
+
+
+def cell(value):
+    """Return a record value as a string cell."""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return '\n'.join(map(str, value))
+    return value if isinstance(value, str) else str(value)
+
+
+class TabularFile:
+    """Write records in row groups of `rows` to a file with extensible columns."""
+
+    def __init__(self, path, rows=50000):
+        self.path = Path(path)
+        self.rows = rows
+        self.fields = []
+        self.known = set()
+        self.buffer = []
+        self.parts = []
+        self.writer = None
+
+    def write(self, record):
+        new = [f for f in record if f not in self.known]
+        if new:
+            if self.writer is not None:
+                # columns of the open part are fixed, start a new part
+                self.flush()
+                self.close_part(self.writer)
+                self.writer = None
+            self.fields.extend(new)
+            self.known.update(new)
+        self.buffer.append(record)
+        if len(self.buffer) >= self.rows:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.writer is None:
+            part = self.path.with_name(f'{self.path.name}.{len(self.parts)}.part')
+            self.parts.append((part, list(self.fields)))
+            self.writer = self.open_part(part, self.fields)
+        self.write_rows(self.writer, [[cell(r.get(f)) for f in self.fields] for r in self.buffer])
+        self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.close_part(self.writer)
+            self.writer = None
+        if not self.parts:
+            self.close_part(self.open_part(self.path, self.fields))
+        elif len(self.parts) == 1:
+            self.parts[0][0].replace(self.path)
+        else:
+            self.merge()
+
+    def merge(self):
+        """Rewrite every part to path with the final columns."""
+        writer = self.open_part(self.path, self.fields)
+        try:
+            for part, fields in self.parts:
+                positions = [fields.index(f) if f in fields else None for f in self.fields]
+                rows = []
+                for row in self.read_part(part):
+                    rows.append([None if i is None else row[i] for i in positions])
+                    if len(rows) >= self.rows:
+                        self.write_rows(writer, rows)
+                        rows = []
+                if rows:
+                    self.write_rows(writer, rows)
+                part.unlink()
+        finally:
+            self.close_part(writer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvFile(TabularFile):
+    """CSV file with a header row."""
+
+    def open_part(self, path, fields):
+        f = open(path, 'w', newline='')
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        return f, writer
+
+    def write_rows(self, writer, rows):
+        writer[1].writerows(rows)
+
+    def close_part(self, writer):
+        writer[0].close()
+
+    def read_part(self, path):
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            yield from reader
+
+
+class ParquetFile(TabularFile):
+    """Parquet file of string columns, each row group compressed with zstd."""
+
+    def __init__(self, path, rows=50000, compression='zstd'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('install sextant[parquet] to write parquet files')
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.compression = compression
+        super().__init__(path, rows)
+
+    def open_part(self, path, fields):
+        schema = self.pa.schema([(f, self.pa.string()) for f in fields])
+        return self.pq.ParquetWriter(path, schema, compression=self.compression)
+
+    def write_rows(self, writer, rows):
+        columns = [self.pa.array([row[i] for row in rows], self.pa.string()) for i in range(len(writer.schema))]
+        writer.write_table(self.pa.Table.from_arrays(columns, schema=writer.schema))
+
+    def close_part(self, writer):
+        writer.close()
+
+    def read_part(self, path):
+        for batch in self.pq.ParquetFile(path).iter_batches(batch_size=self.rows):
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
+class ZstdNdjsonFile:
+    """JSON lines file compressed with zstd, written in batches of `batch` records."""
+
+    def __init__(self, path, level=3, batch=1000):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('install sextant[zstd] to write ndjson.zst files')
+        self.file = open(path, 'wb')
+        self.stream = zstandard.ZstdCompressor(level=level).stream_writer(self.file)
+        self.batch = batch
+        self.lines = []
+
+    def write(self, record):
+        self.lines.append(codec.dumps(record))
+        if len(self.lines) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.lines.append(b'')
+            self.stream.write(b'\n'.join(self.lines))
+            self.lines.clear()
+
+    def close(self):
+        self.flush()
+        self.stream.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+WRITERS = {'csv': CsvFile, 'ndjson.zst': ZstdNdjsonFile, 'parquet': ParquetFile}
+
+
+def open_file(path, fmt):
+    """Return the writer of records to path in a file format.
+
+    Raises ImportError when the library the format needs is not installed.
+    """
+    return WRITERS[fmt](path)
@@ -0,0 +1,329 @@
+import asyncio
+import hashlib
+import logging
+import pickle
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import httpx
+from sextant.aio import LimitTransport
+from sextant.cache import DiskCache
+from sextant.config import CACHE_DIR
+from sextant.utils import deshumanize
+
+logger = logging.getLogger('sextant')
+
+# default transport settings, overridden by the `http` key of an endpoint
+DEFAULTS = {
+    'pool': 10,
+    'keepalive': 30,
+    'http2': False,
+    'connect_timeout': 5,
+    'read_timeout': 30,
+    'retries': 3,
+    'backoff': 1,
+    'max_backoff': 60,
+    'cache': {},
+    'cache_size': 100,
+    'concurrency': 8,
+}
+
+# process-wide options set from the command line
+OPTIONS = {
+    'cache': 'on',
+    'profile': None,
+}
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+def retry_after(response):
+    """Return the delay in seconds requested by a Retry-After header or None."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Transport retrying throttled or unavailable responses.
+
+    Responses with a status in RETRY_STATUSES are retried with exponential
+    backoff and jitter, waiting instead for the delay given by Retry-After
+    when the server sends one, up to max_backoff. Other methods than
+    IDEMPOTENT_METHODS may have been acted on by the backend, so they are
+    only retried on 429 or on a 503 carrying Retry-After. The last response
+    is returned when retries are exhausted.
+    """
+
+    def __init__(self, transport, retries=3, backoff=1, max_backoff=60):
+        self.transport = transport
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @staticmethod
+    def retryable(request, response):
+        """Return whether the response to request can be retried."""
+        status = response.status_code
+        if status not in RETRY_STATUSES:
+            return False
+        if request.method in IDEMPOTENT_METHODS or status == 429:
+            return True
+        return status == 503 and 'Retry-After' in response.headers
+
+    def delay(self, response, attempt):
+        """Return the seconds to wait before the next attempt."""
+        delay = retry_after(response)
+        if delay is None:
+            delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+            delay *= random.uniform(0.5, 1)
+        return min(delay, self.max_backoff)
+
+    def handle_request(self, request):
+        for attempt in range(self.retries + 1):
+            response = self.transport.handle_request(request)
+            if not self.retryable(request, response) or attempt == self.retries:
+                return response
+            delay = self.delay(response, attempt)
+            response.close()
+            logger.info(f"{request.method} {request.url.path}: {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    async def handle_async_request(self, request):
+        for attempt in range(self.retries + 1):
+            response = await self.transport.handle_async_request(request)
+            if not self.retryable(request, response) or attempt == self.retries:
+                return response
+            delay = self.delay(response, attempt)
+            await response.aclose()
+            logger.info(f"{request.method} {request.url.path}: {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def close(self):
+        self.transport.close()
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class CacheTransport(httpx.BaseTransport):
+    """Transport caching successful GET responses of selected paths on disk.
+
+    ttls maps exact URL paths to the seconds a response stays fresh. Stale
+    responses carrying an ETag or Last-Modified are revalidated with a
+    conditional request and reused on 304. The cache is bypassed when
+    OPTIONS['cache'] is 'off' and only written when it is 'refresh'.
+    """
+
+    def __init__(self, transport, cache, ttls):
+        self.transport = transport
+        self.cache = cache
+        self.ttls = ttls
+
+    @staticmethod
+    def key(request):
+        """Return the cache key of a request, including its credentials."""
+        credentials = b''.join(
+            request.headers.get(name, '').encode()
+            for name in ('Authorization', 'PRIVATE-TOKEN')
+        )
+        return f"{request.method} {request.url} {hashlib.sha256(credentials).hexdigest()}"
+
+    def lookup(self, request):
+        """Return the cache key, entry and freshness of a request, or None to bypass the cache.
+
+        Conditional headers are added to the request when the entry is stale.
+        """
+        ttl = self.ttls.get(request.url.path)
+        mode = OPTIONS['cache']
+        if request.method != 'GET' or not ttl or mode == 'off':
+            return None
+
+        key = self.key(request)
+        entry = None
+        if mode != 'refresh':
+            try:
+                entry = pickle.loads(self.cache.get(key) or b'')
+            except (pickle.UnpicklingError, EOFError):
+                entry = None
+
+        fresh = bool(entry) and time.time() - entry['stored'] < ttl
+        if entry and not fresh:
+            if entry['etag']:
+                request.headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request.headers['If-Modified-Since'] = entry['last_modified']
+        return key, entry, fresh
+
+    def store(self, key, entry, response):
+        """Store a response read in full or revalidating entry, return the new entry."""
+        if entry and response.status_code == 304:
+            entry['stored'] = time.time()
+        else:
+            # keep the decoded body, without the headers describing its encoding
+            entry = {
+                'status': response.status_code,
+                'headers': [
+                    (name, value) for name, value in response.headers.multi_items()
+                    if name.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')
+                ],
+                'content': response.content,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'stored': time.time(),
+            }
+        self.cache.put(key, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+        return entry
+
+    def handle_request(self, request):
+        cached = self.lookup(request)
+        if cached is None:
+            return self.transport.handle_request(request)
+        key, entry, fresh = cached
+        if fresh:
+            return self.replay(entry)
+
+        response = self.transport.handle_request(request)
+        if entry and response.status_code == 304:
+            response.close()
+        elif response.status_code == 200:
+            response.read()
+            response.close()
+        else:
+            return response
+        return self.replay(self.store(key, entry, response))
+
+    async def handle_async_request(self, request):
+        cached = self.lookup(request)
+        if cached is None:
+            return await self.transport.handle_async_request(request)
+        key, entry, fresh = cached
+        if fresh:
+            return self.replay(entry)
+
+        response = await self.transport.handle_async_request(request)
+        if entry and response.status_code == 304:
+            await response.aclose()
+        elif response.status_code == 200:
+            await response.aread()
+            await response.aclose()
+        else:
+            return response
+        return self.replay(self.store(key, entry, response))
+
+    @staticmethod
+    def replay(entry):
+        """Build a response from a cache entry."""
+        return httpx.Response(
+            entry['status'], headers=entry['headers'], stream=httpx.ByteStream(entry['content']),
+        )
+
+    def close(self):
+        self.transport.close()
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def profile_hooks(name, asynchronous=False):
+    """Return event hooks reporting requests to the active profiler."""
+    def on_request(request):
+        if OPTIONS['profile']:
+            OPTIONS['profile'].on_request(request)
+
+    def on_response(response):
+        if OPTIONS['profile']:
+            OPTIONS['profile'].on_response(name, response)
+
+    if asynchronous:
+        async def on_async_request(request):
+            on_request(request)
+
+        async def on_async_response(response):
+            on_response(response)
+
+        return {'request': [on_async_request], 'response': [on_async_response]}
+    return {'request': [on_request], 'response': [on_response]}
+
+
+def settings(config, defaults=None):
+    """Return the transport settings of an endpoint config."""
+    return {**DEFAULTS, **(defaults or {}), **(config.get('http') or {})}
+
+
+def wrap_transport(config, http, transport, cache_paths=None):
+    """Stack the retry and cache layers on a network transport."""
+    transport = RetryTransport(transport, http['retries'], http['backoff'], http['max_backoff'])
+    if http['cache'] is not False:
+        ttls = {path: ttl if isinstance(ttl, (int, float)) else deshumanize(ttl).total_seconds()
+                for path, ttl in {**(cache_paths or {}), **http['cache']}.items()}
+        if ttls:
+            cache = DiskCache(CACHE_DIR / 'http' / config['name'], http['cache_size'] * 2**20)
+            transport = CacheTransport(transport, cache, ttls)
+    return transport
+
+
+def network_transport(config, http, cls):
+    """Return the pooled network transport of an endpoint, HTTP/2 when available."""
+    limits = httpx.Limits(
+        max_connections=http['pool'],
+        max_keepalive_connections=http['pool'],
+        keepalive_expiry=http['keepalive'],
+    )
+    try:
+        return cls(verify=config.get('verify', True), limits=limits, http2=http['http2'], retries=1)
+    except ImportError:
+        logger.warning(f"{config['name']}: install httpx[http2] to enable HTTP/2")
+        return cls(verify=config.get('verify', True), limits=limits, retries=1)
+
+
+def build_client(config, defaults=None, cache_paths=None, transport=None, **kwargs):
+    """Build the httpx.Client of an endpoint from its revealed config.
+
+    Transport settings come from the `http` key of the endpoint, falling
+    back on client specific defaults then DEFAULTS. cache_paths maps the
+    paths worth caching to their time to live and is extended by the `cache`
+    setting, which disables the cache when false. transport replaces the
+    network transport, for instance with a httpx.MockTransport. Other keyword
+    arguments such as headers or auth are passed to httpx.Client.
+    """
+    http = settings(config, defaults)
+    if transport is None:
+        transport = network_transport(config, http, httpx.HTTPTransport)
+
+    return httpx.Client(
+        base_url=config['remote'],
+        transport=wrap_transport(config, http, transport, cache_paths),
+        timeout=httpx.Timeout(http['read_timeout'], connect=http['connect_timeout']),
+        event_hooks=profile_hooks(config['name']),
+        **kwargs,
+    )
+
+
+def build_async_client(config, defaults=None, cache_paths=None, transport=None, **kwargs):
+    """Build the httpx.AsyncClient of an endpoint from its revealed config.
+
+    Takes the same arguments as build_client. The `concurrency` setting caps
+    the requests in flight to the endpoint, on top of the connection pool.
+    """
+    http = settings(config, defaults)
+    if transport is None:
+        transport = network_transport(config, http, httpx.AsyncHTTPTransport)
+
+    return httpx.AsyncClient(
+        base_url=config['remote'],
+        transport=LimitTransport(wrap_transport(config, http, transport, cache_paths), http['concurrency']),
+        timeout=httpx.Timeout(http['read_timeout'], connect=http['connect_timeout']),
+        event_hooks=profile_hooks(config['name'], asynchronous=True),
+        **kwargs,
+    )
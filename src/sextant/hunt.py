@@ -0,0 +1,68 @@
+"""Federated indicator search across endpoints.
+
+Indicators are classified by kind, then every async client implementing
+hunt(indicators, since, limit) translates them into its own query and
+yields hits as dicts with time, host, summary and ref keys. Hits of all
+endpoints are merged as they arrive.
+"""
+import asyncio
+import ipaddress
+import logging
+import re
+
+logger = logging.getLogger('sextant')
+
+HASHES = {32: 'md5', 40: 'sha1', 64: 'sha256'}
+HEX = re.compile(r'[0-9a-fA-F]+')
+
+
+def classify(value):
+    """Return the kind of an indicator: md5, sha1, sha256, ip or host."""
+    if len(value) in HASHES and HEX.fullmatch(value):
+        return HASHES[len(value)]
+    try:
+        ipaddress.ip_address(value)
+        return 'ip'
+    except ValueError:
+        return 'host'
+
+
+def matched(indicators, hit):
+    """Return the first indicator value found in a hit, case insensitive."""
+    text = repr(hit).lower()
+    for _, value in indicators:
+        if value.lower() in text:
+            return value
+    return ''
+
+
+async def hunt(clients, indicators, since, limit=100):
+    """Yield (endpoint, hit) from every client concurrently, as they arrive.
+
+    clients maps endpoint names to async clients. Failures of an endpoint
+    are yielded as (endpoint, exception) so the others carry on.
+    """
+    queue = asyncio.Queue(maxsize=1000)
+    done = object()
+
+    async def drain(name, client):
+        try:
+            async for hit in client.hunt(indicators, since, limit):
+                await queue.put((name, hit))
+        except Exception as e:
+            await queue.put((name, e))
+        finally:
+            await queue.put((name, done))
+
+    tasks = [asyncio.ensure_future(drain(name, client)) for name, client in clients.items()]
+    pending = len(tasks)
+    try:
+        while pending:
+            name, item = await queue.get()
+            if item is done:
+                pending -= 1
+            else:
+                yield name, item
+    finally:
+        for task in tasks:
+            task.cancel()
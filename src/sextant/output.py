@@ -0,0 +1,168 @@
+import sys
+import threading
+import time
+import click
+from collections import deque
+from sextant import codec
+
+FORMATS = ('table', 'json', 'ndjson')
+
+
+def write_bytes(data):
+    """Write bytes to standard output, bypassing its text layer when possible."""
+    sys.stdout.flush()
+    try:
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    except AttributeError:
+        sys.stdout.write(data.decode())
+        sys.stdout.flush()
+
+
+def format_option(f=None, piped='json', extra=()):
+    """Shared click option selecting the output format of a command.
+
+    The format defaults to a table on a terminal and to piped otherwise.
+    extra adds formats specific to the command.
+    """
+    def resolve(ctx, param, value):
+        if value is None:
+            return 'table' if sys.stdout.isatty() else piped
+        return value
+
+    def decorator(f):
+        return click.option(
+            '--format', 'fmt', type=click.Choice(FORMATS + tuple(extra)), default=None, callback=resolve,
+            help=f'Output format (default: table on a terminal, {piped} otherwise)',
+        )(f)
+
+    return decorator(f) if f else decorator
+
+
+class NdjsonWriter:
+    """Write records as JSON lines to standard output in bounded batches.
+
+    Lines are buffered and flushed every `batch` records, `size` bytes or
+    `interval` seconds, whichever comes first, so downstream tools receive
+    records as pages arrive without a write call per record. Used as a
+    context manager, a thread also flushes the lines left waiting while the
+    next page is fetched.
+    """
+
+    def __init__(self, batch=500, size=2**16, interval=0.5):
+        self.batch = batch
+        self.size = size
+        self.interval = interval
+        self.lines = []
+        self.buffered = 0
+        self.flushed = time.monotonic()
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.idle = None
+
+    def write(self, record):
+        self.write_line(codec.dumps(record))
+
+    def write_line(self, line):
+        """Write a line already encoded as JSON bytes."""
+        with self.lock:
+            self.lines.append(line)
+            self.buffered += len(line) + 1
+            if (len(self.lines) >= self.batch or self.buffered >= self.size
+                    or time.monotonic() - self.flushed >= self.interval):
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.lines:
+            self.lines.append(b'')
+            write_bytes(b'\n'.join(self.lines))
+            self.lines.clear()
+            self.buffered = 0
+        self.flushed = time.monotonic()
+
+    def flush_idle(self):
+        """Flush lines waiting for more than interval seconds until the writer is closed."""
+        while not self.closed.wait(self.interval / 2):
+            with self.lock:
+                if self.lines and time.monotonic() - self.flushed >= self.interval:
+                    try:
+                        self._flush()
+                    except OSError:
+                        # closed pipe, left for the next write to raise
+                        return
+
+    def __enter__(self):
+        self.idle = threading.Thread(target=self.flush_idle, daemon=True)
+        self.idle.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.closed.set()
+        self.idle.join()
+        self.flush()
+
+
+def write_records(records, fmt, batch=500):
+    """Write records as a JSON array or one JSON line each.
+
+    records may be any iterable, consumed lazily: ndjson records are written
+    as soon as they are produced and a JSON array is written in batches, so
+    memory doesn't grow with the number of records.
+    """
+    if fmt == 'ndjson':
+        with NdjsonWriter() as writer:
+            for record in records:
+                writer.write(record)
+        return
+
+    separator = b'['
+    encoded = []
+    for record in records:
+        encoded.append(codec.dumps(record))
+        if len(encoded) >= batch:
+            write_bytes(separator + b','.join(encoded))
+            separator = b','
+            encoded.clear()
+    if encoded:
+        write_bytes(separator + b','.join(encoded) + b']\n')
+    else:
+        write_bytes(b'[]\n' if separator == b'[' else b']\n')
+
+
+class LiveTail:
+    """Renderable of the last rows of a stream with its running counters.
+
+    Only the last `size` rows are kept, so each refresh of a rich Live
+    display costs the same whatever the number of rows received.
+    """
+
+    def __init__(self, fields, size=20):
+        self.fields = fields
+        self.rows = deque(maxlen=size)
+        self.count = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+
+    def add(self, row, size=0):
+        """Add a row of cell strings, size being the bytes it was received as."""
+        self.rows.append(row)
+        self.count += 1
+        self.bytes += size
+
+    def __rich__(self):
+        from rich.console import Group
+        from rich.filesize import decimal
+        from rich.table import Table
+
+        elapsed = time.monotonic() - self.started
+        table = Table(*self.fields)
+        for row in self.rows:
+            table.add_row(*row)
+        return Group(table, (
+            f'{self.count} rows, {self.count / max(elapsed, 1e-3):.0f} rows/s, '
+            f'{decimal(self.bytes)}, {elapsed:.0f}s'
+        ))
@@ -0,0 +1,145 @@
+import cProfile
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+import httpx
+
+VERSION = re.compile(r'v\d+(\.\d+)*')
+
+
+def path_template(path):
+    """Replace the identifiers of a URL path with {id}.
+
+    Segments holding a digit are considered identifiers, except API versions.
+    """
+    segments = [
+        '{id}' if any(c.isdigit() for c in segment) and not VERSION.fullmatch(segment) else segment
+        for segment in path.split('/')
+    ]
+    return '/'.join(segments)
+
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of values using the nearest rank."""
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+class ProfiledStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Response stream counting bytes and recording the request once read."""
+
+    def __init__(self, stream, on_close):
+        self.stream = stream
+        self.on_close = on_close
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.stream:
+            self.size += len(chunk)
+            yield chunk
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.stream.close()
+        self.on_close(self.size)
+
+    async def aclose(self):
+        await self.stream.aclose()
+        self.on_close(self.size)
+
+
+class Profiler:
+    """Collect timings of the HTTP requests made by the clients.
+
+    Records hold the endpoint, method, path template, status, bytes sent and
+    received, time to first byte and total time in seconds. The Python
+    profiler runs alongside when a dump file is given.
+    """
+
+    def __init__(self, dump=None):
+        self.records = []
+        self.lock = threading.Lock()
+        self.dump = dump
+        self.cprofile = cProfile.Profile() if dump else None
+        self.started = None
+        self.elapsed = 0
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.cprofile:
+            self.cprofile.enable()
+
+    def stop(self):
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.dump)
+        self.elapsed = time.perf_counter() - self.started
+
+    def on_request(self, request):
+        """Request event hook marking the request start."""
+        request.extensions['sextant.started'] = time.perf_counter()
+
+    def on_response(self, endpoint, response):
+        """Response event hook recording the request when its body is read."""
+        request = response.request
+        started = request.extensions.get('sextant.started', time.perf_counter())
+        ttfb = time.perf_counter() - started
+
+        def record(size):
+            with self.lock:
+                self.records.append({
+                    'endpoint': endpoint,
+                    'method': request.method,
+                    'path': request.url.path,
+                    'template': path_template(request.url.path),
+                    'status': response.status_code,
+                    'bytes_out': int(request.headers.get('Content-Length', 0)),
+                    'bytes_in': size,
+                    'ttfb': ttfb,
+                    'total': time.perf_counter() - started,
+                })
+
+        response.stream = ProfiledStream(response.stream, record)
+
+    def report(self, console, slowest=5):
+        """Print latency percentiles per path template and the slowest calls."""
+        from rich.table import Table
+
+        groups = defaultdict(list)
+        for r in self.records:
+            groups[(r['endpoint'], r['method'], r['template'])].append(r)
+
+        table = Table('endpoint', 'request', 'count', 'p50', 'p95', 'max', 'ttfb p50', 'bytes in',
+                      title='HTTP requests')
+        for (endpoint, method, template), records in sorted(groups.items()):
+            totals = [r['total'] for r in records]
+            table.add_row(
+                endpoint, f"{method} {template}", str(len(records)),
+                f"{percentile(totals, 50) * 1000:.0f}ms",
+                f"{percentile(totals, 95) * 1000:.0f}ms",
+                f"{max(totals) * 1000:.0f}ms",
+                f"{percentile([r['ttfb'] for r in records], 50) * 1000:.0f}ms",
+                str(sum(r['bytes_in'] for r in records)),
+            )
+        console.print(table)
+
+        table = Table('endpoint', 'request', 'status', 'ttfb', 'total', title='Slowest requests')
+        for r in sorted(self.records, key=lambda r: r['total'], reverse=True)[:slowest]:
+            table.add_row(
+                r['endpoint'], f"{r['method']} {r['path']}", str(r['status']),
+                f"{r['ttfb'] * 1000:.0f}ms", f"{r['total'] * 1000:.0f}ms",
+            )
+        console.print(table)
+
+        network = sum(r['total'] for r in self.records)
+        console.print(f"requests: {len(self.records)}, request time: {network:.2f}s, "
+                      f"wall time: {self.elapsed:.2f}s")
+        if self.dump:
+            console.print(f"profile written to {self.dump}")
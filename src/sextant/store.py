@@ -0,0 +1,136 @@
+"""Local SQLite store of records synced from the endpoints.
+
+Records are kept per endpoint and resource with the columns the list
+commands filter on (time, host, severity) and the full record as JSON.
+Each endpoint and resource has a watermark, the time of its newest record.
+The next sync resumes a lookback before it, to catch records indexed late;
+the rows fetched again replace the stored ones.
+"""
+import sqlite3
+from pathlib import Path
+from sextant import codec
+from sextant.cache import makedirs
+from sextant.config import CACHE_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    endpoint TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    id TEXT NOT NULL,
+    time REAL NOT NULL,
+    host TEXT,
+    severity,
+    data TEXT NOT NULL,
+    PRIMARY KEY (endpoint, resource, id)
+);
+CREATE INDEX IF NOT EXISTS records_time ON records (endpoint, resource, time);
+CREATE INDEX IF NOT EXISTS records_host ON records (endpoint, resource, host, time);
+CREATE INDEX IF NOT EXISTS records_severity ON records (endpoint, resource, severity, time);
+CREATE TABLE IF NOT EXISTS watermarks (
+    endpoint TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    time REAL NOT NULL,
+    synced REAL NOT NULL,
+    PRIMARY KEY (endpoint, resource)
+);
+"""
+
+
+class Store:
+    """SQLite database of synced records, indexed on time, host and severity."""
+
+    def __init__(self, path=CACHE_DIR / 'store.db'):
+        path = Path(path).expanduser()
+        makedirs(path.parent)
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def watermark(self, endpoint, resource):
+        """Return the time of the newest synced record or None if never synced."""
+        row = self.db.execute(
+            'SELECT time FROM watermarks WHERE endpoint = ? AND resource = ?', (endpoint, resource),
+        ).fetchone()
+        return row[0] if row else None
+
+    def resume(self, endpoint, resource, lookback=0):
+        """Return the time the next sync fetches from, lookback seconds before the watermark, or None."""
+        watermark = self.watermark(endpoint, resource)
+        return None if watermark is None else watermark - lookback
+
+    def sync(self, endpoint, resource, rows, since, synced, batch=500):
+        """Store (id, time, host, severity, record) rows and advance the watermark.
+
+        Rows are written in batches; the watermark only moves forward, once
+        every row is stored, so an interrupted sync resumes from the previous
+        one.
+        Returns the number of rows stored.
+        """
+        count = 0
+        newest = max(since, self.watermark(endpoint, resource) or since)
+        pending = []
+
+        def flush():
+            with self.db:
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(endpoint, resource, str(id_), time, host, severity, codec.dumps(record).decode())
+                     for id_, time, host, severity, record in pending],
+                )
+            pending.clear()
+
+        for row in rows:
+            pending.append(row)
+            newest = max(newest, row[1])
+            count += 1
+            if len(pending) >= batch:
+                flush()
+        flush()
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?)', (endpoint, resource, newest, synced),
+            )
+        return count
+
+    def records(self, endpoint, resource, since=None, host=None, severity=None, fields=None, limit=None):
+        """Return the stored records matching filters, newest first.
+
+        since is a timestamp in seconds, severity a minimum and fields maps
+        JSON paths of the record ($.a.b) to the value they must equal.
+        Raises LookupError when the resource was never synced.
+        """
+        if self.watermark(endpoint, resource) is None:
+            raise LookupError(f"{resource} of {endpoint} never synced, run: sextant sync {endpoint}")
+
+        clauses = ['endpoint = ?', 'resource = ?']
+        params = [endpoint, resource]
+        if since is not None:
+            clauses.append('time >= ?')
+            params.append(since)
+        if host:
+            clauses.append('host = ?')
+            params.append(host)
+        if severity is not None:
+            clauses.append('severity >= ?')
+            params.append(severity)
+        for path, value in (fields or {}).items():
+            clauses.append('json_extract(data, ?) = ?')
+            params.extend((path, value))
+        query = f"SELECT data FROM records WHERE {' AND '.join(clauses)} ORDER BY time DESC"
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return [codec.loads(data) for data, in self.db.execute(query, params)]
+
+    def close(self):
+        self.db.close()
+
+
+def local_records(endpoint, resource, **filters):
+    """Return the stored records of an endpoint resource, see Store.records."""
+    store = Store()
+    try:
+        return store.records(endpoint, resource, **filters)
+    finally:
+        store.close()
@@ -0,0 +1,119 @@
+import asyncio
+import httpx
+from unittest.mock import AsyncMock, patch
+from sextant import aio
+from sextant.cache import DiskCache
+from sextant.clients.sentinelone.client import AsyncSentinelOneClient, SentinelOneClient
+from sextant.http import CacheTransport, RetryTransport, build_async_client
+
+
+class TestLimitTransport:
+
+    def test_caps_requests_in_flight(self):
+        state = {'active': 0, 'peak': 0}
+
+        async def handler(request):
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+            await asyncio.sleep(0.01)
+            state['active'] -= 1
+            return httpx.Response(200, json={})
+
+        config = {'name': 'x', 'remote': 'https://example.com', 'http': {'cache': False, 'concurrency': 3}}
+        client = build_async_client(config, transport=httpx.MockTransport(handler))
+
+        async def fan_out():
+            return await asyncio.gather(*(client.get(f'/item/{i}') for i in range(10)))
+
+        assert len(aio.run(fan_out())) == 10
+        assert state['peak'] == 3
+
+    def test_streamed_response_holds_slot(self):
+        async def body():
+            yield b'a'
+            yield b'b'
+
+        async def handler(request):
+            return httpx.Response(200, content=body())
+
+        config = {'name': 'x', 'remote': 'https://example.com', 'http': {'cache': False, 'concurrency': 1}}
+        client = build_async_client(config, transport=httpx.MockTransport(handler))
+
+        async def read_twice():
+            for _ in range(2):
+                async with client.stream('GET', '/') as r:
+                    assert await r.aread() == b'ab'
+
+        aio.run(asyncio.wait_for(read_twice(), 1))
+
+
+class TestIterate:
+
+    def test_yields_items(self):
+        async def numbers():
+            for i in range(3):
+                await asyncio.sleep(0)
+                yield i
+
+        assert list(aio.iterate(numbers())) == [0, 1, 2]
+
+    def test_closes_on_early_exit(self):
+        closed = []
+
+        async def numbers():
+            try:
+                for i in range(10):
+                    yield i
+            finally:
+                closed.append(True)
+
+        for i in aio.iterate(numbers()):
+            break
+        assert closed == [True]
+
+
+    def test_close(self):
+        loop = aio.loop()
+        aio.run(asyncio.sleep(0))
+        aio.close()
+        assert loop.is_closed()
+        assert aio.run(asyncio.sleep(0, 'reopened')) == 'reopened'
+
+
+class TestAsyncTransports:
+
+    def test_retry(self):
+        statuses = [503, 200]
+        transport = httpx.MockTransport(lambda request: httpx.Response(statuses.pop(0)))
+        client = httpx.AsyncClient(transport=RetryTransport(transport, retries=2))
+        with patch('asyncio.sleep', new_callable=AsyncMock) as sleep:
+            assert aio.run(client.get('https://example.com')).status_code == 200
+        assert sleep.call_count == 1
+
+    def test_cache(self, tmp_path):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json={'n': len(calls)})
+
+        transport = CacheTransport(httpx.MockTransport(handler), DiskCache(tmp_path, 2**20), {'/catalog': 60})
+        client = httpx.AsyncClient(base_url='https://example.com', transport=transport)
+        assert aio.run(client.get('/catalog')).json() == {'n': 1}
+        assert aio.run(client.get('/catalog')).json() == {'n': 1}
+        assert len(calls) == 1
+
+
+class TestGetAgents:
+
+    def test_concurrent_lookup(self):
+        async def handler(request):
+            names = request.url.params['computerName__contains'].split(',')
+            data = [{'id': name, 'computerName': name} for name in names if name != 'missing']
+            return httpx.Response(200, json={'data': data, 'pagination': {}})
+
+        config = {'name': 's1', 'remote': 'https://example.com', 'http': {'cache': False}}
+        async_client = AsyncSentinelOneClient(build_async_client(config, transport=httpx.MockTransport(handler)))
+        client = SentinelOneClient(None, async_client)
+        agents = client.get_agents(['a', 'missing', 'b'])
+        assert [a and a['id'] for a in agents] == ['a', None, 'b']
@@ -0,0 +1,47 @@
+import os
+from sextant.cache import DiskCache
+
+
+class TestDiskCache:
+
+    def test_get_put(self, tmp_path):
+        cache = DiskCache(tmp_path, 1024)
+        assert cache.get('a') is None
+        cache.put('a', b'value')
+        assert cache.get('a') == b'value'
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = DiskCache(tmp_path, 350)
+        for i, key in enumerate('abc'):
+            cache.put(key, b'x' * 100)
+            os.utime(cache.path(key), (i, i))
+        cache.get('a')
+        cache.put('d', b'x' * 100)
+        assert cache.get('b') is None
+        assert cache.get('a') and cache.get('c') and cache.get('d')
+
+    def test_writer_stores_on_success(self, tmp_path):
+        cache = DiskCache(tmp_path, 1024)
+        with cache.writer('a') as f:
+            f.write(b'streamed')
+        with cache.open('a') as f:
+            assert f.read() == b'streamed'
+
+    def test_writer_discards_on_error(self, tmp_path):
+        cache = DiskCache(tmp_path, 1024)
+        try:
+            with cache.writer('a') as f:
+                f.write(b'partial')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        assert cache.open('a') is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_private(self, tmp_path):
+        cache = DiskCache(tmp_path / 'a' / 'b', 1024)
+        cache.put('a', b'value')
+        with cache.writer('b') as f:
+            f.write(b'streamed')
+        assert [path.stat().st_mode & 0o777 for path in (tmp_path / 'a', cache.directory)] == [0o700, 0o700]
+        assert {path.stat().st_mode & 0o777 for path in cache.directory.iterdir()} == {0o600}
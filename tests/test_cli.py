@@ -0,0 +1,66 @@
+import json
+import subprocess
+import threading
+import time
+import httpx
+import pytest
+from click.testing import CliRunner
+from unittest.mock import patch
+from sextant.cli import cli
+from sextant.config import SextantConfig
+
+ENDPOINT = """
+  - name: hive-{n}
+    client: thehive
+    remote: https://hive-{n}.example.com
+    credentials:
+      provider: 1password
+      vault: Security
+      item: TheHive {n}
+      fields:
+        username: user
+        password: pass
+"""
+
+
+@pytest.fixture
+def config(tmp_path):
+    path = tmp_path / 'config.yaml'
+    path.write_text('endpoints:' + ''.join(ENDPOINT.format(n=n) for n in range(3)))
+    return SextantConfig(path, cache=None)
+
+
+def fake_op(args, env, **kwargs):
+    """Answer `op run` with the field of each requested reference."""
+    values = [env[name].rsplit('/', 1)[-1] for name in args[7:]]
+    return subprocess.CompletedProcess(args, 0, stdout=json.dumps(values).encode())
+
+
+class TestCheck:
+
+    def test_single_op_call(self, config):
+        with patch('subprocess.run', side_effect=fake_op) as run, \
+                patch('sextant.clients.thehive.client.TheHiveClient.check', return_value='user (admin)'):
+            result = CliRunner().invoke(cli, ['check'], obj={'config': config})
+        assert result.exit_code == 0
+        assert result.output.count('user (admin)') == 3
+        assert run.call_count == 1
+
+    def test_deadline(self, config):
+        released = threading.Event()
+
+        def handle_request(transport, request):
+            if request.url.host == 'hive-1.example.com':
+                released.wait()
+            return httpx.Response(200, json={'login': 'user'})
+
+        start = time.monotonic()
+        try:
+            with patch('subprocess.run', side_effect=fake_op), \
+                    patch('httpx.HTTPTransport.handle_request', handle_request):
+                result = CliRunner().invoke(cli, ['check', '--timeout', '0.2'], obj={'config': config})
+        finally:
+            released.set()
+        assert time.monotonic() - start < 2
+        assert result.output.count('user (unknown)') == 2
+        assert result.output.count('timeout') == 1
@@ -0,0 +1,28 @@
+import pytest
+from sextant import codec
+
+
+class TestCodec:
+
+    def test_roundtrip(self):
+        record = {'host': 'web-01', 'severity': 7, 'tags': ['a', 'b'], 'nested': {'ok': True}}
+        data = codec.dumps(record)
+        assert isinstance(data, bytes)
+        assert codec.loads(data) == record
+
+    def test_loads_str(self):
+        assert codec.loads('{"a": [1, 2]}') == {'a': [1, 2]}
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            codec.loads(b'{"a":')
+
+
+class TestIterLines:
+
+    def test_split_chunks(self):
+        chunks = [b'{"a":1}\n{"b"', b':2}\r\n', b'\n{"c":3}']
+        assert list(codec.iter_lines(chunks)) == [b'{"a":1}', b'{"b":2}', b'', b'{"c":3}']
+
+    def test_trailing_newline(self):
+        assert list(codec.iter_lines([b'x\n'])) == [b'x']
@@ -0,0 +1,201 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import patch
+from sextant.config import SextantConfig
+
+
+CONFIG = """
+endpoints:
+  - name: splunk
+    client: splunk
+    remote: https://splunk.example.com
+    credentials:
+      provider: 1password
+      vault: Security
+      item: Splunk
+      cache: 1h
+      fields:
+        secret: api-token
+  - name: hive
+    client: thehive
+    remote: https://hive.example.com
+    credentials:
+      provider: 1password
+      vault: Security
+      item: TheHive
+      fields:
+        username: user
+        password: pass
+  - name: gitlab
+    client: gitlab
+    remote: https://gitlab.example.com
+    credentials:
+      secret: inline
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / 'config.yaml'
+    path.write_text(CONFIG)
+    return path
+
+
+class FakeKeyring(dict):
+    """In-memory stand-in for the keyring module."""
+
+    class errors:
+        class KeyringError(Exception):
+            pass
+
+        class PasswordDeleteError(KeyringError):
+            pass
+
+    def get_password(self, service, name):
+        return self.get((service, name))
+
+    def set_password(self, service, name, value):
+        self[(service, name)] = value
+
+    def delete_password(self, service, name):
+        if self.pop((service, name), None) is None:
+            raise self.errors.PasswordDeleteError(name)
+
+
+@pytest.fixture
+def keyring(monkeypatch):
+    store = FakeKeyring()
+    monkeypatch.setitem(sys.modules, 'keyring', store)
+    return store
+
+
+def fake_op(args, env, **kwargs):
+    """Answer `op run` with the reference of each requested variable."""
+    values = [env[name].rsplit('/', 1)[-1].upper() for name in args[7:]]
+    return subprocess.CompletedProcess(args, 0, stdout=json.dumps(values).encode())
+
+
+class TestReveal:
+
+    def test_inline_credentials(self, config_file, keyring):
+        with patch('subprocess.run') as run:
+            endpoint = SextantConfig(config_file, cache=None).reveal('gitlab')
+        assert endpoint['credentials'] == {'secret': 'inline'}
+        run.assert_not_called()
+
+    def test_single_op_call_for_all_fields(self, config_file, keyring):
+        with patch('subprocess.run', side_effect=fake_op) as run:
+            endpoints = SextantConfig(config_file, cache=None).reveal_many()
+        assert run.call_count == 1
+        assert endpoints[0]['credentials'] == {'secret': 'API-TOKEN'}
+        assert endpoints[1]['credentials'] == {'username': 'USER', 'password': 'PASS'}
+
+    def test_unknown_endpoint(self, config_file, keyring):
+        from sextant import SextantConfigurationError
+        with pytest.raises(SextantConfigurationError, match='not found'):
+            SextantConfig(config_file, cache=None).reveal('nope')
+
+
+class TestSecretCache:
+
+    def test_cached_within_ttl(self, config_file, keyring):
+        with patch('subprocess.run', side_effect=fake_op):
+            SextantConfig(config_file, cache=None).reveal('splunk')
+        with patch('subprocess.run') as run:
+            endpoint = SextantConfig(config_file, cache=None).reveal('splunk')
+        run.assert_not_called()
+        assert endpoint['credentials'] == {'secret': 'API-TOKEN'}
+
+    def test_not_cached_without_ttl(self, config_file, keyring):
+        with patch('subprocess.run', side_effect=fake_op):
+            SextantConfig(config_file, cache=None).reveal('hive')
+        assert not keyring
+
+    def test_keyring_not_read_without_ttl(self, config_file, keyring):
+        with patch('subprocess.run', side_effect=fake_op), patch.object(keyring, 'get_password') as get:
+            SextantConfig(config_file, cache=None).reveal('hive')
+        get.assert_not_called()
+
+    def test_keyring_errors(self, config_file, keyring):
+        def fail(*args):
+            raise keyring.errors.KeyringError('No recommended backend')
+
+        with patch.object(keyring, 'get_password', fail), patch.object(keyring, 'set_password', fail), \
+                patch('subprocess.run', side_effect=fake_op) as run:
+            endpoint = SextantConfig(config_file, cache=None).reveal('splunk')
+        assert run.call_count == 1
+        assert endpoint['credentials'] == {'secret': 'API-TOKEN'}
+
+    def test_expired(self, config_file, keyring):
+        with patch('subprocess.run', side_effect=fake_op):
+            SextantConfig(config_file, cache=None).reveal('splunk')
+        with patch('time.time', return_value=2**40), patch('subprocess.run', side_effect=fake_op) as run:
+            SextantConfig(config_file, cache=None).reveal('splunk')
+        assert run.call_count == 1
+
+    def test_revealed_secrets_expire(self, config_file, keyring):
+        config = SextantConfig(config_file, cache=None)
+        with patch('subprocess.run', side_effect=fake_op):
+            config.reveal_many(['splunk', 'hive'])
+        assert config.expire() == set()
+        with patch('time.time', return_value=2**40):
+            assert config.expire() == {'splunk'}
+        keyring.clear()
+        with patch('subprocess.run', side_effect=fake_op) as run:
+            config.reveal_many(['splunk', 'hive'])
+        assert run.call_count == 1
+
+    def test_flush_revealed(self, config_file, keyring):
+        config = SextantConfig(config_file, cache=None)
+        with patch('subprocess.run', side_effect=fake_op):
+            config.reveal('hive')
+        assert config.flush(['hive']) == ['hive']
+        assert config.expire() == {'hive'}
+        with patch('subprocess.run', side_effect=fake_op) as run:
+            config.reveal('hive')
+        assert run.call_count == 1
+
+    def test_flush(self, config_file, keyring):
+        with patch('subprocess.run', side_effect=fake_op):
+            SextantConfig(config_file, cache=None).reveal('splunk')
+        assert SextantConfig(config_file, cache=None).flush() == ['splunk']
+        assert not keyring
+
+
+class TestConfigCache:
+
+    def test_cached_parsing(self, tmp_path, config_file):
+        cache = tmp_path / 'cache' / 'config.pickle'
+        SextantConfig(config_file, cache=cache)
+        with patch('yaml.load') as load:
+            config = SextantConfig(config_file, cache=cache)
+        load.assert_not_called()
+        assert list(config.index) == ['splunk', 'hive', 'gitlab']
+
+    def test_modified_file(self, tmp_path, config_file):
+        cache = tmp_path / 'config.pickle'
+        SextantConfig(config_file, cache=cache)
+        config_file.write_text(CONFIG.replace('name: gitlab', 'name: gitlab-prod'))
+        config = SextantConfig(config_file, cache=cache)
+        assert 'gitlab-prod' in config.index
+
+    def test_touched_file(self, tmp_path, config_file):
+        cache = tmp_path / 'config.pickle'
+        SextantConfig(config_file, cache=cache)
+        os.utime(config_file, ns=(0, 0))
+        with patch('yaml.load') as load:
+            SextantConfig(config_file, cache=cache)
+        load.assert_not_called()
+
+    def test_missing_file(self, tmp_path):
+        from sextant import SextantConfigurationError
+        with pytest.raises(SextantConfigurationError, match='not found'):
+            SextantConfig(tmp_path / 'nope.yaml', cache=None)
+
+    def test_reveal_returns_copies(self, config_file):
+        config = SextantConfig(config_file, cache=None)
+        config.reveal('gitlab')['credentials']['secret'] = 'changed'
+        assert config.reveal('gitlab')['credentials'] == {'secret': 'inline'}
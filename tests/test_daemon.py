@@ -0,0 +1,129 @@
+import io
+import socket
+import sys
+import threading
+import click
+import pytest
+from unittest.mock import patch
+from sextant.daemon import Daemon, session
+
+
+class Stream(io.BytesIO):
+
+    def __init__(self, data=b'', tty=False):
+        super().__init__(data)
+        self.tty = tty
+
+    def isatty(self):
+        return self.tty
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.argument('value')
+@click.pass_obj
+def echo(obj, value):
+    if value == '-':
+        value = sys.stdin.read().strip()
+    click.echo(f"{value} tty={sys.stdout.isatty()}")
+    click.echo('to stderr', err=True)
+    obj['clients'].setdefault('seen', []).append(value)
+
+
+@cli.command()
+def count():
+    size = 0
+    for line in sys.stdin.buffer:
+        size += len(line)
+    click.echo(size)
+
+
+@cli.command()
+def fail():
+    raise click.ClickException('boom')
+
+
+class Config:
+    """Configuration without endpoints whose secrets expire on demand."""
+
+    endpoints = []
+
+    def __init__(self):
+        self.forgotten = set()
+
+    def expire(self):
+        forgotten, self.forgotten = self.forgotten, set()
+        return forgotten
+
+
+class Client:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    config = tmp_path / 'config.yaml'
+    config.write_text('endpoints: []\n')
+    daemon = Daemon(Config)
+    daemon.file = config
+    return daemon
+
+
+def run(daemon, argv, stdin=b'', tty=False):
+    """Run a command through the daemon over a socket pair."""
+    server, client = socket.socketpair()
+    thread = threading.Thread(target=daemon.handle, args=(server, cli, daemon.file))
+    thread.start()
+    stdout, stderr = Stream(tty=tty), Stream()
+    code = session(client, argv, Stream(stdin), stdout, stderr)
+    thread.join()
+    server.close()
+    client.close()
+    return code, stdout.getvalue().decode(), stderr.getvalue().decode()
+
+
+class TestDaemon:
+
+    def test_output_and_exit_code(self, daemon):
+        assert run(daemon, ['echo', 'hello']) == (0, 'hello tty=False\n', 'to stderr\n')
+
+    def test_tty(self, daemon):
+        _, stdout, _ = run(daemon, ['echo', 'hello'], tty=True)
+        assert stdout == 'hello tty=True\n'
+
+    def test_stdin_on_demand(self, daemon):
+        _, stdout, _ = run(daemon, ['echo', '-'], stdin=b'piped\n')
+        assert stdout.startswith('piped')
+
+    def test_stdin_streamed_in_chunks(self, daemon):
+        data = b'x' * 99 + b'\n'
+        with patch('sextant.daemon.STDIN_CHUNK', 1000):
+            _, stdout, _ = run(daemon, ['count'], stdin=data * 100)
+        assert stdout == '10000\n'
+
+    def test_error(self, daemon):
+        code, _, stderr = run(daemon, ['fail'])
+        assert code == 1
+        assert 'boom' in stderr
+
+    def test_clients_kept(self, daemon):
+        run(daemon, ['echo', 'a'])
+        run(daemon, ['echo', 'b'])
+        assert daemon.clients['seen'] == ['a', 'b']
+
+    def test_forgotten_secrets_drop_clients(self, daemon):
+        run(daemon, ['echo', 'a'])
+        client = Client()
+        daemon.clients['ep'] = type('Lazy', (), {'_instance': client})()
+        daemon.config.forgotten.add('ep')
+        run(daemon, ['echo', 'b'])
+        assert 'ep' not in daemon.clients and client.closed
@@ -0,0 +1,63 @@
+import csv
+import json
+import pytest
+from sextant.export import CsvFile, ParquetFile, ZstdNdjsonFile, guess_format
+
+
+def read_csv(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+class TestCsvFile:
+
+    def test_columns_of_first_record(self, tmp_path):
+        with CsvFile(tmp_path / 'out.csv') as f:
+            f.write({'a': '1', 'b': ['x', 'y']})
+            f.write({'b': '2'})
+        assert read_csv(tmp_path / 'out.csv') == [['a', 'b'], ['1', 'x\ny'], ['', '2']]
+
+    def test_new_fields_extend_columns(self, tmp_path):
+        with CsvFile(tmp_path / 'out.csv', rows=2) as f:
+            for i in range(3):
+                f.write({'a': str(i)})
+            f.write({'a': '3', 'c': 'new'})
+        assert read_csv(tmp_path / 'out.csv') == [['a', 'c'], ['0', ''], ['1', ''], ['2', ''], ['3', 'new']]
+        assert [p.name for p in tmp_path.iterdir()] == ['out.csv']
+
+    def test_empty(self, tmp_path):
+        with CsvFile(tmp_path / 'out.csv'):
+            pass
+        assert read_csv(tmp_path / 'out.csv') == [[]]
+
+
+class TestOptionalFormats:
+
+    def test_guess_format(self):
+        assert guess_format('day.ndjson.zst') == 'ndjson.zst'
+        assert guess_format('day.parquet') == 'parquet'
+        assert guess_format('day.json') is None
+
+    def test_parquet(self, tmp_path):
+        pq = pytest.importorskip('pyarrow.parquet')
+        with ParquetFile(tmp_path / 'out.parquet', rows=1) as f:
+            f.write({'a': '1'})
+            f.write({'a': '2', 'b': 'x'})
+        assert pq.read_table(tmp_path / 'out.parquet').to_pylist() == [{'a': '1', 'b': None}, {'a': '2', 'b': 'x'}]
+
+    def test_zstd(self, tmp_path):
+        zstandard = pytest.importorskip('zstandard')
+        with ZstdNdjsonFile(tmp_path / 'out.ndjson.zst', batch=2) as f:
+            for i in range(3):
+                f.write({'a': i})
+        with zstandard.open(tmp_path / 'out.ndjson.zst') as f:
+            assert [json.loads(line) for line in f] == [{'a': 0}, {'a': 1}, {'a': 2}]
+
+    def test_missing_library(self, tmp_path):
+        try:
+            import zstandard  # noqa: F401
+            pytest.skip('zstandard installed')
+        except ImportError:
+            pass
+        with pytest.raises(ImportError, match=r'sextant\[zstd\]'):
+            ZstdNdjsonFile(tmp_path / 'out.ndjson.zst')
@@ -0,0 +1,161 @@
+import httpx
+import pytest
+from unittest.mock import patch
+from sextant import http
+from sextant.cache import DiskCache
+from sextant.http import CacheTransport, RetryTransport, build_client, retry_after
+
+
+def sequence(*statuses, headers=None):
+    """Return a mock transport answering with the given statuses in turn."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(statuses[len(calls) - 1], headers=headers or {})
+
+    return httpx.MockTransport(handler), calls
+
+
+class TestRetryTransport:
+
+    def test_retry_until_success(self):
+        transport, calls = sequence(503, 429, 200)
+        client = httpx.Client(transport=RetryTransport(transport, retries=3))
+        with patch('time.sleep') as sleep:
+            assert client.get('https://example.com').status_code == 200
+        assert len(calls) == 3
+        assert sleep.call_count == 2
+
+    def test_gives_up(self):
+        transport, calls = sequence(503, 503)
+        client = httpx.Client(transport=RetryTransport(transport, retries=1))
+        with patch('time.sleep'):
+            assert client.get('https://example.com').status_code == 503
+        assert len(calls) == 2
+
+    def test_no_retry_on_client_error(self):
+        transport, calls = sequence(404)
+        client = httpx.Client(transport=RetryTransport(transport))
+        assert client.get('https://example.com').status_code == 404
+        assert len(calls) == 1
+
+    def test_honors_retry_after(self):
+        transport, _ = sequence(429, 200, headers={'Retry-After': '7'})
+        client = httpx.Client(transport=RetryTransport(transport, backoff=1))
+        with patch('time.sleep') as sleep:
+            client.get('https://example.com')
+        sleep.assert_called_once_with(7.0)
+
+    def test_clamps_retry_after(self):
+        transport, _ = sequence(429, 200, headers={'Retry-After': '86400'})
+        client = httpx.Client(transport=RetryTransport(transport, max_backoff=60))
+        with patch('time.sleep') as sleep:
+            client.get('https://example.com')
+        sleep.assert_called_once_with(60)
+
+    def test_no_retry_of_unsafe_methods(self):
+        transport, calls = sequence(502, 503, 200)
+        client = httpx.Client(transport=RetryTransport(transport))
+        assert client.post('https://example.com').status_code == 502
+        assert client.post('https://example.com').status_code == 503
+        assert len(calls) == 2
+
+    def test_unsafe_methods_retried_when_throttled(self):
+        transport, calls = sequence(503, 200, headers={'Retry-After': '1'})
+        client = httpx.Client(transport=RetryTransport(transport))
+        with patch('time.sleep'):
+            assert client.post('https://example.com').status_code == 200
+        assert len(calls) == 2
+
+    def test_replays_body(self):
+        transport, calls = sequence(429, 200)
+        client = httpx.Client(transport=RetryTransport(transport))
+        with patch('time.sleep'):
+            client.post('https://example.com', json={'a': 1})
+        assert [c.read() for c in calls] == [b'{"a":1}', b'{"a":1}']
+
+
+class TestRetryAfter:
+
+    def test_seconds(self):
+        assert retry_after(httpx.Response(429, headers={'Retry-After': '3'})) == 3
+
+    def test_date_in_the_past(self):
+        response = httpx.Response(429, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        assert retry_after(response) == 0
+
+    def test_missing_or_invalid(self):
+        assert retry_after(httpx.Response(429)) is None
+        assert retry_after(httpx.Response(429, headers={'Retry-After': 'soon'})) is None
+
+
+class TestBuildClient:
+
+    def test_settings(self):
+        config = {'name': 'x', 'remote': 'https://example.com', 'http': {'read_timeout': 12}}
+        client = build_client(config, defaults={'read_timeout': 120, 'connect_timeout': 2})
+        assert client.timeout.read == 12
+        assert client.timeout.connect == 2
+        assert client.base_url == 'https://example.com'
+
+    def test_transport(self):
+        config = {'name': 'x', 'remote': 'https://example.com', 'http': {'cache': False}}
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, text=request.url.path))
+        client = build_client(config, transport=transport)
+        assert client.get('/ping').text == '/ping'
+
+
+class TestCacheTransport:
+
+    @pytest.fixture
+    def backend(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if request.headers.get('If-None-Match') == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, json={'n': len(calls)}, headers={'ETag': '"v1"'})
+
+        return httpx.MockTransport(handler), calls
+
+    @pytest.fixture
+    def client(self, tmp_path, backend):
+        transport = CacheTransport(backend[0], DiskCache(tmp_path, 2**20), {'/catalog': 60})
+        yield httpx.Client(base_url='https://example.com', transport=transport)
+        http.OPTIONS['cache'] = 'on'
+
+    def test_fresh_hit(self, client, backend):
+        assert client.get('/catalog').json() == {'n': 1}
+        assert client.get('/catalog').json() == {'n': 1}
+        assert len(backend[1]) == 1
+
+    def test_other_paths_not_cached(self, client, backend):
+        client.get('/other')
+        client.get('/other')
+        client.post('/catalog')
+        assert len(backend[1]) == 3
+
+    def test_query_in_key(self, client, backend):
+        client.get('/catalog', params={'page': 1})
+        client.get('/catalog', params={'page': 2})
+        assert len(backend[1]) == 2
+
+    def test_revalidation(self, client, backend):
+        client.get('/catalog')
+        with patch('time.time', return_value=2**40):
+            assert client.get('/catalog').json() == {'n': 1}
+        assert backend[1][-1].headers['If-None-Match'] == '"v1"'
+
+    def test_no_cache(self, client, backend):
+        client.get('/catalog')
+        http.OPTIONS['cache'] = 'off'
+        assert client.get('/catalog').json() == {'n': 2}
+
+    def test_refresh(self, client, backend):
+        client.get('/catalog')
+        http.OPTIONS['cache'] = 'refresh'
+        assert client.get('/catalog').json() == {'n': 2}
+        http.OPTIONS['cache'] = 'on'
+        assert client.get('/catalog').json() == {'n': 2}
@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timezone
+from sextant import aio
+from sextant.hunt import classify, hunt, matched
+
+
+class FakeClient:
+
+    def __init__(self, hits, delay=0, error=None):
+        self.hits = hits
+        self.delay = delay
+        self.error = error
+
+    async def hunt(self, indicators, since, limit):
+        await asyncio.sleep(self.delay)
+        for hit in self.hits[:limit]:
+            yield hit
+        if self.error:
+            raise self.error
+
+
+def collect(clients, limit=100):
+    async def run():
+        return [item async for item in hunt(clients, [('host', 'web01')], datetime.now(timezone.utc), limit)]
+    return aio.run(run())
+
+
+class TestClassify:
+
+    def test_hashes(self):
+        assert classify('44d88612fea8a8f36de82e1278abb02f') == 'md5'
+        assert classify('3395856ce81f2b7382dee72602f798b642f14140') == 'sha1'
+        assert classify('a' * 64) == 'sha256'
+
+    def test_ip(self):
+        assert classify('10.0.0.12') == 'ip'
+        assert classify('fe80::1') == 'ip'
+
+    def test_host(self):
+        assert classify('web01.corp.example.com') == 'host'
+        assert classify('deadbeef') == 'host'
+
+
+class TestMatched:
+
+    def test_case_insensitive(self):
+        indicators = [('ip', '10.0.0.1'), ('host', 'WEB01')]
+        assert matched(indicators, {'host': 'web01.corp'}) == 'WEB01'
+        assert matched(indicators, {'host': 'db01'}) == ''
+
+
+class TestHunt:
+
+    def test_streams_as_endpoints_answer(self):
+        clients = {
+            'slow': FakeClient([{'n': 1}], delay=0.05),
+            'fast': FakeClient([{'n': 2}, {'n': 3}]),
+        }
+        assert collect(clients) == [('fast', {'n': 2}), ('fast', {'n': 3}), ('slow', {'n': 1})]
+
+    def test_failure_does_not_stop_others(self):
+        error = RuntimeError('boom')
+        clients = {'bad': FakeClient([{'n': 1}], error=error), 'good': FakeClient([{'n': 2}], delay=0.01)}
+        assert collect(clients) == [('bad', {'n': 1}), ('bad', error), ('good', {'n': 2})]
+
+    def test_limit(self):
+        assert len(collect({'a': FakeClient([{'n': i} for i in range(10)])}, limit=3)) == 3
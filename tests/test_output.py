@@ -0,0 +1,78 @@
+import json
+import click
+import time
+from click.testing import CliRunner
+from rich.console import Console
+from sextant.output import LiveTail, NdjsonWriter, format_option, write_records
+
+
+class TestNdjsonWriter:
+
+    def test_batches(self, capsys):
+        with NdjsonWriter(batch=2, interval=60) as writer:
+            writer.write({'a': 1})
+            assert capsys.readouterr().out == ''
+            writer.write({'a': 2})
+            assert capsys.readouterr().out.splitlines() == ['{"a":1}', '{"a":2}']
+            writer.write({'a': 3})
+        assert capsys.readouterr().out == '{"a":3}\n'
+
+    def test_size(self, capsys):
+        writer = NdjsonWriter(batch=100, size=10, interval=60)
+        writer.write({'key': 'long enough'})
+        assert capsys.readouterr().out == '{"key":"long enough"}\n'
+
+
+    def test_idle_flush(self, capsys):
+        with NdjsonWriter(interval=0.05) as writer:
+            writer.write({'a': 1})
+            time.sleep(0.2)
+            assert capsys.readouterr().out == '{"a":1}\n'
+
+
+class TestWriteRecords:
+
+    def test_json(self, capsys):
+        write_records(iter([{'a': 1}, {'a': 2}]), 'json')
+        assert json.loads(capsys.readouterr().out) == [{'a': 1}, {'a': 2}]
+
+    def test_json_batches(self, capsys):
+        for n in (0, 2, 5):
+            write_records(({'a': i} for i in range(n)), 'json', batch=2)
+            assert json.loads(capsys.readouterr().out) == [{'a': i} for i in range(n)]
+
+    def test_ndjson(self, capsys):
+        write_records(({'a': i} for i in range(3)), 'ndjson')
+        assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == [{'a': 0}, {'a': 1}, {'a': 2}]
+
+
+class TestFormatOption:
+
+    @staticmethod
+    def command(**kwargs):
+        @click.command()
+        @format_option(**kwargs)
+        def show(fmt):
+            click.echo(fmt)
+        return show
+
+    def test_piped_default(self):
+        assert CliRunner().invoke(self.command()).output == 'json\n'
+        assert CliRunner().invoke(self.command(piped='ndjson')).output == 'ndjson\n'
+
+    def test_explicit(self):
+        assert CliRunner().invoke(self.command(), ['--format', 'table']).output == 'table\n'
+
+
+class TestLiveTail:
+
+    def test_keeps_last_rows(self):
+        view = LiveTail(['n'], size=3)
+        for i in range(1000):
+            view.add([str(i)], size=10)
+        assert [row[0] for row in view.rows] == ['997', '998', '999']
+        console = Console(width=80, record=True)
+        console.print(view)
+        text = console.export_text()
+        assert '996' not in text and '999' in text
+        assert '1000 rows' in text and '10.0 kB' in text
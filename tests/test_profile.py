@@ -0,0 +1,45 @@
+import httpx
+from sextant.profile import Profiler, path_template, percentile
+
+
+class TestPathTemplate:
+
+    def test_identifiers(self):
+        assert path_template('/web/api/v2.1/agents/123456/uploads/789') == '/web/api/v2.1/agents/{id}/uploads/{id}'
+
+    def test_versions_kept(self):
+        assert path_template('/api/v4/projects') == '/api/v4/projects'
+
+    def test_hex_identifiers(self):
+        assert path_template('/services/search/v2/jobs/1700000000.42/results') == '/services/search/v2/jobs/{id}/results'
+
+
+class TestPercentile:
+
+    def test_median(self):
+        assert percentile([3, 1, 2], 50) == 2
+
+    def test_high(self):
+        assert percentile(list(range(1, 101)), 95) == 95
+
+    def test_single(self):
+        assert percentile([7], 95) == 7
+
+
+class TestProfiler:
+
+    def test_records_requests(self):
+        profiler = Profiler()
+        client = httpx.Client(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, content=iter([b'x' * 10]))),
+            event_hooks={
+                'request': [profiler.on_request],
+                'response': [lambda response: profiler.on_response('s1', response)],
+            },
+        )
+        client.get('https://example.com/api/v1/items/42')
+        [record] = profiler.records
+        assert record['endpoint'] == 's1'
+        assert record['template'] == '/api/v1/items/{id}'
+        assert record['bytes_in'] == 10
+        assert record['total'] >= record['ttfb'] >= 0
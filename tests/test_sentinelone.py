@@ -0,0 +1,141 @@
+import httpx
+import pytest
+from sextant.clients.sentinelone.client import (
+    AgentIndex, AsyncSentinelOneClient, Inventory, SentinelOneClient,
+)
+from sextant.clients.sentinelone.commands import lookup_agents, online_agents, resolve_agents
+from sextant.http import build_async_client, build_client
+
+
+class FakeAgents:
+    """Agents endpoint of `total` agents paginated with offset cursors."""
+
+    def __init__(self, total):
+        self.total = total
+        self.requests = []
+
+    def handler(self, request):
+        params = request.url.params
+        self.requests.append(dict(params))
+        offset = int(params.get('cursor', 0))
+        agents = [{'id': str(i), 'computerName': f'host-{i}', 'isActive': True} for i in range(self.total)]
+        if 'computerName__contains' in params:
+            parts = params['computerName__contains'].lower().split(',')
+            agents = [a for a in agents if any(p in a['computerName'] for p in parts)]
+        end = min(offset + int(params['limit']), len(agents))
+        data = agents[offset:end]
+        return httpx.Response(200, json={'data': data, 'pagination': {
+            'totalItems': len(agents), 'nextCursor': str(end) if end < len(agents) else None,
+        }})
+
+    def client(self, inventory=None):
+        config = {'name': 's1', 'remote': 'https://s1', 'http': {'cache': False}}
+        transport = httpx.MockTransport(self.handler)
+        return SentinelOneClient(
+            build_client(config, transport=transport),
+            AsyncSentinelOneClient(build_async_client(config, transport=transport)),
+            inventory,
+        )
+
+
+class TestPaginate:
+
+    def test_follows_cursors(self):
+        s1 = FakeAgents(2500)
+        pages = []
+        agents = list(s1.client().iter_agents(on_page=pages.append, active=True))
+        assert [a['id'] for a in agents] == [str(i) for i in range(2500)]
+        assert [r.get('cursor') for r in s1.requests] == [None, '1000', '2000']
+        assert all(r['limit'] == '1000' and r['isActive'] == 'true' for r in s1.requests)
+        assert pages[0]['totalItems'] == 2500
+
+    def test_limit_stops_early(self):
+        s1 = FakeAgents(2500)
+        assert len(list(s1.client().iter_agents(limit=1200))) == 1200
+        assert [r['limit'] for r in s1.requests] == ['1000', '200']
+        assert len(list(s1.client().iter_agents(limit=10))) == 10
+        assert s1.requests[-1]['limit'] == '10'
+
+    def test_resolve_all_agents(self):
+        assert len(resolve_agents(FakeAgents(1500).client(), target_all=True)) == 1500
+
+
+class TestAgentLookup:
+
+    def test_index_matching(self):
+        index = AgentIndex([{'computerName': 'web-10'}, {'computerName': 'Web-1'}, {'computerName': 'db'}])
+        assert index.find('Web-1')['computerName'] == 'Web-1'
+        assert index.find('WEB-10')['computerName'] == 'web-10'
+        assert index.find('eb-1')['computerName'] == 'web-10'
+        assert index.find('mail') is None
+        assert index.find('eb-1', partial=False) is None
+
+    def test_batched_search(self):
+        s1 = FakeAgents(500)
+        names = [f'HOST-{i}' for i in range(0, 500, 2)] + ['missing']
+        agents = s1.client().get_agents(names)
+        assert [a and a['id'] for a in agents] == [str(i) for i in range(0, 500, 2)] + [None]
+        # 251 names in batches of 100, each page holding every match of a batch
+        assert len(s1.requests) == 3
+
+    def test_sweep(self):
+        s1 = FakeAgents(2500)
+        client = s1.client()
+        client.SWEEP_NAMES = 10
+        assert [a['id'] for a in client.get_agents([f'host-{i}' for i in range(20)])] == [str(i) for i in range(20)]
+        assert [r.get('cursor') for r in s1.requests] == [None, '1000', '2000']
+
+    def test_inventory_snapshot(self, tmp_path):
+        inventory = Inventory(tmp_path / 'agents.json', ttl=3600)
+        s1 = FakeAgents(50)
+        assert [a['id'] for a in lookup_agents(s1.client(inventory), ['host-1', 'host-2'])] == ['1', '2']
+        s1.total = 60
+        assert [a['id'] for a in lookup_agents(s1.client(inventory), ['host-3', 'host-55'])] == ['3', '55']
+        # one sweep for the snapshot, then a search of the hostname it misses
+        assert [r.get('computerName__contains') for r in s1.requests] == [None, 'host-55']
+        inventory.ttl = -1
+        assert inventory.load() is None
+
+    def test_snapshot_partial_match_searched(self, tmp_path):
+        inventory = Inventory(tmp_path / 'agents.json', ttl=3600)
+        inventory.save([{'id': '10', 'computerName': 'host-10'}])
+        s1 = FakeAgents(20)
+        assert [a['id'] for a in lookup_agents(s1.client(inventory), ['host-1'])] == ['1']
+        assert [r.get('computerName__contains') for r in s1.requests] == ['host-1']
+
+
+class Booting:
+    """Client whose agents come online one poll after another."""
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.polls = []
+
+    def get_agents(self, names):
+        self.polls.append(list(names))
+        poll = len(self.polls)
+        return [
+            None if name not in self.schedule
+            else {'id': name, 'isActive': self.schedule[name] <= poll}
+            for name in names
+        ]
+
+
+class TestOnlineAgents:
+
+    def test_yields_as_agents_come_online(self, monkeypatch):
+        monkeypatch.setattr('time.sleep', lambda s: None)
+        client = Booting({'a': 1, 'b': 3, 'c': 3})
+        batches = [[name for name, _ in online] for online in online_agents(client, ['a', 'b', 'c'])]
+        assert batches == [['a'], ['b', 'c']]
+        # one lookup of every pending agent per poll
+        assert client.polls == [['a', 'b', 'c'], ['b', 'c'], ['b', 'c']]
+
+    def test_timeout_names_missing_hosts(self, monkeypatch):
+        monkeypatch.setattr('time.sleep', lambda s: None)
+        client = Booting({'a': 1, 'b': 99})
+        online = []
+        with pytest.raises(TimeoutError, match='within 0s: b; never found: x'):
+            for batch in online_agents(client, ['a', 'b', 'x'], timeout=0):
+                online.extend(batch)
+        assert [name for name, _ in online] == ['a']
@@ -0,0 +1,349 @@
+import asyncio
+import gzip
+import httpx
+import time
+import pytest
+from datetime import datetime, timezone
+from click.testing import CliRunner
+from unittest.mock import AsyncMock
+from sextant.codec import dumps, loads
+from unittest.mock import patch
+from urllib.parse import parse_qs
+from sextant.cache import DiskCache
+from sextant.clients.splunk.commands import plan_export, query, run_search
+from sextant.clients.splunk.client import AsyncSplunkClient, SplunkClient, hec_batches, normalize_query, time_slices
+from sextant.http import build_async_client, build_client
+
+
+class FakeSplunk:
+    """Job status and results endpoints of a job with `total` results."""
+
+    def __init__(self, total, states=('DONE',)):
+        self.total = total
+        self.states = list(states)
+        self.pages = []
+        self.exports = []
+
+    def handler(self, request):
+        path = request.url.path
+        if path == '/services/search/jobs/sid1':
+            state = self.states.pop(0) if len(self.states) > 1 else self.states[0]
+            content = {'dispatchState': state, 'doneProgress': 0.5, 'resultCount': self.total,
+                       'messages': [{'type': 'FATAL', 'text': 'bad search'}]}
+            return httpx.Response(200, json={'entry': [{'content': content}]})
+        if path == '/services/search/v2/jobs/sid1/results':
+            offset, count = int(request.url.params['offset']), int(request.url.params['count'])
+            self.pages.append((offset, request.url.params.get_list('f')))
+            results = [{'n': i} for i in range(offset, min(offset + count, self.total))]
+            return httpx.Response(200, json={'results': results})
+        if path == '/services/search/jobs':
+            offset, count = int(request.url.params['offset']), int(request.url.params['count'])
+            self.pages.append((offset, count, request.url.params.get('search'), request.url.params.get_list('f')))
+            entries = [{'name': f'sid{i}'} for i in range(offset, min(offset + count, self.total))]
+            return httpx.Response(200, json={'entry': entries, 'paging': {'total': self.total}})
+        if path == '/services/search/jobs/export':
+            form = {k: v[0] for k, v in parse_qs(request.content.decode()).items()}
+            self.exports.append(form)
+            if form['output_mode'] == 'csv':
+                return httpx.Response(200, content=b'a,b\n1,2\na,b\n3,4\n')
+            if form['search'].startswith('| tstats'):
+                return httpx.Response(200, content=b'{"result":{"count":"%d"}}\n' % self.total)
+            # one event per second, newest first
+            lines = (b'{"result":{"_time":%d}}' % t
+                     for t in reversed(range(int(form['earliest_time']), int(form['latest_time']))))
+            return httpx.Response(200, content=b'\n'.join(lines) + b'\n')
+        return httpx.Response(404)
+
+    def client(self, results=None):
+        config = {'name': 'splunk', 'remote': 'https://splunk', 'http': {'cache': False}}
+        transport = httpx.MockTransport(self.handler)
+        return SplunkClient(
+            build_client(config, transport=transport),
+            AsyncSplunkClient(build_async_client(config, transport=transport)),
+            results,
+        )
+
+
+class TestJobResults:
+
+    def test_all_pages_in_order(self):
+        splunk = FakeSplunk(25)
+        results = splunk.client().get_job_results('sid1', count=10, prefetch=2, fields=['host'])
+        assert [r['n'] for r in results] == list(range(25))
+        assert sorted(splunk.pages) == [(0, ['host']), (10, ['host']), (20, ['host'])]
+
+    def test_waits_with_backoff(self):
+        splunk = FakeSplunk(1, states=('QUEUED', 'RUNNING', 'RUNNING', 'DONE'))
+        with patch('sextant.clients.splunk.client.sleep') as sleep:
+            assert list(splunk.client().get_job_results('sid1', wait=60)) == [{'n': 0}]
+        assert [c.args[0] for c in sleep.call_args_list] == [0.5, 1, 2]
+
+    def test_timeout(self):
+        splunk = FakeSplunk(1, states=('RUNNING',))
+        with patch('sextant.clients.splunk.client.sleep'), \
+                patch('sextant.clients.splunk.client.monotonic', side_effect=[0, 0, 100]):
+            with pytest.raises(TimeoutError):
+                splunk.client().get_job_results('sid1', wait=30)
+
+    def test_failed(self):
+        with pytest.raises(ValueError, match='bad search'):
+            FakeSplunk(0, states=('FAILED',)).client().get_job_results('sid1')
+
+
+class FakeSearches:
+    """Saved searches dispatching jobs done after a number of polls."""
+
+    def __init__(self, polls):
+        self.polls = polls
+        self.requests = []
+
+    def handler(self, request):
+        path = request.url.path
+        self.requests.append(path)
+        if path == '/services/saved/searches':
+            entries = [{'name': name, 'content': {'disabled': name == 'off'}} for name in ('slow', 'fast', 'off')]
+            return httpx.Response(200, json={'entry': entries, 'paging': {'total': 3}})
+        if path.endswith('/dispatch'):
+            name = path.split('/')[-2]
+            if name == 'broken':
+                return httpx.Response(404, text='no such search')
+            return httpx.Response(201, json={'sid': f'sid-{name}'})
+        if path.startswith('/services/search/jobs/'):
+            sid = path.split('/')[-1]
+            if sid not in self.polls:
+                return httpx.Response(404, text='unknown sid')
+            self.polls[sid] -= 1
+            state = 'DONE' if self.polls[sid] <= 0 else 'RUNNING'
+            content = {'dispatchState': state, 'resultCount': 1}
+            return httpx.Response(200, json={'entry': [{'content': content}]})
+        if path.endswith('/results'):
+            return httpx.Response(200, json={'results': [{'sid': path.split('/')[-2]}]})
+        return httpx.Response(404)
+
+    def client(self):
+        config = {'name': 'splunk', 'remote': 'https://splunk', 'http': {'cache': False}}
+        transport = httpx.MockTransport(self.handler)
+        return SplunkClient(
+            build_client(config, transport=transport),
+            AsyncSplunkClient(build_async_client(config, transport=transport)),
+        )
+
+
+class TestRunSearches:
+
+    def test_streams_jobs_as_they_finish(self):
+        splunk = FakeSearches({'sid-slow': 3, 'sid-fast': 1})
+        with patch('asyncio.sleep', new_callable=AsyncMock):
+            result = CliRunner().invoke(
+                run_search, ['--match', '*', '--wait', '60', '--format', 'ndjson', 'broken'],
+                obj={'client': splunk.client()},
+            )
+        assert result.exit_code == 0
+        assert [loads(line) for line in result.stdout.splitlines()] == [
+            {'search_name': 'fast', 'sid': 'sid-fast'},
+            {'search_name': 'slow', 'sid': 'sid-slow'},
+        ]
+        assert 'broken: no such search' in result.stderr
+        assert '/services/saved/searches/off/dispatch' not in splunk.requests
+
+    def test_reports_jobs_running_at_timeout(self):
+        splunk = FakeSearches({'sid-slow': 100, 'sid-fast': 1})
+        with patch('asyncio.sleep', new_callable=AsyncMock), \
+                patch('sextant.clients.splunk.client.monotonic', side_effect=[0, 0, 100]):
+            jobs = list(splunk.client().wait_for_jobs(['sid-slow', 'sid-fast'], 30))
+        assert [(sid, status['dispatchState']) for sid, status in jobs] == [
+            ('sid-fast', 'DONE'), ('sid-slow', 'RUNNING'),
+        ]
+
+
+    def test_failed_poll_does_not_stop_others(self):
+        splunk = FakeSearches({'sid-slow': 2, 'sid-fast': 1})
+        with patch('asyncio.sleep', new_callable=AsyncMock):
+            jobs = list(splunk.client().wait_for_jobs(['sid-slow', 'sid-expired', 'sid-fast'], 30))
+        assert [sid for sid, _ in jobs] == ['sid-expired', 'sid-fast', 'sid-slow']
+        assert isinstance(jobs[0][1], httpx.HTTPStatusError)
+        assert splunk.requests.count('/services/search/jobs/sid-expired') == 1
+
+
+class TestHunt:
+
+    def test_skips_blank_lines(self):
+        body = b'{"result":{"_time":"1","host":"web1","_raw":"x","index":"main","sourcetype":"s"}}\n\n' \
+               b'{"preview":false}\n'
+        config = {'name': 'splunk', 'remote': 'https://splunk', 'http': {'cache': False}}
+        client = AsyncSplunkClient(build_async_client(
+            config, transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body))))
+
+        async def collect():
+            return [hit async for hit in client.hunt([('host', 'web1')], datetime.now(timezone.utc))]
+
+        assert [hit['host'] for hit in asyncio.run(collect())] == ['web1']
+
+
+class TestListEntries:
+
+    def test_pages_with_projection(self):
+        splunk = FakeSplunk(5)
+        entries, total = splunk.client().list_jobs(user='bob', name='daily', fields=['dispatchState'])
+        assert total == 5 and len(entries) == 5
+        assert splunk.pages == [(0, 1000, 'eai:acl.owner=bob label="*daily*"', ['dispatchState'])]
+
+    def test_count_and_offset(self):
+        splunk = FakeSplunk(10)
+        client = splunk.client()
+        entries, total = client.list_entries('/services/search/jobs', offset=2, count=5, page=2)
+        assert [e['name'] for e in entries] == ['sid2', 'sid3', 'sid4', 'sid5', 'sid6']
+        assert [(offset, count) for offset, count, *_ in splunk.pages] == [(2, 2), (4, 2), (6, 1)]
+
+
+class TestExport:
+
+    def test_time_slices(self):
+        assert time_slices(0, 10, 3) == [(6, 10), (3, 6), (0, 3)]
+
+    def test_merged_newest_first(self, tmp_path):
+        splunk = FakeSplunk(0)
+        lines = splunk.client().export('search index=main', 100, 130, 4, tmp_path)
+        assert [loads(line)['result']['_time'] for line in lines] == list(reversed(range(100, 130)))
+        assert len(splunk.exports) == 4
+
+    def test_resumes_finished_slices(self, tmp_path):
+        splunk = FakeSplunk(0)
+        (tmp_path / '0.ndjson').write_bytes(b'{"result":{"_time":"cached"}}\n')
+        lines = list(splunk.client().export('search index=main', 0, 10, 2, tmp_path))
+        assert loads(lines[0]) == {'result': {'_time': 'cached'}}
+        assert [e['earliest_time'] for e in splunk.exports] == ['0']
+
+    def test_auto_slices(self):
+        splunk = FakeSplunk(250000)
+        client = splunk.client()
+        assert client.auto_slices('search index=main index="web" foo', 0, 10) == 3
+        assert splunk.exports[0]['search'] == '| tstats count where index=main OR index="web"'
+
+    def test_checkpoints_removed_once_complete(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('sextant.clients.splunk.commands.CACHE_DIR', tmp_path)
+        splunk = FakeSplunk(0)
+        result = CliRunner().invoke(query, ['--from', '100', '--to', '110', '--slices', '2', '--format', 'ndjson',
+                                            'search index=main'], obj={'client': splunk.client(), 'endpoint': 'splunk'})
+        assert len(result.stdout.splitlines()) == 10
+        assert list((tmp_path / 'exports').iterdir()) == []
+
+    def test_moved_relative_range_restarts(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('sextant.clients.splunk.commands.CACHE_DIR', tmp_path)
+        directory, plan = plan_export(None, 'splunk', 'search index=main', '-30d', 'now', 2)
+        (directory / '0.ndjson').write_bytes(b'')
+        assert plan_export(None, 'splunk', 'search index=main', '-30d', 'now', 2) == (directory, plan)
+        plan['latest'] -= 86400
+        (directory / 'plan.json').write_bytes(dumps(plan))
+        directory, restarted = plan_export(None, 'splunk', 'search index=main', '-30d', 'now', 2)
+        assert restarted['latest'] > plan['latest']
+        assert not (directory / '0.ndjson').exists()
+
+    def test_csv_skips_repeated_headers(self):
+        with FakeSplunk(0).client().stream_csv('search index=main | table a,b', '-1h', 'now') as lines:
+            assert list(lines) == [b'a,b', b'1,2', b'3,4']
+
+
+class TestQueryCache:
+
+    def run(self, splunk, client, *args):
+        result = CliRunner().invoke(query, [*args, '--format', 'ndjson', 'search  index=main'],
+                                    obj={'client': client, 'endpoint': 'splunk'})
+        assert result.exit_code == 0, result.output
+        return [loads(line) for line in result.stdout.splitlines()]
+
+    def test_absolute_range_replayed(self, tmp_path):
+        splunk = FakeSplunk(0)
+        client = splunk.client(DiskCache(tmp_path, 2**20))
+        first = self.run(splunk, client, '--from', '100', '--to', '103')
+        assert self.run(splunk, client, '--from', '100', '--to', '103') == first
+        assert len(first) == 3 and len(splunk.exports) == 1
+
+    def test_recent_range_not_cached(self, tmp_path):
+        splunk = FakeSplunk(0)
+        client = splunk.client(DiskCache(tmp_path, 2**20))
+        now = int(time.time())
+        self.run(splunk, client, '--from', str(now - 700), '--to', str(now - 500))
+        self.run(splunk, client, '--from', str(now - 700), '--to', str(now - 500))
+        assert list(tmp_path.iterdir()) == [] and len(splunk.exports) == 2
+        client.settle = 60
+        self.run(splunk, client, '--from', str(now - 700), '--to', str(now - 500))
+        assert len(list(tmp_path.iterdir())) == 1
+
+    def test_relative_range_only_on_request(self, tmp_path):
+        splunk = FakeSplunk(0)
+        splunk.handler = lambda request: httpx.Response(200, content=b'{"result":{"a":1}}\n')
+        client = splunk.client(DiskCache(tmp_path, 2**20))
+        self.run(splunk, client, '--from', '1h')
+        assert list(tmp_path.iterdir()) == []
+        self.run(splunk, client, '--from', '1h', '--cache')
+        assert len(list(tmp_path.iterdir())) == 1
+
+    def test_normalize_query(self):
+        assert normalize_query(' search  index=main\n| where x="a  b" ') == 'search index=main | where x="a  b"'
+
+
+class TestSend:
+
+    def test_batches_by_count_and_size(self):
+        lines = [b'{"a":1}', b'', b'{"event":"x","index":"main"}', b'not json', b'[1]']
+        batches = list(hec_batches(iter(lines), batch=2, sourcetype='s1', index=None))
+        assert batches == [
+            (2, b'{"sourcetype":"s1","event":{"a":1}}\n{"event":"x","index":"main"}'),
+            (1, b'{"sourcetype":"s1","event":[1]}'),
+        ]
+        assert [count for count, _ in hec_batches(iter([b'{"a":"%s"}' % (b'x' * 100)] * 5), size=250)] == [3, 2]
+
+    def test_sends_gzipped_batches(self):
+        received = []
+        statuses = [429]
+
+        def handler(request):
+            assert request.headers['Authorization'] == 'Splunk token'
+            events = gzip.decompress(request.content).split(b'\n')
+            if b'"bad"' in events[0]:
+                return httpx.Response(400, json={'text': 'Invalid data format', 'code': 6})
+            if statuses:
+                return httpx.Response(statuses.pop())
+            received.extend(events)
+            return httpx.Response(200, json={'text': 'Success', 'code': 0})
+
+        config = {'name': 'splunk', 'remote': 'https://splunk', 'http': {'cache': False}}
+        async_client = AsyncSplunkClient(
+            build_async_client(config, transport=httpx.MockTransport(handler)),
+            concurrency=2, hec='https://splunk:8088', hec_token='token',
+        )
+        client = SplunkClient(None, async_client)
+        lines = [b'{"n":%d}' % i for i in range(25)] + [b'"bad"']
+        with patch('asyncio.sleep', new_callable=AsyncMock):
+            assert client.send_events(iter(lines), batch=5) == (25, 1)
+        assert sorted(loads(e)['event']['n'] for e in received) == list(range(25))
+
+    def test_retries_busy_collector(self):
+        responses = [
+            httpx.Response(503, json={'text': 'Server is busy', 'code': 9}),
+            httpx.ConnectError('reset'),
+            httpx.Response(200, json={'text': 'Success', 'code': 0}),
+        ]
+        posts = []
+
+        def handler(request):
+            posts.append(request)
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        config = {'name': 'splunk', 'remote': 'https://splunk', 'http': {'cache': False}}
+        async_client = AsyncSplunkClient(
+            build_async_client(config, transport=httpx.MockTransport(handler)),
+            hec='https://splunk:8088', hec_token='token',
+        )
+        with patch('asyncio.sleep', new_callable=AsyncMock):
+            assert SplunkClient(None, async_client).send_events(iter([b'{"n":1}'])) == (1, 0)
+        assert len(posts) == 3
+
+    def test_requires_token(self):
+        client = SplunkClient(None, AsyncSplunkClient(None))
+        with pytest.raises(ValueError, match='hec_token'):
+            client.send_events(iter([b'{}']))
@@ -0,0 +1,100 @@
+import httpx
+import json
+import pytest
+from sextant.clients.sentinelone.client import SentinelOneClient
+from sextant.clients.thehive.client import TheHiveClient
+from sextant.store import Store
+
+
+def rows(*times, host='web01', severity=4):
+    return [(f'id-{t}', t, host, severity, {'id': f'id-{t}', 'status': 'new' if t % 20 else 'closed'})
+            for t in times]
+
+
+class TestStore:
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        store = Store(tmp_path / 'store.db')
+        yield store
+        store.close()
+
+    def test_watermark(self, store):
+        assert store.watermark('s1', 'threat') is None
+        assert store.sync('s1', 'threat', rows(10, 30, 20), since=5, synced=40) == 3
+        assert store.watermark('s1', 'threat') == 30
+
+    def test_empty_sync_keeps_since(self, store):
+        store.sync('s1', 'threat', [], since=5, synced=40)
+        assert store.watermark('s1', 'threat') == 5
+
+    def test_resync_replaces(self, store):
+        store.sync('s1', 'threat', rows(10, 20), since=0, synced=0)
+        store.sync('s1', 'threat', rows(20, 30), since=20, synced=0)
+        assert [r['id'] for r in store.records('s1', 'threat')] == ['id-30', 'id-20', 'id-10']
+
+    def test_interrupted_sync_keeps_watermark(self, store):
+        store.sync('s1', 'threat', rows(10), since=0, synced=0)
+
+        def failing():
+            yield from rows(20, 30)
+            raise httpx.ConnectError('down')
+
+        with pytest.raises(httpx.ConnectError):
+            store.sync('s1', 'threat', failing(), since=10, synced=0, batch=1)
+        assert store.watermark('s1', 'threat') == 10
+        assert len(store.records('s1', 'threat')) == 3
+
+    def test_lookback_catches_late_records(self, store):
+        source = rows(10, 30)
+
+        def fetch(since):
+            return [row for row in source if row[1] >= since]
+
+        store.sync('s1', 'threat', fetch(0), since=0, synced=0)
+        # indexed after the sync with an older time
+        source += rows(25)
+        since = store.resume('s1', 'threat', lookback=10)
+        assert since == 20
+        assert store.sync('s1', 'threat', fetch(since), since=since, synced=0) == 2
+        assert [r['id'] for r in store.records('s1', 'threat')] == ['id-30', 'id-25', 'id-10']
+        assert store.watermark('s1', 'threat') == 30
+
+    def test_filters(self, store):
+        store.sync('s1', 'threat', rows(10, 20) + rows(30, host='db01', severity=7), since=0, synced=0)
+        assert [r['id'] for r in store.records('s1', 'threat', since=20)] == ['id-30', 'id-20']
+        assert [r['id'] for r in store.records('s1', 'threat', host='db01')] == ['id-30']
+        assert [r['id'] for r in store.records('s1', 'threat', severity=5)] == ['id-30']
+        assert [r['id'] for r in store.records('s1', 'threat', fields={'$.status': 'closed'})] == ['id-20']
+        assert len(store.records('s1', 'threat', limit=1)) == 1
+
+    def test_never_synced(self, store):
+        with pytest.raises(LookupError):
+            store.records('s1', 'activity')
+
+
+class TestClientSync:
+
+    def test_sentinelone_pages(self):
+        def handler(request):
+            cursor = request.url.params.get('cursor')
+            data = [{'id': cursor or 'first', 'createdAt': '2025-01-15T08:00:00.000Z',
+                     'threatInfo': {'createdAt': '2025-01-15T08:00:00.000Z', 'confidenceLevel': 'malicious'},
+                     'agentRealtimeInfo': {'agentComputerName': 'web01'}}]
+            return httpx.Response(200, json={'data': data, 'pagination': {'nextCursor': None if cursor else 'second'}})
+
+        client = SentinelOneClient(httpx.Client(base_url='https://s1', transport=httpx.MockTransport(handler)))
+        synced = list(client.sync('threat', 0))
+        assert [(r[0], r[2], r[3]) for r in synced] == [('first', 'web01', 'malicious'), ('second', 'web01', 'malicious')]
+        assert synced[0][1] == 1736928000
+
+    def test_thehive_created_at(self):
+        queries = []
+
+        def handler(request):
+            queries.append(json.loads(request.content))
+            return httpx.Response(200, json=[{'_id': 'a1', '_createdAt': 20000, 'date': 1000, 'severity': 2}])
+
+        client = TheHiveClient(httpx.Client(base_url='https://hive', transport=httpx.MockTransport(handler)))
+        assert [r[:4] for r in client.sync('alert', 10)] == [('a1', 20, None, 2)]
+        assert queries[0]['query'][1]['_gte'] == {'_field': '_createdAt', '_value': 10000}